@@ -1,16 +1,164 @@
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+
 from modules.Movement_Package import Movement_Package
-from modules.Networking_Package import Networking_Package
+from modules.Networking_Package import UDPControlChannel
 from modules.Hardware_Interface import Hardware_Interface
-from modules.Regular_Camera_Package import Regular_Camera_Package
-from modules.Zed_Camera_Package import Zed_Camera_Package
+from modules.Loop_Scheduler import LoopScheduler
+from modules.Logger_Module import Logger
+from modules.Async_Networking_Package import AsyncNetworkingPackage
+from modules.Frame_Grabber import CameraSource, FileSource, FrameGrabber, SyntheticSource
+from modules.Video_Stream import VideoEncoder
 
 
 class Sub:
-    def __init__(self):
-        pass
+    def __init__(self, config_file : str = 'configs/sub.json'):
+        with open(config_file) as file:
+            self.config = json.load(file)
+        self.logger = Logger('Sub')
+
+        self.MP = Movement_Package(standalone=self.config.get('simulation', False))
+        # Point serial_port at the pty of modules.Serial_Emulator to run without the board
+        self.HI = Hardware_Interface(self.config.get('serial_port', '/dev/ttyACM0'), self.config.get('baudrate', 115200))
+
+        self.control = UDPControlChannel(self.MP.num_dof)
+        self.control.bind(('', self.config.get('control_port', 9998)))
+        self.command_timeout = self.config.get('command_timeout', 0.5)
+        # Commanded when no fresh command has arrived, so a lost link stops the thrusters
+        self.neutral = np.zeros(self.MP.num_dof)
+
+        # Index into the sensor packet of the measurement of every DOF, in Movement_Package order.
+        # Without it, or while the readings are stale, the commands are fed forward with the PIDs disabled.
+        self.sensor_map = self.config.get('sensor_map')
+        if self.sensor_map is not None:
+            self.sensor_map = np.array(self.sensor_map, dtype=np.intp)
+            if self.sensor_map.shape != (self.MP.num_dof,) or not (0 <= self.sensor_map).all() or not (self.sensor_map < self.HI.num_sensors).all():
+                raise ValueError(f'sensor_map needs {self.MP.num_dof} indices below {self.HI.num_sensors}, got {self.config["sensor_map"]}')
+        self.state = np.zeros(self.MP.num_dof)
+
+        self.scheduler = LoopScheduler(self.config.get('loop_rate', 100),
+                                       cpus=self.config.get('cpu_affinity'),
+                                       priority=self.config.get('realtime_priority'))
+        # Ticks between log lines, about once per second
+        self.log_interval = max(1, round(self.scheduler.rate))
+
+        # Compressed video to the surface, on its own threads so it never touches the control loop
+        self.video_thread = None
+        if self.config.get('video_port') is not None:
+            camera = self.config.get('camera', 0)
+            if camera == 'synthetic':
+                source = SyntheticSource()
+            elif isinstance(camera, str):
+                source = FileSource(camera)
+            else:
+                source = CameraSource(camera)
+            self.grabber = FrameGrabber(source)
+            self.video_thread = threading.Thread(target=self.run_video, daemon=True)
+
+    def run_video(self):
+        asyncio.run(self.video_main())
+
+    async def video_main(self):
+        NP = AsyncNetworkingPackage()
+        await NP.listen('', self.config['video_port'])
+        await NP.accept()
+        self.logger.info('Video connection accepted')
+        loop = asyncio.get_running_loop()
+
+        async def send(packet):
+            await NP.send('video', packet)
+            await NP.flush('video')
+
+        def sink(packet):
+            # Blocks the encoder thread until the frame is on the wire, which is what it measures the link with
+            try:
+                asyncio.run_coroutine_threadsafe(send(packet), loop).result()
+            except ConnectionError:
+                pass
+
+        encoder = VideoEncoder(sink, target_bitrate=self.config.get('video_bitrate', 2e6))
+        self.grabber.start()
+        encoder.start()
+        try:
+            await asyncio.to_thread(self.feed_video, encoder, NP)
+        finally:
+            # The encoder thread may be waiting on this loop to send, so it is stopped from another thread
+            await asyncio.to_thread(encoder.stop)
+            self.grabber.stop()
+            await NP.close()
+
+    def feed_video(self, encoder : VideoEncoder, NP : AsyncNetworkingPackage):
+        """
+        Hand every new camera frame to the encoder until the surface disconnects.
+        """
+        last_log = time.monotonic()
+        last_index = None
+        while not NP.closed:
+            frame, index, timestamp = self.grabber.latest(timeout=1.0)
+            # latest() hands back the last frame again on a timeout, a stalled camera sends nothing
+            if frame is not None and index != last_index:
+                last_index = index
+                encoder.submit(frame, timestamp)
+            if time.monotonic() - last_log > 5.0:
+                last_log = time.monotonic()
+                self.logger.info(f'Video: {encoder.stats()}')
+
+    def sensor_state(self):
+        """
+        @return: The newest sensor reading in the state layout of Movement_Package, or None if there is
+                 no sensor_map or the reading is older than command_timeout.
+        """
+        if self.MP.standalone:
+            # The simulator inside Movement_Package stands in for the sensors
+            return self.MP.sensor_data
+        if self.sensor_map is None:
+            return None
+        age = self.HI.age()
+        if age is None or age > self.command_timeout:
+            return None
+        return np.take(self.HI.recv(), self.sensor_map, out=self.state)
+
+    def step(self, tick : int):
+        """
+        One control tick: newest command -> Movement_Package -> Hardware_Interface. Nothing here blocks,
+        the serial reads and writes happen on the Hardware_Interface threads.
+
+        @param tick: Index of the tick.
+        """
+        self.control.poll()
+        desired = self.control.latest(self.command_timeout, self.neutral)
+        state = self.sensor_state()
+        if state is None:
+            thruster_output = self.MP.feed_forward(desired)
+        else:
+            _, thruster_output = self.MP.update(desired, state)
+        self.HI.transmit(thruster_output)
+
+        if tick % self.log_interval == 0:
+            mode = 'feed-forward' if state is None else 'PID'
+            self.logger.info(f'Command: {desired} | Thrusters: {thruster_output} ({mode}) | Sensors: {self.HI.recv()}')
+            self.logger.info(self.scheduler.summary())
 
     def run(self):
-        pass
+        if self.video_thread is not None:
+            self.video_thread.start()
+        self.HI.start()
+        self.logger.info(f'Control loop started at {self.scheduler.rate} Hz')
+        if self.sensor_map is None and not self.MP.standalone:
+            self.logger.info('No sensor_map configured, the commands are fed forward with the PIDs disabled')
+        try:
+            self.scheduler.run(self.step)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.HI.transmit(self.MP.map_data(np.zeros(self.MP.num_thrusters)))
+            self.HI.close()
+            self.control.close()
+            self.logger.info(self.scheduler.summary())
 
 if __name__ == "__main__":
     main = Sub()
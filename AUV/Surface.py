@@ -1,40 +1,64 @@
 from multiprocessing import Process, Pipe
 from datetime import datetime
 import numpy as np
+import asyncio
 import logging
-import socket
+import json
 import cv2
 
-from modules.Controller_Module import Controller_Module
-from modules.Networking_Package import Networking_Package
-from modules.Logger_Module import Logger_Module
+from modules.Controller_Module import CM
+from modules.Async_Networking_Package import AsyncNetworkingPackage
+from modules.Networking_Package import UDPControlChannel
+from modules.Logger_Module import Logger
+from modules.Shared_Memory import SharedSlot
+from modules.Video_Stream import VideoDecoder
 
 class surface:
-    def __init__(self):
-        self.orin_ip = '192.168.1.192'
-        self.orin_port = 9999
+    def __init__(self, config_file : str = 'configs/surface.json'):
+        with open(config_file) as file:
+            self.config = json.load(file)
+        self.orin_ip = self.config.get('orin_ip', '192.168.1.192')
+        self.orin_port = self.config.get('video_port', 9999)
+        self.control_port = self.config.get('control_port', 9998)
 
-        self.CM_Parent, CM_Child = Pipe()
+        # Latest controller values in shared memory: the controller never waits on a reader and
+        # stale values are overwritten instead of queueing up in a Pipe
+        self.controller_slot = SharedSlot((6,))
         self.NP_Parent, NP_Child = Pipe()
 
-        self.CM = Process(target=self.run_Controller_Module, args=(CM_Child,))
+        self.CM = Process(target=self.run_Controller_Module, args=(self.controller_slot,))
         self.NP = Process(target=self.run_Networking_Package, args=(NP_Child,))
 
-        self.logger = Logger_Module('Surface')
+        self.logger = Logger('Surface')
 
-    def run_Controller_Module(self, pipe):
-        CM = Controller_Module()
+    def run_Controller_Module(self, slot):
+        # Sleeps until the sticks move, and only sends when a value changed or the heartbeat is due.
+        # The heartbeat must be shorter than the command timeout of the sub, which stops the thrusters otherwise.
+        controller = CM(**self.config.get('controller', {}))
+        control = UDPControlChannel(len(controller.data))
         self.logger.info("Controller Module started")
         while True:
-            pipe.send(CM.get_data())
+            data = controller.poll()
+            control.send_command(data, (self.orin_ip, self.control_port))
+            slot.write(data)
 
     def run_Networking_Package(self, pipe):
-        NP = Networking_Package(socket.AF_INET, socket.SOCK_STREAM)
-        NP.connect((self.orin_ip, self.orin_port)))
+        asyncio.run(self.network_main(pipe))
+
+    async def network_main(self, pipe):
+        # Telemetry and video run as independent channels, commands go over their own UDP channel
+        NP = AsyncNetworkingPackage()
+        await NP.connect(self.orin_ip, self.orin_port)
         self.logger.info("Networking Package started")
-        while True:
-            NP.send_string_as_bytes(pipe.recv())
-            pipe.send(NP.recv())
+
+        async def forward_channel(name):
+            while not NP.closed:
+                frame = await NP.recv(name)
+                if frame.size:
+                    pipe.send((name, frame))
+
+        await asyncio.gather(forward_channel('telemetry'), forward_channel('video'))
+        await NP.close()
 
     def prep_configs(self):
         pass
@@ -46,16 +70,32 @@ class surface:
         self.CM.start()
         self.NP.start()
 
+        # Video arrives compressed and is decoded on its own thread, this loop only shows finished frames
+        decoder = VideoDecoder()
+        decoder.start()
+        shown_index = -1
+
+        last_sequence = self.controller_slot.sequence
         while True:
-            controller_data = self.CM_Parent.recv()
-            self.logger.info(f'Data sent: {controller_data}')
-            self.NP_Parent.send(controller_data)
+            if self.controller_slot.sequence != last_sequence:
+                last_sequence = self.controller_slot.sequence
+                self.logger.info(f'Data sent: {self.controller_slot.read()}')
+
+            while self.NP_Parent.poll():
+                name, sub_data = self.NP_Parent.recv()
+                if name == 'video':
+                    decoder.submit(sub_data)
+                else:
+                    self.logger.info(f'Data received: {sub_data}')
 
-            sub_data = self.NP_Parent.recv()
-            self.logger.info(f'Data received: {sub_data[0]}')
-            cv2.imshow("Surface", sub_data[1])
+            frame, index = decoder.latest()
+            if index != shown_index:
+                shown_index = index
+                cv2.imshow("Surface", frame)
             if cv2.waitKey(1) == ord('q'):
                 break
+        decoder.stop()
+        self.controller_slot.close()
 
 if __name__ == "__main__":
     main = surface()
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+
+import asyncio
+import logging
+import socket
+import struct
+from collections import deque
+
+import numpy as np
+
+from modules.Networking_Package import FRAME_HEADER, frame_buffers, unpack_frame
+
+# Chunk header: channel id, flags, chunk length. Every frame is split into chunks so that
+# chunks of an urgent channel can be interleaved with the chunks of a large frame.
+CHUNK_HEADER = struct.Struct('<BBxxI')
+CHUNK_FIRST = 1
+CHUNK_LAST = 2
+
+
+class Channel:
+    """
+    ## Channel class
+    One logical stream of frames, with its own send and receive queues.
+    Channels with a lower priority value are always sent first, and a full queue is handled
+    according to the channel policy:
+    - `block`: the sender waits for space, or the reader stops reading the connection.
+    - `drop_oldest`: the oldest queued frame is discarded, so the newest frame always gets through.
+    - `drop_newest`: the new frame is discarded.
+    """
+    POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+    def __init__(self, name: str, channel_id: int, priority: int = 0, maxsize: int = 16, policy: str = 'drop_oldest'):
+        """
+        ## Initialize the channel.
+        @param name: Name used to address the channel.
+        @param channel_id: Id sent on the wire, 0 to 255. Both ends must use the same ids.
+        @param priority: Send priority, lower values are sent first.
+        @param maxsize: Maximum number of frames queued in each direction.
+        @param policy: What to do when a queue is full, one of `Channel.POLICIES`.
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown policy {policy}, expected one of {self.POLICIES}")
+        if not 0 <= channel_id <= 255:
+            raise ValueError(f"Channel id must be between 0 and 255, got {channel_id}")
+        self.name = name
+        self.channel_id = channel_id
+        self.priority = priority
+        self.maxsize = maxsize
+        self.policy = policy
+
+        self.outgoing = deque()
+        self.incoming = deque()
+        self.outgoing_space = asyncio.Event()
+        self.incoming_space = asyncio.Event()
+        self.incoming_ready = asyncio.Event()
+        self.drained = asyncio.Event()
+        self.sequence = 0
+        self.last_sequence = None
+        self.last_timestamp = None
+        self.dropped_outgoing = 0
+        self.dropped_incoming = 0
+        self.bytes_sent = 0
+
+        # Frame currently being split into chunks, as a list of remaining byte views
+        self.current = None
+        self.current_first = False
+
+    def pending(self) -> bool:
+        """
+        ## Check whether anything is waiting to be sent.
+        """
+        return self.current is not None or len(self.outgoing) > 0
+
+    def next_chunk(self, chunk_size: int) -> tuple[int, list]:
+        """
+        ## Take the next chunk of the frame being sent, starting the next queued frame if needed.
+        @param chunk_size: Maximum number of bytes in the chunk.
+        @return: Tuple of the chunk flags and the list of byte views making up the chunk.
+        """
+        if self.current is None:
+            self.current = [memoryview(buffer) for buffer in self.outgoing.popleft()]
+            self.current_first = True
+            self.outgoing_space.set()
+
+        views = []
+        remaining = chunk_size
+        while self.current and remaining > 0:
+            view = self.current[0]
+            views.append(view[:remaining])
+            if len(view) <= remaining:
+                self.current.pop(0)
+            else:
+                self.current[0] = view[remaining:]
+            remaining -= len(views[-1])
+
+        flags = CHUNK_FIRST if self.current_first else 0
+        self.current_first = False
+        if not self.current:
+            flags |= CHUNK_LAST
+            self.current = None
+        return flags, views
+
+
+# Default channels: joystick commands always win, telemetry and video keep only recent frames
+DEFAULT_CHANNELS = (
+    ('control', 0, 0, 4, 'drop_oldest'),
+    ('telemetry', 1, 1, 64, 'drop_oldest'),
+    ('video', 2, 2, 2, 'drop_oldest'),
+)
+
+
+class AsyncNetworkingPackage:
+    """
+    ## AsyncNetworkingPackage class
+    asyncio transport carrying several independent channels of numpy frames over one TCP connection.
+    Each frame uses the same binary header as `Networking_Package` and is split into chunks tagged
+    with its channel. A single writer task always sends the next chunk of the most urgent channel,
+    so a control frame waits for at most one chunk of a video frame, never for the whole frame.
+    Channels that must be fully isolated, e.g. bulk video on a congested link, can be given their
+    own `AsyncNetworkingPackage` on a second port.
+    """
+    def __init__(self, channels: tuple = DEFAULT_CHANNELS, chunk_size: int = 16384):
+        """
+        ## Initialize the transport. It must be created inside a running event loop.
+        @param channels: `Channel` objects or tuples of `Channel` arguments. Both ends must use the same ids.
+        @param chunk_size: Largest chunk sent at once, which bounds how long a frame can delay a more urgent channel.
+        """
+        if chunk_size < FRAME_HEADER.size:
+            raise ValueError(f"chunk_size must be at least {FRAME_HEADER.size} bytes to hold a frame header")
+        channels = [channel if isinstance(channel, Channel) else Channel(*channel) for channel in channels]
+        self.channels = {channel.name: channel for channel in channels}
+        self._channels_by_id = {channel.channel_id: channel for channel in channels}
+        if len(self._channels_by_id) != len(channels):
+            raise ValueError("Channel ids must be unique")
+        self._send_order = sorted(channels, key=lambda channel: channel.priority)
+        self.chunk_size = chunk_size
+
+        self._reader = None
+        self._writer = None
+        self._server = None
+        self._connected = None
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self.closed = False
+
+    async def connect(self, host: str, port: int) -> None:
+        """
+        ## Connect to a listening `AsyncNetworkingPackage`.
+        @param host: Address of the other end.
+        @param port: Port of the other end.
+        """
+        reader, writer = await asyncio.open_connection(host, port)
+        self.__start(reader, writer)
+
+    async def listen(self, host: str, port: int) -> tuple:
+        """
+        ## Start listening for the other end. Call `accept` to wait for it.
+        @param host: Address to bind to.
+        @param port: Port to bind to, 0 picks a free port.
+        @return: The bound address.
+        """
+        self._connected = asyncio.get_running_loop().create_future()
+
+        async def on_connect(reader, writer):
+            # Only one peer is served, later connections are refused
+            if self._connected.done():
+                writer.close()
+            else:
+                self._connected.set_result((reader, writer))
+
+        self._server = await asyncio.start_server(on_connect, host, port)
+        return self._server.sockets[0].getsockname()
+
+    async def accept(self) -> None:
+        """
+        ## Wait for the other end to connect after `listen`.
+        """
+        reader, writer = await self._connected
+        self._server.close()
+        self.__start(reader, writer)
+
+    def __start(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        ## Configure the connection and start the reader and writer tasks.
+        """
+        self._reader = reader
+        self._writer = writer
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Keep at most about one chunk buffered ahead of the socket, so urgent chunks are not queued behind bulk data
+        writer.transport.set_write_buffer_limits(high=self.chunk_size)
+        self._tasks = [asyncio.create_task(self.__write_loop()), asyncio.create_task(self.__read_loop())]
+        logging.debug("AsyncNetworkingPackage connected")
+
+    async def send(self, name: str, frame: np.ndarray) -> bool:
+        """
+        ## Queue a numpy frame on a channel, waiting for space if the channel policy is `block`.
+        The frame is sent without copying, so it must not be modified until it has been sent.
+        @param name: Name of the channel.
+        @param frame: The numpy array frame to send.
+        @return: False if the frame was dropped by a `drop_newest` channel.
+        """
+        channel = self.channels[name]
+        if channel.policy == 'block':
+            while len(channel.outgoing) >= channel.maxsize and not self.closed:
+                channel.outgoing_space.clear()
+                await channel.outgoing_space.wait()
+        return self.send_nowait(name, frame)
+
+    def send_nowait(self, name: str, frame: np.ndarray) -> bool:
+        """
+        ## Queue a numpy frame on a channel without waiting.
+        @param name: Name of the channel.
+        @param frame: The numpy array frame to send.
+        @return: False if the frame was dropped by a `drop_newest` channel.
+        """
+        if self.closed or self._writer is None:
+            raise ConnectionError("AsyncNetworkingPackage is not connected")
+        channel = self.channels[name]
+        if len(channel.outgoing) >= channel.maxsize:
+            if channel.policy == 'block':
+                raise asyncio.QueueFull(f"Channel {name} is full")
+            channel.dropped_outgoing += 1
+            if channel.policy == 'drop_newest':
+                return False
+            channel.outgoing.popleft()
+
+        channel.outgoing.append(frame_buffers(frame, channel.sequence))
+        channel.sequence = (channel.sequence + 1) & 0xFFFFFFFF
+        self._wakeup.set()
+        return True
+
+    async def recv(self, name: str) -> np.ndarray:
+        """
+        ## Receive the next frame of a channel.
+        The sequence number and timestamp of the frame are stored on the channel as `last_sequence` and `last_timestamp`.
+        @param name: Name of the channel.
+        @return: The received numpy array, or an empty array if the connection was closed.
+        """
+        channel = self.channels[name]
+        while not channel.incoming:
+            if self.closed:
+                return np.array([])
+            channel.incoming_ready.clear()
+            await channel.incoming_ready.wait()
+        return self.__pop_incoming(channel)
+
+    async def flush(self, name: str) -> None:
+        """
+        ## Wait until every frame queued on a channel has been written to the socket.
+        Senders can time this to measure the throughput the link actually delivers.
+        @param name: Name of the channel.
+        """
+        channel = self.channels[name]
+        while channel.pending() and not self.closed:
+            channel.drained.clear()
+            await channel.drained.wait()
+
+    def recv_nowait(self, name: str) -> np.ndarray | None:
+        """
+        ## Receive the next frame of a channel without waiting.
+        @param name: Name of the channel.
+        @return: The received numpy array, or None if no frame is queued.
+        """
+        channel = self.channels[name]
+        if not channel.incoming:
+            return None
+        return self.__pop_incoming(channel)
+
+    def recv_latest(self, name: str) -> np.ndarray | None:
+        """
+        ## Receive the newest queued frame of a channel and discard the older ones.
+        @param name: Name of the channel.
+        @return: The newest numpy array, or None if no frame is queued.
+        """
+        channel = self.channels[name]
+        if not channel.incoming:
+            return None
+        while len(channel.incoming) > 1:
+            channel.incoming.popleft()
+        return self.__pop_incoming(channel)
+
+    def __pop_incoming(self, channel: Channel) -> np.ndarray:
+        frame, channel.last_sequence, channel.last_timestamp = channel.incoming.popleft()
+        channel.incoming_space.set()
+        return frame
+
+    def stats(self) -> dict:
+        """
+        ## Queue lengths and drop counters of every channel.
+        @return: Dictionary keyed by channel name.
+        """
+        return {name: {'queued_outgoing': len(channel.outgoing), 'queued_incoming': len(channel.incoming),
+                       'dropped_outgoing': channel.dropped_outgoing, 'dropped_incoming': channel.dropped_incoming,
+                       'bytes_sent': channel.bytes_sent}
+                for name, channel in self.channels.items()}
+
+    async def close(self) -> None:
+        """
+        ## Stop the tasks and close the connection.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.__mark_closed()
+        if self._server is not None:
+            self._server.close()
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    def __mark_closed(self) -> None:
+        """
+        ## Flag the connection as closed and wake every waiting sender and receiver.
+        """
+        self.closed = True
+        for channel in self.channels.values():
+            channel.incoming_ready.set()
+            channel.outgoing_space.set()
+            channel.incoming_space.set()
+            channel.drained.set()
+
+    def __next_channel(self) -> Channel | None:
+        """
+        ## The most urgent channel with something to send.
+        """
+        for channel in self._send_order:
+            if channel.pending():
+                return channel
+        return None
+
+    async def __write_loop(self) -> None:
+        """
+        ## Send chunks of the most urgent channel until cancelled.
+        """
+        try:
+            while True:
+                channel = self.__next_channel()
+                if channel is None:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                flags, views = channel.next_chunk(self.chunk_size)
+                length = sum(len(view) for view in views)
+                self._writer.write(CHUNK_HEADER.pack(channel.channel_id, flags, length))
+                self._writer.writelines(views)
+                await self._writer.drain()
+                channel.bytes_sent += length
+                if not channel.pending():
+                    channel.drained.set()
+        except ConnectionError as e:
+            logging.debug(f"AsyncNetworkingPackage write failed: {e}")
+            self.__mark_closed()
+
+    async def __read_loop(self) -> None:
+        """
+        ## Reassemble chunks into frames and queue them on their channel until the connection closes.
+        """
+        # Frame being reassembled and the number of bytes received so far, per channel id
+        assembling = {}
+        try:
+            while True:
+                channel_id, flags, length = CHUNK_HEADER.unpack(await self._reader.readexactly(CHUNK_HEADER.size))
+                chunk = await self._reader.readexactly(length)
+                channel = self._channels_by_id.get(channel_id)
+                if channel is None:
+                    raise ValueError(f"Frame received on unknown channel {channel_id}")
+
+                if flags & CHUNK_FIRST:
+                    # The frame header at the start of the first chunk gives the size of the whole frame
+                    size = FRAME_HEADER.size + FRAME_HEADER.unpack_from(chunk)[-3]
+                    assembling[channel_id] = (bytearray(size), 0)
+                buffer, received = assembling[channel_id]
+                buffer[received:received + length] = chunk
+                assembling[channel_id] = (buffer, received + length)
+
+                if flags & CHUNK_LAST:
+                    del assembling[channel_id]
+                    await self.__deliver(channel, unpack_frame(buffer))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logging.debug("AsyncNetworkingPackage connection closed")
+        finally:
+            self.__mark_closed()
+
+    async def __deliver(self, channel: Channel, message: tuple) -> None:
+        """
+        ## Queue a received frame on its channel according to the channel policy.
+        """
+        if len(channel.incoming) >= channel.maxsize:
+            if channel.policy == 'block':
+                while len(channel.incoming) >= channel.maxsize and not self.closed:
+                    channel.incoming_space.clear()
+                    await channel.incoming_space.wait()
+            else:
+                channel.dropped_incoming += 1
+                if channel.policy == 'drop_newest':
+                    return
+                channel.incoming.popleft()
+        channel.incoming.append(message)
+        channel.incoming_ready.set()
@@ -0,0 +1,278 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+import numpy as np
+
+
+class Detections(NamedTuple):
+    """
+    Detections of one frame as compact arrays, n being the number of objects.
+    """
+    index: int               # Frame index from the FrameGrabber
+    timestamp: float         # Monotonic capture time of the frame
+    boxes: np.ndarray        # (n, 4) float32, x1 y1 x2 y2 in pixels of the frame
+    scores: np.ndarray       # (n,) float32 confidences
+    classes: np.ndarray      # (n,) int32 class ids
+
+
+def results_to_arrays(result):
+    """
+    Convert one ultralytics Results object to arrays.
+
+    @param result: Result of one image from YOLO.predict.
+    @return: Tuple of the boxes (n, 4) float32, scores (n,) float32 and classes (n,) int32.
+    """
+    boxes = result.boxes
+    return (boxes.xyxy.cpu().numpy().astype(np.float32, copy=False),
+            boxes.conf.cpu().numpy().astype(np.float32, copy=False),
+            boxes.cls.cpu().numpy().astype(np.int32))
+
+
+class YOLOModel:
+    """
+    Batched YOLO inference returning arrays. Works with .pt weights and with the CPU-friendly exports
+    ultralytics can load, e.g. `yolo export model=yolov8n.pt format=onnx imgsz=320` -> yolov8n.onnx,
+    or format=openvino -> yolov8n_openvino_model/.
+    """
+    def __init__(self, model = 'yolov8n.pt', imgsz : int = 640, conf : float = 0.25, device : str = 'cpu', threads : int = None):
+        """
+        @param model: Weights file or exported model.
+        @param imgsz: Inference size, 320 roughly quarters the CPU time of 640.
+        @param conf: Minimum confidence of a detection.
+        @param device: 'cpu', or e.g. '0' for the first GPU.
+        @param threads: Number of CPU threads for inference, None leaves the library default.
+        """
+        from ultralytics import YOLO
+
+        if threads is not None:
+            import cv2
+            import torch
+
+            torch.set_num_threads(threads)
+            cv2.setNumThreads(threads)
+        self.model = YOLO(model)
+        self.imgsz = imgsz
+        self.conf = conf
+        self.device = device
+
+    def __call__(self, frames : list) -> list:
+        """
+        @param frames: Images as uint8 BGR arrays.
+        @return: One (boxes, scores, classes) tuple per image.
+        """
+        results = self.model.predict(frames, imgsz=self.imgsz, conf=self.conf, device=self.device, verbose=False)
+        return [results_to_arrays(result) for result in results]
+
+
+class DetectionStage:
+    """
+    Runs detection on its own thread behind a bounded input queue, so the capture and control
+    threads never wait on inference.
+    Frames are taken in micro-batches of up to `batch_size`, without waiting for a batch to fill.
+    When frames come in faster than the model keeps up, the queue drops frames according to `policy`,
+    and frames older than `max_latency` by the time the worker gets to them are skipped, so latency
+    stays bounded instead of growing with the backlog.
+    A batch the model raises on is logged and counted in `failed`, and the worker goes on with the next one.
+    """
+    def __init__(self, model, batch_size : int = 1, max_queue : int = 2, policy : str = 'drop_oldest', max_latency : float = None, history_size : int = 256):
+        """
+        @param model: YOLOModel, or any callable taking a list of frames and returning one
+                      (boxes, scores, classes) tuple per frame.
+        @param batch_size: Largest number of frames run through the model at once.
+        @param max_queue: Number of frames the input queue holds.
+        @param policy: 'drop_oldest' keeps the newest frames when the queue is full, 'drop_newest' rejects new frames.
+        @param max_latency: Skip frames older than this many seconds when they are dequeued, None never skips.
+        @param history_size: Number of recent frames kept for the latency statistics.
+        """
+        if policy not in ('drop_oldest', 'drop_newest'):
+            raise ValueError(f"Unknown policy {policy}")
+        self.model = model
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.policy = policy
+        self.max_latency = max_latency
+
+        # Queued frames as (frame, index, timestamp, submit time)
+        self.queue = deque()
+        self.results = deque(maxlen=max_queue)
+        self.latest_result = None
+
+        self.submitted = 0
+        self.processed = 0
+        self.dropped_full = 0
+        self.dropped_stale = 0
+        self.failed = 0
+        self.last_error = None
+        self.batches = 0
+        # Per frame: queue wait, inference time of its batch divided by the batch size, capture to result latency
+        self.history = deque(maxlen=history_size)
+        self.completion_times = deque(maxlen=history_size)
+
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """
+        Start the inference thread.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the inference thread, frames still queued are discarded.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        """
+        True while the inference thread runs. It turns False on stop() and if the thread ends on an error.
+        """
+        return self._running
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def submit(self, frame : np.ndarray, index : int = None, timestamp : float = None) -> bool:
+        """
+        Queue a frame for detection without waiting. The frame is copied, so grabber buffers can be passed directly.
+
+        @param frame: uint8 BGR image.
+        @param index: Frame index, defaults to the number of frames submitted so far.
+        @param timestamp: Monotonic capture time, defaults to now.
+        @return: False if the frame was rejected by a full 'drop_newest' queue.
+        """
+        now = time.monotonic()
+        with self._condition:
+            if index is None:
+                index = self.submitted
+            self.submitted += 1
+            if len(self.queue) >= self.max_queue:
+                self.dropped_full += 1
+                if self.policy == 'drop_newest':
+                    return False
+                self.queue.popleft()
+            self.queue.append((frame.copy(), index, now if timestamp is None else timestamp, now))
+            self._condition.notify_all()
+        return True
+
+    def get(self, timeout : float = None):
+        """
+        Take the oldest result not taken yet.
+
+        @param timeout: Maximum seconds to wait, None to wait until a result arrives or the stage stops.
+        @return: Detections, or None on timeout.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.results or not self._running, timeout)
+            return self.results.popleft() if self.results else None
+
+    def latest(self):
+        """
+        @return: Detections of the newest processed frame without waiting, None before the first one.
+        """
+        return self.latest_result
+
+    def pending(self) -> int:
+        """
+        @return: Number of submitted frames that are queued or being detected.
+        """
+        with self._condition:
+            return self.submitted - self.processed - self.dropped_full - self.dropped_stale - self.failed
+
+    def _next_batch(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self.queue or not self._running)
+            batch = []
+            now = time.monotonic()
+            while self.queue and len(batch) < self.batch_size:
+                item = self.queue.popleft()
+                if self.max_latency is not None and now - item[2] > self.max_latency:
+                    self.dropped_stale += 1
+                    continue
+                batch.append(item)
+            return batch
+
+    def _run(self):
+        try:
+            while self._running:
+                batch = self._next_batch()
+                if not batch:
+                    continue
+                start = time.monotonic()
+                try:
+                    outputs = list(self.model([item[0] for item in batch]))
+                    if len(outputs) != len(batch):
+                        raise ValueError(f"The model returned {len(outputs)} results for {len(batch)} frames")
+                    results = [Detections(index, timestamp, boxes, scores, classes)
+                               for (frame, index, timestamp, submitted), (boxes, scores, classes) in zip(batch, outputs)]
+                except Exception as error:
+                    # The frames of the failed batch are no longer pending, so nothing waits on them
+                    with self._condition:
+                        self.failed += len(batch)
+                        self.last_error = error
+                        self._condition.notify_all()
+                    logging.exception(f"Detection failed on frames {[item[1] for item in batch]}")
+                    continue
+                end = time.monotonic()
+
+                with self._condition:
+                    self.batches += 1
+                    for (frame, index, timestamp, submitted), result in zip(batch, results):
+                        self.results.append(result)
+                        self.latest_result = result
+                        self.processed += 1
+                        self.history.append((start - submitted, (end - start) / len(batch), end - timestamp))
+                        self.completion_times.append(end)
+                    self._condition.notify_all()
+        finally:
+            # Whatever ends the thread, get() and the callers checking pending() must not wait on it
+            with self._condition:
+                self._running = False
+                self._condition.notify_all()
+
+    def stats(self) -> dict:
+        """
+        @return: Frame counters, the recent detection rate in FPS, and mean and worst recent queue wait,
+                 per-frame inference time and capture-to-result latency in seconds.
+        """
+        with self._condition:
+            history = np.array(self.history).reshape(-1, 3)
+            completions = list(self.completion_times)
+            stats = {'submitted': self.submitted,
+                     'processed': self.processed,
+                     'dropped_full': self.dropped_full,
+                     'dropped_stale': self.dropped_stale,
+                     'failed': self.failed,
+                     'batches': self.batches}
+        stats['fps'] = (len(completions) - 1) / (completions[-1] - completions[0]) if len(completions) > 1 and completions[-1] > completions[0] else 0.0
+        for i, name in enumerate(['queue_wait', 'inference', 'latency']):
+            stats[f'{name}_mean'] = float(history[:, i].mean()) if len(history) else 0.0
+            stats[f'{name}_max'] = float(history[:, i].max()) if len(history) else 0.0
+        return stats
+
+    def summary(self) -> str:
+        """
+        @return: One line with the counters and timing, for the log.
+        """
+        stats = self.stats()
+        return (f"{stats['fps']:.1f} FPS | {stats['processed']}/{stats['submitted']} frames, {stats['dropped_full']} dropped, {stats['dropped_stale']} stale, {stats['failed']} failed | "
+                f"queue {stats['queue_wait_mean'] * 1e3:.1f} ms, inference {stats['inference_mean'] * 1e3:.1f} ms/frame, "
+                f"latency {stats['latency_mean'] * 1e3:.1f} ms (max {stats['latency_max'] * 1e3:.1f} ms)")
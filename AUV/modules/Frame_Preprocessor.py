@@ -0,0 +1,138 @@
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class FramePreprocessor:
+    """
+    Turns every captured frame into the image sent to the surface and the input of the detection model
+    in one pass over the full resolution frame, writing into buffers allocated once.
+
+    The region of interest is cropped as a view, halved `pyramid_level` times with cv2.pyrDown and
+    resized once into the middle of a square letterboxed model image. The padding never changes, so it
+    is filled only at start. The send image is resized from the model image, which is far smaller than
+    the frame. The model image already has the shape YOLO letterboxes to, so YOLO uses it as is, and
+    boxes detected in it are mapped back to frame pixels with to_frame.
+    """
+    def __init__(self, frame_shape : tuple, send_width : int = 480, model_size : int = 640, roi : tuple = None,
+                 pyramid_level : int = 0, interpolation : int = cv2.INTER_LINEAR, history_size : int = 256):
+        """
+        @param frame_shape: Shape of the captured frames, (height, width, 3).
+        @param send_width: Width of the send image, its height follows the aspect ratio of the region of interest.
+        @param model_size: Side of the square model image, the imgsz of the YOLO model.
+        @param roi: (x, y, width, height) region of the frame to process in frame pixels, None for the whole frame.
+        @param pyramid_level: Number of times the region is halved with cv2.pyrDown before the resize.
+                              Each level quarters the pixels of the resize and smooths the image, so large
+                              downscales alias less with cv2.INTER_LINEAR.
+        @param interpolation: Interpolation of the resize into the model image, cv2.INTER_LINEAR is what YOLO
+                              resizes with, cv2.INTER_AREA is smoother and slower.
+        @param history_size: Number of recent frames kept for the timing statistics.
+        """
+        frame_height, frame_width = frame_shape[:2]
+        if roi is None:
+            roi = (0, 0, frame_width, frame_height)
+        x, y, width, height = roi
+        if x < 0 or y < 0 or width <= 0 or height <= 0 or x + width > frame_width or y + height > frame_height:
+            raise ValueError(f"ROI {roi} is not inside the {frame_width}x{frame_height} frame")
+        self.roi = roi
+        self.pyramid_level = pyramid_level
+        self.interpolation = interpolation
+        self.model_size = model_size
+
+        # One buffer per pyramid level, each half the size of the one before
+        self.pyramid = []
+        for _ in range(pyramid_level):
+            width, height = (width + 1) // 2, (height + 1) // 2
+            self.pyramid.append(np.empty((height, width, 3), dtype=np.uint8))
+
+        # Letterbox geometry, padded with the gray YOLO pads with
+        self.scale = min(model_size / width, model_size / height)
+        inner_width, inner_height = round(width * self.scale), round(height * self.scale)
+        self.left = (model_size - inner_width) // 2
+        self.top = (model_size - inner_height) // 2
+        self.model_image = np.full((model_size, model_size, 3), 114, dtype=np.uint8)
+        self.model_inner = self.model_image[self.top:self.top + inner_height, self.left:self.left + inner_width]
+
+        self.send_width = send_width
+        self.send_height = round(send_width * self.roi[3] / self.roi[2])
+        self.send_image = np.empty((self.send_height, send_width, 3), dtype=np.uint8)
+        # The send image is made from the model image, unless that is smaller
+        if inner_width >= send_width:
+            self._send_source = self.model_inner
+        else:
+            self._send_source = self.pyramid[-1] if self.pyramid else None
+        # Linear is enough for the small step down from the model image
+        source_width = width if self._send_source is None else self._send_source.shape[1]
+        self._send_interpolation = cv2.INTER_AREA if source_width >= 2 * send_width else cv2.INTER_LINEAR
+
+        self.frames = 0
+        self.history = deque(maxlen=history_size)
+
+    def __call__(self, frame : np.ndarray):
+        """
+        Preprocess a frame. The returned arrays are reused: they stay valid until the next call.
+
+        @param frame: Captured uint8 BGR frame of `frame_shape`.
+        @return: Tuple of the send image and the model image.
+        """
+        start = time.perf_counter()
+        x, y, width, height = self.roi
+        image = frame[y:y + height, x:x + width]
+        for level in self.pyramid:
+            image = cv2.pyrDown(image, dst=level, dstsize=(level.shape[1], level.shape[0]))
+        cv2.resize(image, (self.model_inner.shape[1], self.model_inner.shape[0]), dst=self.model_inner, interpolation=self.interpolation)
+        source = image if self._send_source is None else self._send_source
+        cv2.resize(source, (self.send_width, self.send_height), dst=self.send_image, interpolation=self._send_interpolation)
+        self.frames += 1
+        self.history.append(time.perf_counter() - start)
+        return self.send_image, self.model_image
+
+    def to_frame(self, boxes : np.ndarray) -> np.ndarray:
+        """
+        Map boxes from model image pixels to frame pixels.
+
+        @param boxes: (n, 4) x1 y1 x2 y2 in the model image.
+        @return: (n, 4) float32 x1 y1 x2 y2 in the frame.
+        """
+        x, y = self.roi[:2]
+        factor = 2 ** self.pyramid_level / self.scale
+        offset = np.array([self.left, self.top, self.left, self.top], dtype=np.float32)
+        origin = np.array([x, y, x, y], dtype=np.float32)
+        return ((boxes - offset) * factor + origin).astype(np.float32, copy=False)
+
+    def buffer_bytes(self) -> int:
+        """
+        @return: Memory held by the preallocated buffers in bytes.
+        """
+        return self.model_image.nbytes + self.send_image.nbytes + sum(level.nbytes for level in self.pyramid)
+
+    def stats(self) -> dict:
+        """
+        @return: Number of frames, mean and worst recent time per frame in seconds, and the buffer memory in bytes.
+        """
+        history = np.array(self.history)
+        return {'frames': self.frames,
+                'time_mean': float(history.mean()) if len(history) else 0.0,
+                'time_max': float(history.max()) if len(history) else 0.0,
+                'buffer_bytes': self.buffer_bytes()}
+
+    def summary(self) -> str:
+        """
+        @return: One line with the timing and memory, for the log.
+        """
+        stats = self.stats()
+        return (f"preprocess {stats['time_mean'] * 1e3:.2f} ms/frame (max {stats['time_max'] * 1e3:.2f} ms), "
+                f"{stats['buffer_bytes'] / 1e6:.2f} MB buffers")
+
+# Run from the AUV folder: python -m modules.Frame_Preprocessor
+if __name__ == "__main__":
+    from modules.Frame_Grabber import FrameGrabber, SyntheticSource
+
+    with FrameGrabber(SyntheticSource(1920, 1080)) as grabber:
+        preprocessor = FramePreprocessor(grabber.shape, roi=(240, 0, 1440, 1080), pyramid_level=1)
+        for _ in range(100):
+            frame, index, timestamp = grabber.latest()
+            send_image, model_image = preprocessor(frame)
+        print(f"send {send_image.shape}, model {model_image.shape}: {preprocessor.summary()}")
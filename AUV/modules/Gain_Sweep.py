@@ -0,0 +1,236 @@
+import argparse
+import itertools
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+from modules.Movement_Package import Movement_Package, PIDBank
+
+
+def simulate_step_responses(Kp : np.ndarray, Ki : np.ndarray, Kd : np.ndarray, profile : np.ndarray, time_step : float, thrust_curve_file : str = 'data/T200.csv') -> np.ndarray:
+    """
+    Simulate every gain candidate against one setpoint profile in a single vectorized pass.
+
+    The loop mirrors Movement_Package.run (PID, thrust allocation, PWM mapping, rigid-body step)
+    but each step is evaluated for all candidates at once through a batched PIDBank.
+
+    @param Kp: Proportional gains, shape (C, num_dof).
+    @param Ki: Integral gains, shape (C, num_dof).
+    @param Kd: Derivative gains, shape (C, num_dof).
+    @param profile: Setpoints for every step, shape (T, num_dof).
+    @param time_step: Time step of the simulation in seconds.
+    @param thrust_curve_file: CSV file mapping PWM to thrust.
+    @return: The sensor data after every step, shape (C, T, num_dof).
+    """
+    mp = Movement_Package(thrust_curve_file=thrust_curve_file)
+    bank = PIDBank(Kp, Ki, Kd, mp.PIDs.i_max, mp.PIDs.i_min, mp.PIDs.output_max, mp.PIDs.output_min)
+
+    sensor_values = np.zeros(bank.shape)
+    trajectory = np.empty((len(profile),) + bank.shape)
+    for i in range(len(profile)):
+        bank.set_target(profile[i])
+        pid_output = bank.update(sensor_values, i * time_step)
+
+        thruster_output = mp.map_data(mp.thrust_allocator.allocate(pid_output))
+        acceleration = mp.thrust_forces(thruster_output) @ mp.acceleration_matrix
+
+        sensor_values += acceleration * time_step
+        sensor_values -= mp.drag_matrix * sensor_values * time_step
+        trajectory[i] = sensor_values
+
+    return trajectory.transpose(1, 0, 2)
+
+
+def step_response_metrics(trajectory : np.ndarray, profile : np.ndarray, time_step : float, settling_band : float = 0.02) -> dict:
+    """
+    Score step responses on rise time, overshoot, settling time and ITAE.
+
+    Rise time, overshoot and settling time are measured per axis against the final setpoint of
+    the profile, and are NaN for axes whose final setpoint is zero. Rise and settling times are
+    inf when the response never gets there. ITAE uses the full profile and is summed over axes.
+
+    @param trajectory: Sensor data, shape (C, T, num_dof).
+    @param profile: Setpoints for every step, shape (T, num_dof).
+    @param time_step: Time step of the simulation in seconds.
+    @param settling_band: Relative error band used for the settling time.
+    @return: Dictionary of metric arrays, each of shape (C, num_dof) except 'itae' which is (C,).
+    """
+    num_steps = trajectory.shape[1]
+    time_axis = np.arange(1, num_steps + 1) * time_step
+
+    target = profile[-1]
+    active = target != 0
+
+    def first_time(mask):
+        # Time of the first step where mask holds, inf if it never does
+        return np.where(mask.any(axis=1), time_axis[mask.argmax(axis=1)], np.inf)
+
+    # Inactive axes are NaN throughout and are overwritten with NaN below
+    with np.errstate(divide='ignore', invalid='ignore'):
+        response = trajectory / np.where(active, target, np.nan)
+        rise_time = first_time(response >= 0.9) - first_time(response >= 0.1)
+        overshoot = np.maximum(response.max(axis=1) - 1.0, 0.0) * 100.0
+        outside = np.abs(response - 1.0) > settling_band
+
+    # Settled from the step after the last one outside the band
+    last_outside = num_steps - 1 - outside[:, ::-1].argmax(axis=1)
+    settling_time = np.where(outside.any(axis=1), time_axis[np.minimum(last_outside + 1, num_steps - 1)], time_axis[0])
+    settling_time[outside[:, -1]] = np.inf
+
+    itae = (time_axis[:, None] * np.abs(profile - trajectory)).sum(axis=(1, 2)) * time_step
+
+    inactive = np.broadcast_to(~active, rise_time.shape)
+    for metric in (rise_time, overshoot, settling_time):
+        metric[inactive] = np.nan
+
+    return {'rise_time': rise_time, 'overshoot': overshoot, 'settling_time': settling_time, 'itae': itae}
+
+
+def _run_chunk(args : tuple) -> dict:
+    """
+    Worker entry point for the process pool, simulates and scores one chunk of candidates.
+    """
+    Kp, Ki, Kd, profile, time_step, thrust_curve_file = args
+    trajectory = simulate_step_responses(Kp, Ki, Kd, profile, time_step, thrust_curve_file)
+    return step_response_metrics(trajectory, profile, time_step)
+
+
+class GainSweep:
+    """
+    Sweep PID gains for Movement_Package over a set of setpoint profiles.
+    Candidates are simulated in vectorized chunks spread over a process pool, scored on
+    rise time, overshoot, settling time and ITAE, and collected into one columnar table.
+    """
+    def __init__(self, Kp : np.ndarray, Ki : np.ndarray, Kd : np.ndarray, num_dof : int = 6):
+        """
+        Initialize the sweep with explicit candidates.
+
+        @param Kp: Proportional gains, shape (C,) applied to every axis or (C, num_dof).
+        @param Ki: Integral gains, shape (C,) or (C, num_dof).
+        @param Kd: Derivative gains, shape (C,) or (C, num_dof).
+        @param num_dof: Number of degrees of freedom of the vehicle.
+        """
+        self.num_dof = num_dof
+        self.Kp, self.Ki, self.Kd = (self._per_axis(gains) for gains in (Kp, Ki, Kd))
+        self.results = None
+
+    def _per_axis(self, gains) -> np.ndarray:
+        """
+        Expand gains shared by every axis, shape (C,), to one column per axis, shape (C, num_dof).
+        """
+        gains = np.asarray(gains, dtype=float)
+        if gains.ndim == 1:
+            gains = np.repeat(gains[:, None], self.num_dof, axis=1)
+        return gains
+
+    @classmethod
+    def grid(cls, Kp_values : list, Ki_values : list, Kd_values : list, num_dof : int = 6) -> 'GainSweep':
+        """
+        Build a sweep over every combination of the given gains, applied to all axes.
+        """
+        candidates = np.array(list(itertools.product(Kp_values, Ki_values, Kd_values)), dtype=float)
+        return cls(candidates[:, 0], candidates[:, 1], candidates[:, 2], num_dof)
+
+    @classmethod
+    def random(cls, num_candidates : int, Kp_range : tuple = (0.1, 1.0), Ki_range : tuple = (0.0, 0.5), Kd_range : tuple = (0.0, 1.0), num_dof : int = 6, seed : int = None) -> 'GainSweep':
+        """
+        Build a sweep of uniformly sampled gains, drawn independently for every axis.
+        The default ranges follow the tuning notes in Movement_Package.__init__.
+        """
+        rng = np.random.default_rng(seed)
+        Kp, Ki, Kd = (rng.uniform(low, high, (num_candidates, num_dof)) for low, high in (Kp_range, Ki_range, Kd_range))
+        return cls(Kp, Ki, Kd, num_dof)
+
+    def run(self, profiles : list, num_iterations : int = 100, time_step : float = 0.1, workers : int = None, chunk_size : int = 64, thrust_curve_file : str = 'data/T200.csv') -> dict:
+        """
+        Simulate every candidate against every profile and score the responses.
+
+        @param profiles: Setpoint profiles, each of shape (num_dof,) held for num_iterations or (T, num_dof).
+        @param num_iterations: Length of constant profiles in steps.
+        @param time_step: Time step of the simulation in seconds.
+        @param workers: Number of worker processes. Defaults to every core, 1 runs in this process.
+        @param chunk_size: Number of candidates simulated together by one worker task.
+        @param thrust_curve_file: CSV file mapping PWM to thrust.
+        @return: Columnar results, one row per (profile, candidate) pair.
+        """
+        profiles = [np.broadcast_to(np.asarray(p, dtype=float), (num_iterations, self.num_dof)) if np.ndim(p) == 1
+                    else np.asarray(p, dtype=float) for p in profiles]
+        chunks = [(start, min(start + chunk_size, len(self.Kp))) for start in range(0, len(self.Kp), chunk_size)]
+        tasks = [(self.Kp[a:b], self.Ki[a:b], self.Kd[a:b], profile, time_step, thrust_curve_file)
+                 for profile in profiles for a, b in chunks]
+
+        workers = os.cpu_count() if workers is None else workers
+        if workers > 1:
+            with Pool(workers) as pool:
+                scores = pool.map(_run_chunk, tasks)
+        else:
+            scores = [_run_chunk(task) for task in tasks]
+
+        num_candidates = len(self.Kp)
+        columns = {
+            'profile': np.repeat(np.arange(len(profiles)), num_candidates),
+            'candidate': np.tile(np.arange(num_candidates), len(profiles)),
+        }
+        for name, gains in (('Kp', self.Kp), ('Ki', self.Ki), ('Kd', self.Kd)):
+            for i in range(self.num_dof):
+                columns[f'{name}_{i+1}'] = np.tile(gains[:, i], len(profiles))
+        for metric in ('rise_time', 'overshoot', 'settling_time'):
+            values = np.concatenate([score[metric] for score in scores])
+            for i in range(self.num_dof):
+                columns[f'{metric}_{i+1}'] = values[:, i]
+        columns['itae'] = np.concatenate([score['itae'] for score in scores])
+
+        self.results = columns
+        return columns
+
+    def save(self, output_file : str) -> None:
+        """
+        Write the results to one columnar file, .npz by default or .csv when the name ends in .csv.
+        """
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        if output_file.endswith('.csv'):
+            import pandas as pd
+            pd.DataFrame(self.results).to_csv(output_file, index=False)
+        else:
+            np.savez_compressed(output_file, **self.results)
+        print(f"Sweep results saved to {output_file}")
+
+    def best(self, count : int = 10, metric : str = 'itae') -> np.ndarray:
+        """
+        Return the row indices with the lowest score for the given column.
+        """
+        return np.argsort(self.results[metric], kind='stable')[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep Movement_Package PID gains in simulation. Run from the AUV folder: python -m modules.Gain_Sweep')
+    parser.add_argument('--kp', type=float, nargs='+', default=[0.2, 0.4, 0.6, 0.8, 1.0], help='Kp values for a grid sweep')
+    parser.add_argument('--ki', type=float, nargs='+', default=[0.0, 0.05, 0.15, 0.25], help='Ki values for a grid sweep')
+    parser.add_argument('--kd', type=float, nargs='+', default=[0.0, 0.05, 0.1], help='Kd values for a grid sweep')
+    parser.add_argument('--random', type=int, default=None, help='Sample this many random per-axis candidates instead of a grid')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for the random sample')
+    parser.add_argument('--setpoint', type=float, nargs=6, action='append', help='Constant setpoint profile, may be repeated')
+    parser.add_argument('--iterations', type=int, default=100, help='Number of steps per profile')
+    parser.add_argument('--time-step', type=float, default=0.1, help='Time step in seconds')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes, defaults to every core')
+    parser.add_argument('--thrust-curve', default='data/T200.csv', help='CSV file mapping PWM to thrust')
+    parser.add_argument('--output', default='data_out/gain_sweep.npz', help='Output file, .npz or .csv')
+    args = parser.parse_args()
+
+    if args.random is not None:
+        sweep = GainSweep.random(args.random, seed=args.seed)
+    else:
+        sweep = GainSweep.grid(args.kp, args.ki, args.kd)
+
+    # Same surge steps as the Movement_Package __main__ block
+    profiles = args.setpoint or [[value, 0.0, 0.0, 0.0, 0.0, 0.0] for value in (-1.0, -0.5, 0.5, 1.0)]
+    results = sweep.run(profiles, args.iterations, args.time_step, args.workers, thrust_curve_file=args.thrust_curve)
+    sweep.save(args.output)
+
+    for row in sweep.best():
+        print(f"profile {results['profile'][row]} | Kp {results['Kp_1'][row]:.3f} | Ki {results['Ki_1'][row]:.3f} | "
+              f"Kd {results['Kd_1'][row]:.3f} | ITAE {results['itae'][row]:.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,190 @@
+import threading
+import time
+
 import serial
-import numpy as np 
+import numpy as np
 
 class Hardware_Interface:
-    def __init__(self):
-        self.ser = serial.Serial('/dev/ttyACM0', 115200, 0.1) 
+    """
+    Serial link to the thruster/sensor microcontroller.
+    A reader thread parses the 'a'...'\\n' framed sensor packets into a preallocated ring buffer, and a
+    writer thread sends thruster commands. Neither recv nor transmit ever waits on the serial port:
+    recv returns the newest sample, and transmit replaces any command that has not been written yet,
+    so only the latest thruster command goes out.
+    """
+    def __init__(self, port = '/dev/ttyACM0', baudrate : int = 115200, timeout : float = 0.1, num_sensors : int = 4, buffer_size : int = 1024):
+        """
+        @param port: Device path, e.g. the pseudo-terminal of modules.Serial_Emulator, or an already open serial-like object.
+        @param baudrate: Baud rate of the serial link.
+        @param timeout: Read timeout in seconds, which also bounds how long close waits for the reader thread.
+        @param num_sensors: Number of values in every sensor packet.
+        @param buffer_size: Number of sensor samples kept in the ring buffer.
+        """
+        if isinstance(port, str):
+            self.ser = serial.Serial(port, baudrate, timeout=timeout)
+        else:
+            self.ser = port
+        self.baudrate = baudrate
 
         self.starting_bit = 'a'
         self.ending_bit = '\n'
-        
+
         self.recv_data = None
-    
+
+        # Ring buffer of sensor samples and the monotonic time each one was received
+        self.num_sensors = num_sensors
+        self.samples = np.zeros((buffer_size, num_sensors))
+        self.sample_times = np.zeros(buffer_size)
+        self.count = 0
+        self.malformed = 0
+
+        # Latest thruster command not written yet, replaced by every transmit
+        self.pending_command = None
+        self.commands_sent = 0
+        self.commands_coalesced = 0
+
+        self._lock = threading.Lock()
+        self._command_ready = threading.Event()
+        self._running = False
+        self._threads = []
+
+    def start(self):
+        """
+        Start the reader and writer threads.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._threads = [threading.Thread(target=self._read_loop, daemon=True),
+                         threading.Thread(target=self._write_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
     def recv(self):
-        pass
+        """
+        Return the newest sensor sample without blocking.
+
+        @return: Copy of the newest sensor values, or None if no packet has been received yet.
+        """
+        with self._lock:
+            if self.count == 0:
+                return None
+            self.recv_data = self.samples[(self.count - 1) % len(self.samples)].copy()
+        return self.recv_data
+
+    def age(self):
+        """
+        @return: Seconds since the newest sensor sample was received, None if no packet has been received yet.
+        """
+        with self._lock:
+            if self.count == 0:
+                return None
+            return time.monotonic() - self.sample_times[(self.count - 1) % len(self.samples)]
+
+    def history(self, num_samples : int = None):
+        """
+        Return the most recent sensor samples, oldest first.
+
+        @param num_samples: Number of samples, defaults to every sample held by the ring buffer.
+        @return: Tuple of the receive times, shape (n,), and the samples, shape (n, num_sensors).
+        """
+        with self._lock:
+            available = min(self.count, len(self.samples))
+            num_samples = available if num_samples is None else min(num_samples, available)
+            indices = np.arange(self.count - num_samples, self.count) % len(self.samples)
+            return self.sample_times[indices], self.samples[indices]
 
     def transmit(self, data):
-        pass
+        """
+        Queue a thruster command without blocking. A command that has not been written yet is replaced.
+
+        @param data: PWM values, one per thruster.
+        """
+        command = (self.starting_bit + ','.join(map(str, np.asarray(data, dtype=np.int64).tolist())) + self.ending_bit).encode('ascii')
+        with self._lock:
+            if self.pending_command is not None:
+                self.commands_coalesced += 1
+            self.pending_command = command
+        self._command_ready.set()
 
     def close(self):
-        pass
+        """
+        Stop the threads and close the serial port. A command that is still pending is written first,
+        so a final neutral command is not lost.
+        """
+        self._running = False
+        self._command_ready.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.ser.close()
+
+    def _write_loop(self):
+        # A command queued just before close is still written, even if close came while the line was busy
+        while self._running or self.pending_command is not None:
+            self._command_ready.wait()
+            with self._lock:
+                command = self.pending_command
+                self.pending_command = None
+                self._command_ready.clear()
+            if command is not None:
+                start = time.perf_counter()
+                self.ser.write(command)
+                self.commands_sent += 1
+                # Hold off until the line has carried the command (10 bits per byte), so commands queue here
+                # where they can be replaced, not in the driver where they would all be sent late
+                time.sleep(max(0.0, start + len(command) * 10 / self.baudrate - time.perf_counter()))
+
+    def _read_loop(self):
+        start = self.starting_bit.encode('ascii')
+        end = self.ending_bit.encode('ascii')
+        pending = bytearray()
+        while self._running:
+            # Block for the first byte up to the port timeout, then take whatever else has arrived
+            pending += self.ser.read(max(1, self.ser.in_waiting))
+            while True:
+                end_index = pending.find(end)
+                if end_index < 0:
+                    # A line this long is not a packet, drop it rather than let the buffer grow
+                    if len(pending) > 4096:
+                        self.malformed += 1
+                        pending.clear()
+                    break
+                # Bytes before the last start bit are noise or the tail of a corrupted packet
+                start_index = pending.rfind(start, 0, end_index)
+                if start_index < 0:
+                    self.malformed += 1
+                else:
+                    self._store(bytes(pending[start_index + len(start):end_index]))
+                del pending[:end_index + len(end)]
+
+    def _store(self, payload : bytes):
+        try:
+            values = [float(value) for value in payload.split(b',')]
+        except ValueError:
+            self.malformed += 1
+            return
+        if len(values) != self.num_sensors:
+            self.malformed += 1
+            return
+        with self._lock:
+            index = self.count % len(self.samples)
+            self.samples[index] = values
+            self.sample_times[index] = time.monotonic()
+            self.count += 1
 
     def run(self):
-        pass
+        """
+        Send neutral commands and print the newest sensor sample once per second.
+        """
+        self.start()
+        try:
+            while True:
+                self.transmit(np.full(8, 1500))
+                print(f'Sensors: {self.recv()} | Age: {self.age()} | Malformed: {self.malformed}')
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.close()
 
 if __name__ == "__main__":
     HI = Hardware_Interface()
@@ -1,10 +1,11 @@
 import numpy as np
 from typing import Optional
+import os
 import time
-import pandas as pd
-import matplotlib.pyplot as plt
 import datetime
 
+from modules.Telemetry_Module import TelemetrySink, CSVSink
+
 class PID:
     """
     A very basic PID controller with Integral clamping.
@@ -91,7 +92,405 @@ class PID:
             control_variable = self.output_min
 
         return control_variable
-    
+
+class PIDBank:
+    """
+    A bank of PID controllers evaluated together with NumPy arrays.
+    Behaves like a list of PID objects sharing one timestamp, but computes every
+    axis in a single vectorized step. Gains and clamps may be given per axis (N,)
+    or per axis and batch (M, N) to run M vehicles or M gain sets at once.
+    """
+    def __init__(self, Kp, Ki, Kd, i_max = None, i_min = None, output_max = None, output_min = None, batch_size : int = None):
+        """
+        Initialize the PID bank with the given gains and clamping values.
+
+        @param Kp Proportional gains, shape (N,) or (M, N).
+        @param Ki Integral gains, shape (N,) or (M, N).
+        @param Kd Derivative gains, shape (N,) or (M, N).
+        @param i_max Maximum integral terms, None for no clamping.
+        @param i_min Minimum integral terms, None for no clamping.
+        @param output_max Maximum output values, None for no clamping.
+        @param output_min Minimum output values, None for no clamping.
+        @param batch_size Number of rows M to broadcast (N,) gains to. Defaults to the gain shape.
+        """
+        self.Kp = np.asarray(Kp, dtype=float)
+        self.Ki = np.asarray(Ki, dtype=float)
+        self.Kd = np.asarray(Kd, dtype=float)
+
+        # None means unbounded, matching the scalar PID class
+        self.i_max = self._bound(i_max, np.inf)
+        self.i_min = self._bound(i_min, -np.inf)
+        self.output_max = self._bound(output_max, np.inf)
+        self.output_min = self._bound(output_min, -np.inf)
+
+        shape = np.broadcast_shapes(self.Kp.shape, self.Ki.shape, self.Kd.shape,
+                                    self.i_max.shape, self.i_min.shape,
+                                    self.output_max.shape, self.output_min.shape)
+        if batch_size is not None:
+            shape = np.broadcast_shapes((batch_size, 1), shape)
+        self.shape = shape
+
+        self.set_point = np.zeros(shape)
+        self.error_sum = np.zeros(shape)
+        self.last_error = np.zeros(shape)
+        self.last_time = None
+
+        # Scratch buffers reused on every update to avoid allocations in the control tick
+        self._error = np.zeros(shape)
+        self._scratch = np.zeros(shape)
+
+    @staticmethod
+    def _bound(value, default : float) -> np.ndarray:
+        """
+        Convert an optional clamp value into an array, replacing None with an infinite bound.
+        """
+        if value is None:
+            return np.asarray(default, dtype=float)
+        return np.array([default if v is None else v for v in np.ravel(value)], dtype=float).reshape(np.shape(value))
+
+    def set_target(self, target = 0.0) -> None:
+        """
+        Set the desired target points for every controller in the bank.
+
+        @param target Desired target values, broadcastable to the bank shape.
+        """
+        self.set_point[...] = target
+
+    def reset(self) -> None:
+        """
+        Clear the integral, derivative and timing state of every controller.
+        """
+        self.error_sum.fill(0.0)
+        self.last_error.fill(0.0)
+        self.last_time = None
+
+    def update(self, current_values, current_time : float) -> np.ndarray:
+        """
+        Update every controller with the current values and one shared time.
+
+        @param current_values: The current values to control, broadcastable to the bank shape.
+        @param current_time: The current time, as a floating-point timestamp.
+
+        @return: The control variables, same shape as the bank.
+        """
+        error = np.subtract(self.set_point, current_values, out=self._error)
+        scratch = self._scratch
+
+        # Integral term, computed only once a previous timestamp exists
+        if self.last_time is not None:
+            time_diff = current_time - self.last_time
+            self.error_sum += np.multiply(error, time_diff, out=scratch)
+            # np.minimum/np.maximum with out= are cheaper than np.clip on small arrays
+            np.minimum(self.error_sum, self.i_max, out=self.error_sum)
+            np.maximum(self.error_sum, self.i_min, out=self.error_sum)
+        else:
+            time_diff = 0
+
+        control_variable = np.multiply(self.Kp, error)
+        control_variable += np.multiply(self.Ki, self.error_sum, out=scratch)
+
+        # Derivative term, computed only if time has passed
+        if time_diff > 0:
+            np.subtract(error, self.last_error, out=scratch)
+            scratch *= self.Kd / time_diff
+            control_variable += scratch
+
+        # Remember last error and last time for next update
+        self.last_error, self._error = error, self.last_error
+        self.last_time = current_time
+
+        np.minimum(control_variable, self.output_max, out=control_variable)
+        return np.maximum(control_variable, self.output_min, out=control_variable)
+
+class ThrusterCurve:
+    """
+    PWM to thrust lookup for a thruster, built once from a CSV curve.
+    The curve is expanded into a dense table with one entry per microsecond of PWM
+    and cached next to the CSV as a .npy file, which is memory-mapped so every
+    Movement_Package instance and every process shares the same pages.
+    """
+    _curves = {}
+
+    def __init__(self, table : np.ndarray, interpolation : str = 'nearest'):
+        """
+        Initialize the curve from a dense lookup table.
+
+        @param table: Array of shape (K, 3) holding PWM, nearest force and linearly interpolated force per row.
+        @param interpolation: Either 'nearest' or 'linear'.
+        """
+        if interpolation not in ('nearest', 'linear'):
+            raise ValueError(f"Unknown interpolation '{interpolation}', expected 'nearest' or 'linear'")
+        self.interpolation = interpolation
+        self.table = table
+        self.pwm_min = float(table[0, 0])
+        self.pwm_max = float(table[-1, 0])
+        self.forces = table[:, 1] if interpolation == 'nearest' else table[:, 2]
+
+    @classmethod
+    def load(cls, csv_file : str = 'data/T200.csv', interpolation : str = 'nearest') -> 'ThrusterCurve':
+        """
+        Return the shared curve for a CSV file, building the .npy cache on first use.
+
+        @param csv_file: Path to the CSV file with PWM in the first column and force in the second.
+        @param interpolation: Either 'nearest' or 'linear'.
+        @return: The cached ThrusterCurve for this file and interpolation mode.
+        """
+        key = (os.path.abspath(csv_file), interpolation)
+        if key not in cls._curves:
+            cache_file = os.path.splitext(csv_file)[0] + '.npy'
+            if not os.path.exists(cache_file) or os.path.getmtime(cache_file) < os.path.getmtime(csv_file):
+                cls.build_cache(csv_file, cache_file)
+            cls._curves[key] = cls(np.load(cache_file, mmap_mode='r'), interpolation)
+        return cls._curves[key]
+
+    @staticmethod
+    def build_cache(csv_file : str, cache_file : str) -> np.ndarray:
+        """
+        Parse the CSV curve and save it as a dense 1 us PWM step table.
+
+        @param csv_file: Path to the CSV file with PWM in the first column and force in the second.
+        @param cache_file: Path of the .npy file to write.
+        @return: The dense table of shape (K, 3).
+        """
+        # pandas is only needed to build the cache, so it is not imported with the module
+        import pandas as pd
+
+        # Read thrust data from the CSV file and ensure numeric conversion
+        thrust_data = pd.read_csv(csv_file, header=None)
+        thrust_data[0] = pd.to_numeric(thrust_data[0], errors='coerce')
+        thrust_data[1] = pd.to_numeric(thrust_data[1], errors='coerce')
+        thrust_data = thrust_data.dropna().to_numpy()
+
+        # A stable sort keeps the first duplicate first, as argmin over the raw file did
+        thrust_data = thrust_data[np.argsort(thrust_data[:, 0], kind='stable')]
+        pwm, force = thrust_data[:, 0], thrust_data[:, 1]
+
+        grid = np.arange(np.floor(pwm[0]), np.ceil(pwm[-1]) + 1)
+        upper = np.clip(np.searchsorted(pwm, grid), 1, len(pwm) - 1)
+        lower = upper - 1
+        # Ties go to the lower PWM entry
+        nearest = np.where(grid - pwm[lower] <= pwm[upper] - grid, lower, upper)
+
+        table = np.column_stack((grid, force[nearest], np.interp(grid, pwm, force)))
+
+        # Write to a temporary file first so other processes never map a partial cache
+        tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.save(f, table)
+        os.replace(tmp_file, cache_file)
+        return table
+
+    def __call__(self, pwm : np.ndarray, out : np.ndarray = None) -> np.ndarray:
+        """
+        Map PWM values to thrust in one vectorized lookup.
+
+        @param pwm: Array of PWM values, one per thruster.
+        @param out: Optional array to write the forces into.
+        @return: The force produced by each thruster.
+        """
+        index = np.rint(np.asarray(pwm, dtype=float) - self.pwm_min)
+        np.clip(index, 0, len(self.forces) - 1, out=index)
+        return np.take(self.forces, index.astype(np.intp), out=out)
+
+class PWMMapper:
+    """
+    Maps normalized thruster commands to integer PWM values.
+    Scale and offset are precomputed per thruster, and each call is a single vectorized
+    clip, deadband, scale and round written into a preallocated uint16 buffer.
+    """
+    def __init__(self, num_thrusters : int, in_min = -1.0, in_max = 1.0, out_min = 1000, out_max = 2000, deadband = 0.0):
+        """
+        Initialize the mapper. Every range and deadband may be a scalar or one value per thruster.
+
+        @param num_thrusters: Number of thrusters.
+        @param in_min: Lowest normalized command, mapped to out_min.
+        @param in_max: Highest normalized command, mapped to out_max.
+        @param out_min: PWM value for in_min.
+        @param out_max: PWM value for in_max.
+        @param deadband: Commands with an absolute value below this are treated as zero.
+        """
+        shape = (num_thrusters,)
+        self.in_min = np.broadcast_to(np.asarray(in_min, dtype=float), shape).copy()
+        self.in_max = np.broadcast_to(np.asarray(in_max, dtype=float), shape).copy()
+        out_min = np.broadcast_to(np.asarray(out_min, dtype=float), shape)
+        out_max = np.broadcast_to(np.asarray(out_max, dtype=float), shape)
+        self.deadband = np.broadcast_to(np.asarray(deadband, dtype=float), shape).copy()
+        self.has_deadband = bool(np.any(self.deadband > 0))
+
+        self.scale = (out_max - out_min) / (self.in_max - self.in_min)
+        self.offset = out_min - self.in_min * self.scale
+
+        self.buffer = np.zeros(shape, dtype=np.uint16)
+        self._scratch = np.zeros(shape)
+
+    def __call__(self, data : np.ndarray, out : np.ndarray = None) -> np.ndarray:
+        """
+        Map commands to PWM values.
+
+        @param data: Normalized commands, shape (num_thrusters,) or (..., num_thrusters).
+        @param out: Optional uint16 array to write into. Single commands default to the internal
+                    buffer, which is overwritten by the next call.
+        @return: The PWM values as uint16.
+        """
+        data = np.asarray(data, dtype=float)
+        if data.shape == self.buffer.shape:
+            value = np.minimum(data, self.in_max, out=self._scratch)
+            if out is None:
+                out = self.buffer
+        else:
+            value = np.minimum(data, self.in_max)
+            if out is None:
+                out = np.empty(data.shape, dtype=np.uint16)
+        np.maximum(value, self.in_min, out=value)
+
+        if self.has_deadband:
+            value *= np.abs(value) >= self.deadband
+        value *= self.scale
+        value += self.offset
+        np.rint(value, out=value)
+        np.copyto(out, value, casting='unsafe')
+        return out
+
+class ThrustAllocator:
+    """
+    Saturation-aware thrust allocation using a redistributed pseudo-inverse.
+    The pseudo-inverse of the thruster effect matrix is computed once. When some thrusters
+    saturate they are pinned at their limit and the remaining wrench is re-solved over the
+    free thrusters, so the commanded wrench is kept instead of being distorted by clipping.
+    Pseudo-inverses of each saturation pattern are cached and reused on later ticks, and the
+    number of redistribution passes is capped so every tick has a fixed worst-case cost.
+
+    When the wrench cannot be produced at all, axis priorities decide what gives way: the groups
+    are allocated in order, each on top of what the groups before it achieved, and a group that
+    does not fit is scaled down as a whole, leaving nothing for the groups after it on the
+    thrusters it saturated. Without priorities the shortfall is spread over every axis.
+    """
+    def __init__(self, effect_matrix : np.ndarray, u_min = -1.0, u_max = 1.0, max_iterations : int = None, normalize : bool = True,
+                 priorities : list = None):
+        """
+        Initialize the allocator.
+
+        @param effect_matrix: Wrench produced by a unit command of each thruster, shape (num_dof, num_thrusters).
+        @param u_min: Lowest thruster command, scalar or one per thruster.
+        @param u_max: Highest thruster command, scalar or one per thruster.
+        @param max_iterations: Cap on redistribution passes. Defaults to the number of thrusters.
+        @param normalize: Scale each requested axis by its maximum achievable wrench, so that a
+                          normalized request of 1.0 asks for the full authority of that axis.
+        @param priorities: Groups of axis indices, highest priority first, e.g. [[3, 4, 5], [2], [0, 1]]
+                           to hold attitude before heave before surge and sway. Axes left out form a
+                           last group. None spreads any shortfall over every axis.
+        """
+        self.effect_matrix = np.asarray(effect_matrix, dtype=float)
+        num_thrusters = self.effect_matrix.shape[1]
+        self.u_min = np.broadcast_to(np.asarray(u_min, dtype=float), (num_thrusters,)).copy()
+        self.u_max = np.broadcast_to(np.asarray(u_max, dtype=float), (num_thrusters,)).copy()
+        self.max_iterations = num_thrusters if max_iterations is None else max_iterations
+
+        if normalize:
+            self.authority = (np.abs(self.effect_matrix) * np.maximum(np.abs(self.u_min), np.abs(self.u_max))).sum(axis=1)
+        else:
+            self.authority = np.ones(self.effect_matrix.shape[0])
+
+        self.priorities = None
+        if priorities is not None:
+            grouped = [axis for group in priorities for axis in group]
+            rest = [axis for axis in range(self.effect_matrix.shape[0]) if axis not in grouped]
+            self.priorities = [np.asarray(group, dtype=int) for group in list(priorities) + ([rest] if rest else [])]
+
+        self.pinv = np.linalg.pinv(self.effect_matrix)
+        self._pinv_cache = {}
+        self.iterations = 0
+
+    def _free_pinv(self, fixed : np.ndarray) -> np.ndarray:
+        """
+        Return the pseudo-inverse restricted to the free thrusters, zero rows for the fixed ones.
+        """
+        key = fixed.tobytes()
+        free_pinv = self._pinv_cache.get(key)
+        if free_pinv is None:
+            free_pinv = np.zeros_like(self.pinv)
+            free_pinv[~fixed] = np.linalg.pinv(self.effect_matrix[:, ~fixed])
+            self._pinv_cache[key] = free_pinv
+        return free_pinv
+
+    def _redistribute(self, wrench : np.ndarray, u : np.ndarray) -> np.ndarray:
+        """
+        Pin saturated thrusters and re-solve the remaining wrench over the free ones.
+        """
+        fixed = np.zeros(len(u), dtype=bool)
+        for iteration in range(self.max_iterations):
+            self.iterations = iteration + 1
+            over = (u > self.u_max) & ~fixed
+            under = (u < self.u_min) & ~fixed
+            if not (over.any() or under.any()):
+                break
+            u[over] = self.u_max[over]
+            u[under] = self.u_min[under]
+            fixed |= over | under
+            if fixed.all():
+                break
+            residual = wrench - self.effect_matrix @ np.where(fixed, u, 0.0)
+            u = np.where(fixed, u, self._free_pinv(fixed) @ residual)
+        return np.clip(u, self.u_min, self.u_max, out=u)
+
+    def _achieves(self, u : np.ndarray, wrench : np.ndarray) -> bool:
+        # Cheaper than np.allclose on these small arrays
+        return float(np.abs(self.effect_matrix @ u - wrench).max()) <= 1e-6
+
+    def _prioritize(self, wrench : np.ndarray) -> np.ndarray:
+        """
+        Allocate the priority groups in turn. Every group is first re-solved with redistribution together
+        with what the groups before it achieved. If that cannot be produced, the group's wrench is added
+        along the pseudo-inverse, scaled down until the first thruster reaches its limit.
+        """
+        u = np.zeros(self.effect_matrix.shape[1])
+        achieved = np.zeros_like(wrench)
+        request = np.zeros_like(wrench)
+        for group in self.priorities:
+            request.fill(0.0)
+            request[group] = wrench[group]
+            target = achieved + request
+            candidate = self._redistribute(target, self.pinv @ target)
+            if self._achieves(candidate, target):
+                u, achieved = candidate, target
+                continue
+            step = self.pinv @ request
+            with np.errstate(divide='ignore', invalid='ignore'):
+                room = np.where(step > 0, (self.u_max - u) / step, np.where(step < 0, (self.u_min - u) / step, np.inf))
+            scale = min(1.0, max(0.0, float(room.min())))
+            u = u + scale * step
+            achieved = achieved + scale * request
+        return np.clip(u, self.u_min, self.u_max, out=u)
+
+    def _saturate(self, wrench : np.ndarray, u : np.ndarray) -> np.ndarray:
+        """
+        Allocate a wrench whose pseudo-inverse solution saturates.
+        """
+        u = self._redistribute(wrench, u)
+        if self.priorities is None or self._achieves(u, wrench):
+            return u
+        return self._prioritize(wrench)
+
+    def allocate(self, wrench : np.ndarray) -> np.ndarray:
+        """
+        Compute thruster commands for a requested wrench.
+
+        @param wrench: Normalized wrench, shape (num_dof,) or (batch, num_dof).
+        @return: Thruster commands within [u_min, u_max], shape (num_thrusters,) or (batch, num_thrusters).
+        """
+        wrench = np.asarray(wrench, dtype=float) * self.authority
+        u = wrench @ self.pinv.T
+        self.iterations = 0
+
+        saturated = ((u > self.u_max) | (u < self.u_min))
+        if u.ndim == 1:
+            return self._saturate(wrench, u) if saturated.any() else u
+
+        # Only the rows that saturate need the per-row redistribution passes
+        for row in np.flatnonzero(saturated.any(axis=1)):
+            u[row] = self._saturate(wrench[row], u[row])
+        return u
+
 class Movement_Package:
     """
     Movement Package (MP) class for the AUV.
@@ -99,7 +498,7 @@ class Movement_Package:
     real-world or simulation scenarios. Three different configurations have been
     created for the AUV, which are determined by the placement parameter. 
     """
-    def __init__(self, standalone : bool = False, simulation : bool = False, num_dof : int = 6, num_motors: int = 8):
+    def __init__(self, standalone : bool = False, simulation : bool = False, num_dof : int = 6, num_motors: int = 8, thrust_curve_file : str = 'data/T200.csv', thrust_interpolation : str = 'nearest', pwm_min = 1000, pwm_max = 2000, pwm_deadband = 0.0):
         """
         \brief Initialize the Movement_Package (MP) class with given parameters.
         \param placement: Determines what motor placement should be active.
@@ -108,6 +507,11 @@ class Movement_Package:
                             for a real-world or simulation environment.
         \param num_dof: Number of degrees of freedom for the AUV.
         \param num_motors: Number of motors for the AUV.
+        \param thrust_curve_file: CSV file mapping PWM to thrust, used by sensor_update.
+        \param thrust_interpolation: 'nearest' or 'linear' lookup on the thrust curve.
+        \param pwm_min: PWM value for full reverse, scalar or one per thruster.
+        \param pwm_max: PWM value for full forward, scalar or one per thruster.
+        \param pwm_deadband: Thruster commands below this magnitude map to neutral, scalar or one per thruster.
         """
         self.simulation = simulation
         self.num_dof = num_dof
@@ -115,6 +519,14 @@ class Movement_Package:
         self.sensor_data = np.zeros(self.num_dof)
         self.standalone = standalone
 
+        # The thrust curve is only needed by the simulator, so it is loaded on first use
+        self.thrust_curve_file = thrust_curve_file
+        self.thrust_interpolation = thrust_interpolation
+        self.thruster_curve = None
+
+        # Simulated clock used by run(), it keeps advancing across runs so the PID timestamps never go backwards
+        self.sim_time = 0.0
+
         self.horizontal_motor_angles = 45.0
         self.horizontal_motor_distance = 0.22
         self.vertical_motor_distance = 0.22
@@ -123,6 +535,19 @@ class Movement_Package:
         self.angle_in_radians = self.horizontal_motor_angles * (np.pi / 180)
 
         self.thruster_matrix = self.create_thruster_matrix().T
+        # When the request cannot be met, attitude is held first, then heave, then surge and sway
+        self.thrust_allocator = ThrustAllocator(self.thruster_matrix, priorities=[[3, 4, 5], [2], [0, 1]])
+        self.pwm_mapper = PWMMapper(self.num_thrusters, out_min=pwm_min, out_max=pwm_max, deadband=pwm_deadband)
+
+        # Rigid-body constants for the standalone simulator
+        self.drag_matrix = np.array([0.1, 0.1, 0.1, 0.05, 0.05, 0.05])  # Placeholder drag coefficients
+        self.auv_mass = 20.0  # Mass of the AUV in kg
+        self.auv_inertia = np.array([10.0, 10.0, 10.0])  # Placeholder inertia
+
+        # Thruster force to body acceleration matrix (num_thrusters x num_dof), built once from the
+        # simulation thruster geometry so every step is a single matmul
+        self.allocation_matrix = self.create_thruster_matrix(simulation=True)
+        self.acceleration_matrix = self.allocation_matrix / np.concatenate((np.full(3, self.auv_mass), self.auv_inertia))
 
         # PID controller parameters, these are set to zero for now. Expected to be tuned later.
         # absolute value Kp values should range from 0.1 to 1.0
@@ -137,9 +562,9 @@ class Movement_Package:
         output_min_List = [-1.0, -1.0, -1.0, -1.0, -1.0, -1.0]
         self.PIDs = self.init_PID(Kp_List, Ki_List, Kd_List, i_max_List, i_min_List, output_max_List, output_min_List)
 
-    def init_PID(self, Kp_List : list, Ki_List : list, Kd_List : list, i_max_List : list, i_min_List : list, output_max_List : list, output_min_List : list) -> list:
+    def init_PID(self, Kp_List : list, Ki_List : list, Kd_List : list, i_max_List : list, i_min_List : list, output_max_List : list, output_min_List : list) -> PIDBank:
         """
-        Initialize the PID controller with the given gains and clamping values.
+        Initialize the PID bank with the given gains and clamping values, one entry per DOF.
 
         \param Kp Proportional gain.
         \param Ki Integral gain.
@@ -149,10 +574,9 @@ class Movement_Package:
         \param output_max Maximum output value.
         \param output_min Minimum output value.
         """
-        PIDs = []
-        for i in range(self.num_dof):
-            PIDs.append(PID(Kp_List[i], Ki_List[i], Kd_List[i], i_max_List[i], i_min_List[i], output_max_List[i], output_min_List[i]))
-        return PIDs
+        return PIDBank(Kp_List[:self.num_dof], Ki_List[:self.num_dof], Kd_List[:self.num_dof],
+                       i_max_List[:self.num_dof], i_min_List[:self.num_dof],
+                       output_max_List[:self.num_dof], output_min_List[:self.num_dof])
 
     def create_thruster_matrix(self, simulation: bool = False) -> np.ndarray:
         """
@@ -197,24 +621,25 @@ class Movement_Package:
 
         return thruster_matrix
 
-    def update(self, desired_data: np.ndarray, sensor_data: np.ndarray) -> np.ndarray:
+    def update(self, desired_data: np.ndarray, sensor_data: np.ndarray, current_time: float = None) -> np.ndarray:
         """
         Update the input data for the AUV and calculate the returned PID values. 
         Apply the map_data function to the returned values and return the mapped values.
         @param desired_data: The desired data for the AUV.
         @param sensor_data: The sensor data for the AUV.
+        @param current_time: Timestamp handed to the PIDs. Defaults to the wall clock, time.time().
         @return: The returned PID values mapped to the motor values (1x8 matrix).
         """
-        pid_output = np.zeros(self.num_dof)
-        for i in range(len(self.PIDs)):
-            self.PIDs[i].set_target(desired_data[i])
-            pid_output[i] = self.PIDs[i].update(sensor_data[i], time.time())
+        if current_time is None:
+            current_time = time.time()
+        self.PIDs.set_target(desired_data)
+        pid_output = self.PIDs.update(sensor_data, current_time)
 
-        # Multiply the PID output with the thruster matrix
+        # Allocate the PID output (the requested wrench) to the thrusters, redistributing around saturation
         # Uses the PID output as the desired data (Useful for testing the PID controller)
-        thruster_output = pid_output.dot(self.thruster_matrix)
+        thruster_output = self.thrust_allocator.allocate(pid_output)
         # Uses the desired data as the desired data (Useful for testing the thruster matrix)
-        # thruster_output = desired_data.dot(self.thruster_matrix)
+        # thruster_output = self.thrust_allocator.allocate(desired_data)
 
         # Map the entire thruster output using the map_data function
         mapped_values = self.map_data(thruster_output)
@@ -227,11 +652,22 @@ class Movement_Package:
 
         return pid_output, mapped_values
 
+    def feed_forward(self, desired_data: np.ndarray) -> np.ndarray:
+        """
+        Allocate the desired data straight to the thrusters, bypassing the PID controllers.
+        Used while there is no sensor feedback to close the loop on. The PIDs are reset, so they
+        start without a stale integral once feedback is back.
+        @param desired_data: The desired data for the AUV, used as the requested wrench.
+        @return: The mapped motor values (1x8 matrix).
+        """
+        self.PIDs.reset()
+        return self.map_data(self.thrust_allocator.allocate(desired_data))
+
     def sensor_update(self, thruster_output: np.ndarray, time_step: float) -> np.ndarray:
         """
         Update the sensor data of the Autonomous Underwater Vehicle (AUV) based on the output of the thrusters and the elapsed time step.
 
-        This method computes the AUV's linear and angular accelerations from the forces and torques generated by the thrusters. It then updates the AUV's velocity based on these accelerations and applies a linear drag model. The method reads thruster data from a CSV file to map the thruster outputs to forces.
+        This method computes the AUV's linear and angular accelerations from the forces and torques generated by the thrusters. It then updates the AUV's velocity based on these accelerations and applies a linear drag model. The method maps the thruster outputs to forces with the shared ThrusterCurve lookup, which is parsed from a CSV file once.
 
         @param thruster_output: An ndarray representing the output of each thruster in the form of Pulse Width Modulation (PWM) values.
         @param time_step: A float representing the time step in seconds over which the sensor data is to be updated.
@@ -239,146 +675,129 @@ class Movement_Package:
         @return: An ndarray representing the updated sensor data of the AUV. The first three elements represent the linear velocity components (surge, sway, heave), and the last three elements represent the angular velocity components (roll, pitch, yaw).
 
         Note:
-        - The method assumes the presence of a CSV file 'motor_data/T200.csv' containing thruster data.
-        - Thruster configuration (angles and positions) are based on the AUV's design and are hardcoded in the method.
+        - The method assumes the presence of the CSV file given by thrust_curve_file (default 'data/T200.csv') containing thruster data.
+        - Thruster configuration (angles and positions) comes from allocation_matrix, built once in __init__.
         """
-        # Read thrust data from the CSV file and ensure numeric conversion
-        thrust_data = pd.read_csv('data/T200.csv', header=None)
-        thrust_data[0] = pd.to_numeric(thrust_data[0], errors='coerce')
-        thrust_data[1] = pd.to_numeric(thrust_data[1], errors='coerce')
-        thrust_data = thrust_data.dropna().to_numpy()
+        forces = self.thrust_forces(thruster_output)
 
-        # Constants and placeholders
-        drag_matrix = np.array([0.1, 0.1, 0.1, 0.05, 0.05, 0.05])  # Placeholder drag coefficients
-        auv_mass = 20.0  # Mass of the AUV in kg
-        auv_inertia = np.array([10.0, 10.0, 10.0])  # Placeholder inertia
-
-        # Initialize arrays for forces and torques
-        total_force = np.zeros(3)  # Surge, Sway, Heave
-        total_torque = np.zeros(3)  # Roll, Pitch, Yaw
-
-        # Update logic for thrusters
-        for i in range(self.num_thrusters):
-            # Find the closest PWM value in the thrust data and get the corresponding thrust value
-            pwm_value = thruster_output[i]
-            closest_pwm_index = np.abs(thrust_data[:, 0] - pwm_value).argmin()
-            force = thrust_data[closest_pwm_index, 1]
-
-            # Calculate angle and position for horizontal and vertical thrusters
-            if i < 4:  # Horizontal thrusters
-                angle = np.deg2rad(self.horizontal_motor_angles + 90 * i)
-                direction = np.array([np.cos(angle), np.sin(angle), 0])
-                position = np.array([self.horizontal_motor_distance * np.cos(angle), 
-                                    self.horizontal_motor_distance * np.sin(angle), 
-                                    0])
-            else:  # Vertical thrusters
-                direction = np.array([0, 0, -1])  # Assuming downward force
-                position = np.array([self.vertical_motor_distance * np.cos(np.deg2rad(90 * (i - 4))),
-                                    self.vertical_motor_distance * np.sin(np.deg2rad(90 * (i - 4))),
-                                    0])
-
-            # Add the force and torque contributions of each thruster
-            total_force += force * direction
-            total_torque += np.cross(position, force * direction)
-
-        # Convert total force and torque to acceleration
-        linear_acc = total_force / auv_mass
-        angular_acc = total_torque / auv_inertia
+        # Forces and torques of every thruster divided by mass and inertia, in one matmul
+        acceleration = forces @ self.acceleration_matrix
 
         # Update sensor data (velocity) based on total acceleration
-        self.sensor_data[:3] += linear_acc * time_step  # Update linear velocity (surge, sway, heave)
-        self.sensor_data[3:] += angular_acc * time_step  # Update angular velocity (roll, pitch, yaw)
+        self.sensor_data += acceleration * time_step
 
         # Apply drag (assuming linear drag model)
-        self.sensor_data -= drag_matrix * self.sensor_data * time_step
+        self.sensor_data -= self.drag_matrix * self.sensor_data * time_step
 
         return self.sensor_data
 
-    def map_data(self, data):
+    def thrust_forces(self, thruster_output: np.ndarray) -> np.ndarray:
         """
-        Map the output data from the PID controller to actual motor values.
-        @param data: The output data from the PID controller (1x8 matrix).
-        @return: The mapped motor values (1x8 matrix).
+        Map PWM values to thruster forces using the shared thrust curve.
+        @param thruster_output: PWM values of any shape, the last axis being the thrusters.
+        @return: The force of each thruster, same shape as the input.
+        """
+        # The curve is parsed once and shared between every instance
+        if self.thruster_curve is None:
+            self.thruster_curve = ThrusterCurve.load(self.thrust_curve_file, self.thrust_interpolation)
+        return self.thruster_curve(thruster_output)
+
+    def step_many(self, thruster_outputs: np.ndarray, dt: float) -> np.ndarray:
+        """
+        Integrate a whole trajectory of thruster outputs, equivalent to calling sensor_update once per row.
+
+        Each step is v = (v + a * dt) * (1 - drag * dt), a first order linear recurrence, so the
+        whole trajectory is solved with one IIR filter per DOF instead of a Python loop over steps.
+
+        @param thruster_outputs: PWM values with shape (T, num_thrusters).
+        @param dt: Time step in seconds between rows.
+        @return: The sensor data after every step, shape (T, num_dof). sensor_data holds the last row.
         """
-        in_min, in_max = -1, 1
-        out_min, out_max = 1000, 2000
+        from scipy.signal import lfilter
 
-        out_data = np.zeros(data.shape)  # Initialize an array of the same shape as input
+        acceleration = self.thrust_forces(thruster_outputs) @ self.acceleration_matrix
+        decay = 1.0 - self.drag_matrix * dt
 
-        # Map each element in the thruster data to the new range
-        for i in range(len(data)):
-            out_data[i] = round((data[i] - in_min) * (out_max - out_min) / (in_max - in_min) + out_min)
+        trajectory = np.empty(acceleration.shape)
+        for i in range(self.num_dof):
+            trajectory[:, i], _ = lfilter([decay[i] * dt], [1.0, -decay[i]], acceleration[:, i], zi=[decay[i] * self.sensor_data[i]])
 
-        return out_data
+        if len(trajectory):
+            self.sensor_data[:] = trajectory[-1]
+        return trajectory
 
-    def run(self, desired_values = np.array([0.0, 0.0, 0.0, 0.0, 0.0, 0.0]), num_iterations=100, time_step=0.1, output_file = "thruster_outputs.csv"):
+    def map_data(self, data):
+        """
+        Map the output data from the PID controller to actual motor values.
+        Commands are clipped to [-1, 1] before mapping.
+        @param data: The output data from the PID controller (1x8 matrix), or a batch of them.
+        @return: The mapped motor values as uint16 (1x8 matrix). A single command is written
+                 into a reused buffer that the next call overwrites.
+        """
+        return self.pwm_mapper(data)
+
+    def run(self, desired_values = np.array([0.0, 0.0, 0.0, 0.0, 0.0, 0.0]), num_iterations=100, time_step=0.1, output_file = "thruster_outputs.csv", realtime_factor : Optional[float] = 1.0, sink : TelemetrySink = None) -> TelemetrySink:
         """
         Run the movement package for testing and tuning the PID controllers.
+        The PIDs are stamped with a simulated clock that advances by exactly time_step per
+        iteration, so results do not depend on scheduler jitter or on the pacing below.
+        Plotting lives in the offline tool modules/Telemetry_Plot.py.
         @param num_iterations: Number of iterations to run the simulation.
         @param time_step: Time step for each iteration in seconds.
+        @param output_file: CSV file written when no sink is given. None disables telemetry.
+        @param realtime_factor: How many times faster than real time to pace the loop, e.g. 1.0 or 10.0.
+                                None runs as fast as the CPU allows.
+        @param sink: Telemetry sink receiving one row per iteration, e.g. RingBufferSink or BinaryLogSink.
+        @return: The telemetry sink that was used, or None.
         """
         # Prompt for initial desired and sensor values
         sensor_values = np.array([0.0, 0.0, 0.0, 0.0, 0.0, 0.0])
 
-        pid_outputs = np.zeros((num_iterations, self.num_dof))
-        thruster_outputs = np.zeros((num_iterations, self.num_thrusters))
-        logged_sensor_values = np.zeros((num_iterations, self.num_dof))
-        logged_desired_values = np.zeros((num_iterations, self.num_dof))
-
-        for i in range(num_iterations):
-            logged_desired_values[i] = desired_values
-            logged_sensor_values[i] = sensor_values
-
-            pid_output, thruster_output = self.update(desired_values, sensor_values)
-            pid_outputs[i] = pid_output
-            thruster_outputs[i] = thruster_output
+        if sink is None and output_file is not None:
+            sink = CSVSink(output_file)
 
-            # Update sensor values using the sensor_update function
-            sensor_values = self.sensor_update(thruster_output, time_step)
-
-            time.sleep(time_step)
-
-        # Create DataFrame from the logged data
-        time_axis = np.arange(0, num_iterations * time_step, time_step)
-        data = {'Time': time_axis}
+        # One preallocated row per iteration, in the column order of the old CSV export
+        columns = ['Time']
         for i in range(self.num_dof):
-            data[f'Desired_{i+1}'] = logged_desired_values[:, i]
-            data[f'Sensor_{i+1}'] = logged_sensor_values[:, i]
-            data[f'PID_{i+1}'] = pid_outputs[:, i]
-        for i in range(self.num_thrusters):
-            data[f'Thruster_{i+1}'] = thruster_outputs[:, i]
-        df = pd.DataFrame(data)
-
-        # Save to CSV
-        df.to_csv(output_file, index=False)
-        print(f"Data logged to {output_file}")
-
-        # Plotting the thruster outputs
-        time_axis = np.arange(0, num_iterations * time_step, time_step)
-        
-        # Create a figure with subplots arranged in 3 rows and 3 columns
-        fig, axs = plt.subplots(3, 3, figsize=(15, 10))  # Adjust figsize as needed
-
-        for i in range(self.num_thrusters):
-            # Determine the row and column to place each subplot
-            row = i // 3
-            col = i % 3
-            axs[row, col].plot(time_axis, thruster_outputs[:, i], label=f'Thruster {i+1}')
-            axs[row, col].set_xlabel('Time (seconds)')
-            axs[row, col].set_ylabel('Output')
-            axs[row, col].set_title(f'Thruster {i+1} Output Over Time')
-            axs[row, col].legend()
-
-            # Set y-axis centered at 1500 with range from 1000 to 2000
-            axs[row, col].set_ylim([1000, 2000])
-            axs[row, col].axhline(y=1500, color='r', linestyle='--', linewidth=0.3)  # Optional: add a horizontal line at 1500 for reference
-
-        # Hide the last subplot (which is empty)
-        axs[-1, -1].axis('off')
-
-        plt.tight_layout()  # Adjusts the plots to fit into the figure area.
-        plt.show()
-
+            columns += [f'Desired_{i+1}', f'Sensor_{i+1}', f'PID_{i+1}']
+        columns += [f'Thruster_{i+1}' for i in range(self.num_thrusters)]
+        row = np.zeros(len(columns))
+        dof_rows = row[1:1 + 3 * self.num_dof].reshape(self.num_dof, 3)
+        thruster_row = row[1 + 3 * self.num_dof:]
+        if sink is not None:
+            sink.open(columns)
+
+        # Pace against absolute deadlines so sleep overshoot does not accumulate
+        start_time = time.perf_counter()
+
+        try:
+            for i in range(num_iterations):
+                row[0] = i * time_step
+                dof_rows[:, 0] = desired_values
+                dof_rows[:, 1] = sensor_values
+
+                pid_output, thruster_output = self.update(desired_values, sensor_values, self.sim_time)
+                dof_rows[:, 2] = pid_output
+                thruster_row[:] = thruster_output
+                if sink is not None:
+                    sink.write(row)
+
+                # Update sensor values using the sensor_update function
+                sensor_values = self.sensor_update(thruster_output, time_step)
+                self.sim_time += time_step
+
+                if realtime_factor is not None:
+                    delay = start_time + (i + 1) * time_step / realtime_factor - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+        finally:
+            if sink is not None:
+                sink.close()
+
+        return sink
+
+# Run from the AUV folder: python -m modules.Movement_Package
+# Plot the results afterwards with: python -m modules.Telemetry_Plot data_out/*.csv
 if __name__ == "__main__":
     mp = Movement_Package(standalone=True)
     desired_values = [np.array([-1.0, 0.0, 0.0, 0.0, 0.0, 0.0]),\
@@ -387,6 +806,7 @@ if __name__ == "__main__":
                       np.array([0.5, 0.0, 0.0, 0.0, 0.0, 0.0]),\
                       np.array([1.0, 0.0, 0.0, 0.0, 0.0, 0.0]),\
                       ]
-    for desired_value in desired_values:
+    for i, desired_value in enumerate(desired_values):
+        # Unbounded runs finish within the same second, so the index keeps the file names unique
         timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-        mp.run(desired_values=desired_value, output_file=f"data_out/{timestamp}_thruster_outputs.csv")
\ No newline at end of file
+        mp.run(desired_values=desired_value, output_file=f"data_out/{timestamp}_{i}_thruster_outputs.csv", realtime_factor=None)
\ No newline at end of file
@@ -1,27 +1,175 @@
 #!/usr/bin/env python3
 
-from io import BytesIO
+import collections
 import logging
 import socket
+import struct
+import time
 from typing import Any
 
 import numpy as np
 
+# Frame header: magic, version, dtype code, ndim, shape (up to 4 dims), payload length, sequence number, timestamp
+FRAME_MAGIC = b'AUVF'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('<4sBBBx4IQId')
+FRAME_MAX_DIMS = 4
+
+# dtype codes carried in the header, the index into this tuple is sent on the wire
+FRAME_DTYPES = tuple(np.dtype(code) for code in ('u1', 'i1', '<u2', '<i2', '<u4', '<i4', '<u8', '<i8', '<f4', '<f8', '?'))
+
+# Control packet header: magic, version, number of values, session id, sequence number, timestamp, followed by float64 values
+CONTROL_MAGIC = b'AUVC'
+CONTROL_VERSION = 1
+CONTROL_HEADER = struct.Struct('<4sBBxxIQd')
+
+
+def pack_frame_header(frame: np.ndarray, sequence: int) -> bytes:
+    """
+    ## Pack the fixed-size header describing a numpy frame.
+    @param frame: The contiguous numpy array frame to describe.
+    @param sequence: The sequence number of the frame.
+    @return: The packed header.
+    """
+    dtype = frame.dtype
+    if dtype not in FRAME_DTYPES:
+        raise ValueError(f"Unsupported frame dtype: {frame.dtype}")
+    if frame.ndim > FRAME_MAX_DIMS:
+        raise ValueError(f"Frames may have at most {FRAME_MAX_DIMS} dimensions, got {frame.ndim}")
+
+    shape = tuple(frame.shape) + (0,) * (FRAME_MAX_DIMS - frame.ndim)
+    return FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, FRAME_DTYPES.index(dtype), frame.ndim,
+                             *shape, frame.nbytes, sequence, time.time())
+
+
+def unpack_frame(buffer: bytearray, offset: int = 0) -> tuple[np.ndarray, int, float]:
+    """
+    ## Parse one complete frame, header included, without copying it.
+    @param buffer: The buffer holding the frame.
+    @param offset: Position of the frame header in the buffer.
+    @return: Tuple of the frame as a view into the buffer, its sequence number and its send timestamp.
+    """
+    magic, version, dtype_code, ndim, *rest = FRAME_HEADER.unpack_from(buffer, offset)
+    shape, (length, sequence, timestamp) = rest[:FRAME_MAX_DIMS], rest[FRAME_MAX_DIMS:]
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError(f"Invalid frame header: {bytes(buffer[offset:offset + FRAME_HEADER.size])!r}")
+
+    dtype = FRAME_DTYPES[dtype_code]
+    frame = np.frombuffer(buffer, dtype=dtype, count=length // dtype.itemsize, offset=offset + FRAME_HEADER.size)
+    return frame.reshape(tuple(shape[:ndim])), sequence, timestamp
+
+
+def frame_buffers(frame: np.ndarray, sequence: int) -> list:
+    """
+    ## Header and payload of a frame, ready for scatter-gather sending.
+    @param frame: The numpy array frame to send.
+    @param sequence: The sequence number of the frame.
+    @return: List of the packed header and a byte view of the frame.
+    """
+    # np.ascontiguousarray would promote 0-d arrays to 1-d, so only copy when the layout requires it
+    frame = np.asarray(frame)
+    if not frame.flags.c_contiguous:
+        frame = frame.copy()
+    return [pack_frame_header(frame, sequence), memoryview(frame.reshape(-1).view(np.uint8))]
+
+
+
+class FrameReader:
+    """
+    ## FrameReader class
+    Stateful per-connection frame parser over a persistent receive buffer.
+    Bytes that arrive past the end of a frame are kept for the next call, frames are returned
+    as views into the buffer, and the buffer only grows when a frame does not fit.
+    Frames returned by one call stay valid until the next call to `fill`.
+    """
+    def __init__(self, capacity: int = 1 << 20):
+        """
+        ## Initialize the reader.
+        @param capacity: Initial size of the receive buffer in bytes.
+        """
+        self.buffer = bytearray(capacity)
+        self.start = 0
+        self.end = 0
+        self.last_sequence = None
+        self.last_timestamp = None
+
+    def fill(self, sock: socket.socket, bufsize: int, flags: int = 0) -> int:
+        """
+        ## Receive more bytes from the socket into the free space of the buffer.
+        Leftover bytes are moved to the front first, and the buffer is replaced by a larger one
+        if the pending frame does not fit.
+        @param sock: The socket to read from.
+        @param bufsize: The largest chunk requested from the socket per call.
+        @param flags: Flags passed to `recv_into`, e.g. `socket.MSG_DONTWAIT`.
+        @return: The number of bytes received, 0 if the connection was closed.
+        """
+        pending = self.end - self.start
+        needed = max(self.__pending_frame_size(), FRAME_HEADER.size, pending + 1)
+        if needed > len(self.buffer):
+            # A new buffer instead of resizing, frames returned earlier may still reference the old one
+            buffer = bytearray(max(needed, 2 * len(self.buffer)))
+            buffer[:pending] = self.buffer[self.start:self.end]
+            self.buffer = buffer
+            self.start, self.end = 0, pending
+        elif self.start > 0 and (pending == 0 or self.start + needed > len(self.buffer)):
+            # Only the partial frame left over at the end is moved to the front
+            self.buffer[:pending] = self.buffer[self.start:self.end]
+            self.start, self.end = 0, pending
+
+        view = memoryview(self.buffer)[self.end:]
+        count = sock.recv_into(view, min(bufsize, len(view)), flags)
+        self.end += count
+        return count
+
+    def __pending_frame_size(self) -> int:
+        """
+        ## Size in bytes of the frame at the front of the buffer, 0 if its header is incomplete.
+        """
+        if self.end - self.start < FRAME_HEADER.size:
+            return 0
+        length = FRAME_HEADER.unpack_from(self.buffer, self.start)[FRAME_MAX_DIMS + 4]
+        return FRAME_HEADER.size + length
+
+    def frame_ready(self) -> bool:
+        """
+        ## Check whether a complete frame is buffered.
+        """
+        size = self.__pending_frame_size()
+        return size > 0 and self.end - self.start >= size
+
+    def next_frame(self) -> np.ndarray | None:
+        """
+        ## Parse the next complete frame in the buffer without copying it.
+        @return: The frame as a view into the buffer, or None if no complete frame is buffered.
+        """
+        if not self.frame_ready():
+            return None
+        size = self.__pending_frame_size()
+
+        frame, self.last_sequence, self.last_timestamp = unpack_frame(self.buffer, self.start)
+        self.start += size
+        return frame
+
 
 class Networking_Package(socket.socket):
     """
     ## Networking_Package class
     Inherits from `socket.socket` and provides specialized methods to send and receive numpy arrays and strings as bytes.
+    Frames are sent as a fixed binary header followed by the raw array buffer, no pickling or zip container involved.
     """
+    # Per-connection state, created on first use so accept() and the base constructor need no changes
+    _send_sequence = 0
+    _reader = None
 
     def sendall(self, frame: np.ndarray) -> None:
         """
         ## Send a numpy frame over the socket.
+        The header and the array buffer are handed to `sendmsg` together, so the frame is never copied.
         @param frame: The numpy array frame to send.
         """
-        out = self.__pack_frame(frame)
-        super_socket = super()
-        super_socket.sendall(out)
+        buffers = frame_buffers(frame, self._send_sequence)
+        self._send_sequence = (self._send_sequence + 1) & 0xFFFFFFFF
+        self.__sendmsg_all(buffers)
         logging.debug("frame sent")
 
     def send_string_as_bytes(self, string: str) -> None:
@@ -33,35 +181,73 @@ class Networking_Package(socket.socket):
         super().sendall(byte_array)
         logging.debug(f"String '{string}' sent as bytes")
 
-    def recv(self, bufsize: int = 1024) -> np.ndarray:
+    @property
+    def reader(self) -> FrameReader:
+        """
+        ## The persistent frame reader of this connection.
+        """
+        if self._reader is None:
+            self._reader = FrameReader()
+        return self._reader
+
+    @property
+    def last_sequence(self) -> int | None:
+        """
+        ## Sequence number of the last frame returned by `recv` or `recv_many`.
+        """
+        return self.reader.last_sequence
+
+    @property
+    def last_timestamp(self) -> float | None:
+        """
+        ## Send timestamp of the last frame returned by `recv` or `recv_many`.
+        """
+        return self.reader.last_timestamp
+
+    def recv(self, bufsize: int = 65536) -> np.ndarray:
         """
         ## Receive a numpy frame over the socket.
-        @param bufsize: The size of the buffer to use for receiving data. Defaults to 1024.
-        @return: The received numpy array.
+        Frames are parsed from a persistent buffer, so bytes of the next frame that arrive in the same
+        read are kept for the next call. The returned array is a view into that buffer and stays valid
+        until the next call to `recv` or `recv_many`. Copy it to keep it.
+        The sequence number and timestamp of the frame are available as `last_sequence` and `last_timestamp`.
+        @param bufsize: The largest chunk requested from the socket per call. Defaults to 65536.
+        @return: The received numpy array, or an empty array if the connection was closed.
         """
-        length = None
-        frame_buffer = bytearray()
-        while True:
-            data = super().recv(bufsize)
-            if len(data) == 0:
+        reader = self.reader
+        while not reader.frame_ready():
+            if reader.fill(self, bufsize) == 0:
                 return np.array([])
-            frame_buffer += data
+        logging.debug("frame received")
+        return reader.next_frame()
 
-            while True:
-                if length is None:
-                    if b":" not in frame_buffer:
-                        break
-                    length_str, _, frame_buffer = frame_buffer.partition(b":")
-                    length = int(length_str)
+    def recv_many(self, bufsize: int = 1 << 20) -> list[np.ndarray]:
+        """
+        ## Receive every complete frame that is available.
+        Blocks until at least one frame is complete, then drains whatever the socket already holds
+        without blocking, and parses every complete frame from the buffer.
+        The returned arrays are views that stay valid until the next call to `recv` or `recv_many`.
+        @param bufsize: The largest chunk requested from the socket per call. Defaults to 1 MiB.
+        @return: List of received numpy arrays, empty if the connection was closed.
+        """
+        reader = self.reader
+        while not reader.frame_ready():
+            if reader.fill(self, bufsize) == 0:
+                return []
 
-                if len(frame_buffer) < length:
+        # Drain into the free space at the end of the buffer only, so nothing is moved or grown
+        while reader.end < len(reader.buffer):
+            try:
+                if reader.fill(self, bufsize, socket.MSG_DONTWAIT) == 0:
                     break
+            except (BlockingIOError, InterruptedError):
+                break
 
-                frame_data = frame_buffer[:length]
-                frame_buffer = frame_buffer[length:]
-                frame = np.load(BytesIO(frame_data), allow_pickle=True)["frame"]
-                logging.debug("frame received")
-                return frame
+        frames = []
+        while reader.frame_ready():
+            frames.append(reader.next_frame())
+        logging.debug(f"{len(frames)} frames received")
+        return frames
 
     def recv_string_as_bytes(self, bufsize: int = 1024) -> str:
         """
@@ -90,22 +276,141 @@ class Networking_Package(socket.socket):
             sock.setblocking(True)
         return sock, addr
 
-    @staticmethod
-    def __pack_frame(frame: np.ndarray) -> bytearray:
+    def __sendmsg_all(self, buffers: list) -> None:
+        """
+        ## Send every buffer with scatter-gather `sendmsg`, resuming after partial sends.
+        @param buffers: The bytes-like objects to send in order.
+        """
+        buffers = [memoryview(buffer) for buffer in buffers]
+        while buffers:
+            sent = self.sendmsg(buffers)
+            while buffers and sent >= len(buffers[0]):
+                sent -= len(buffers[0])
+                buffers.pop(0)
+            if buffers:
+                buffers[0] = buffers[0][sent:]
+
+
+class UDPControlChannel(socket.socket):
+    """
+    ## UDPControlChannel class
+    Latest-value-wins command channel over UDP.
+    Every command is one fixed-size datagram holding a sequence number, a send timestamp and the values.
+    A lost datagram is never retransmitted and never delays later ones, and the receiver drops every
+    command older than the newest one it has seen, so only the newest command is ever applied.
+    A random session id lets the receiver accept a restarted sender whose sequence starts over. A new
+    session takes over only with a newer send timestamp or once the current one has gone quiet, and
+    datagrams of a replaced session are dropped, so delayed datagrams of an old sender never come back.
+    """
+    def __init__(self, num_values: int = 6, family: int = socket.AF_INET, session_grace: float = 1.0):
+        """
+        ## Initialize the channel.
+        @param num_values: Number of float64 values in every command. Both ends must agree.
+        @param family: Address family of the socket. Defaults to IPv4.
+        @param session_grace: Seconds of silence after which a new session is accepted even if its
+                              timestamps are older, e.g. after the sender's clock was set back.
+        """
+        super().__init__(family, socket.SOCK_DGRAM)
+        self.num_values = num_values
+        self.packet_size = CONTROL_HEADER.size + 8 * num_values
+        self.session = int.from_bytes(np.random.bytes(4), 'little')
+        self.sequence = 0
+
+        self._packet = bytearray(self.packet_size)
+        self._values = np.frombuffer(self._packet, dtype='<f8', offset=CONTROL_HEADER.size)
+        # One byte longer than a command, so an oversized datagram shows up in its length instead of being cut to size
+        self._received = bytearray(self.packet_size + 1)
+        self._received_values = np.frombuffer(self._received, dtype='<f8', offset=CONTROL_HEADER.size, count=num_values)
+        self.session_grace = session_grace
+        self.replaced_sessions = collections.deque(maxlen=16)
+        self.latest_values = np.zeros(num_values)
+        self.latest_session = None
+        self.latest_sequence = None
+        self.latest_timestamp = None
+        self.latest_received = None
+        self.dropped = 0
+
+    def send_command(self, values: np.ndarray, address: tuple = None) -> None:
+        """
+        ## Send one command.
+        @param values: The command values, `num_values` floats.
+        @param address: Destination address. May be omitted after `connect`.
+        """
+        CONTROL_HEADER.pack_into(self._packet, 0, CONTROL_MAGIC, CONTROL_VERSION, self.num_values,
+                                 self.session, self.sequence, time.time())
+        self._values[:] = values
+        self.sequence += 1
+        if address is None:
+            self.send(self._packet)
+        else:
+            self.sendto(self._packet, address)
+
+    def poll(self, timeout: float = 0.0) -> bool:
         """
-        ## Pack a numpy frame into a byte array with a header indicating its size.
-        @param frame: The numpy array frame to pack.
-        @return: The packed byte array.
+        ## Read every datagram that has arrived and keep the newest command.
+        Stale, out-of-order and malformed datagrams are dropped and counted in `dropped`.
+        @param timeout: Seconds to wait for the first datagram, 0 to return at once and None to wait forever.
+        @return: True if a newer command was received.
         """
-        f = BytesIO()
-        np.savez(f, frame=frame)
+        updated = False
+        self.settimeout(timeout)
+        try:
+            while True:
+                count = self.recv_into(self._received)
+                updated |= self.__accept_packet(count)
+                # Only the first read may wait, the rest drain what is already queued
+                self.settimeout(0.0)
+        except (BlockingIOError, TimeoutError, InterruptedError):
+            pass
+        return updated
 
-        packet_size = len(f.getvalue())
-        header = f"{packet_size}:"
-        header_bytes = bytes(header.encode())
+    def latest(self, max_age: float = None, default: np.ndarray = None) -> np.ndarray:
+        """
+        ## The newest command, or a failsafe value when commands have stopped arriving.
+        @param max_age: Maximum age in seconds before the command counts as stale. None never expires it.
+        @param default: Value returned when there is no command or it is stale, e.g. zeros to stop the thrusters.
+        @return: The newest command values, updated in place by `poll`, or `default`.
+        """
+        age = self.age()
+        if age is None or (max_age is not None and age > max_age):
+            return default
+        return self.latest_values
 
-        out = bytearray(header_bytes)
-        f.seek(0)
-        out += f.read()
+    def age(self) -> float | None:
+        """
+        ## Seconds since the newest command was received, None if no command was received yet.
+        """
+        if self.latest_received is None:
+            return None
+        return time.monotonic() - self.latest_received
+
+    def __accept_packet(self, count: int) -> bool:
+        """
+        ## Parse the received datagram and keep it if it is newer than the latest command.
+        """
+        if count != self.packet_size:
+            self.dropped += 1
+            return False
+        magic, version, num_values, session, sequence, timestamp = CONTROL_HEADER.unpack_from(self._received)
+        if magic != CONTROL_MAGIC or version != CONTROL_VERSION or num_values != self.num_values:
+            self.dropped += 1
+            return False
+        if session == self.latest_session:
+            if sequence <= self.latest_sequence:
+                self.dropped += 1
+                return False
+        elif self.latest_session is not None:
+            if session in self.replaced_sessions:
+                self.dropped += 1
+                return False
+            if timestamp <= self.latest_timestamp and self.age() < self.session_grace:
+                self.dropped += 1
+                return False
+            self.replaced_sessions.append(self.latest_session)
 
-        return out
+        self.latest_values[:] = self._received_values
+        self.latest_session = session
+        self.latest_sequence = sequence
+        self.latest_timestamp = timestamp
+        self.latest_received = time.monotonic()
+        return True
@@ -0,0 +1,223 @@
+from typing import NamedTuple
+
+import numpy as np
+
+
+class Tracks(NamedTuple):
+    """
+    Tracked objects of one frame as compact arrays, n being the number of tracks.
+    """
+    ids: np.ndarray          # (n,) int64 identities, kept while an object is tracked
+    boxes: np.ndarray        # (n, 4) float32, x1 y1 x2 y2 in pixels of the frame
+    scores: np.ndarray       # (n,) float32 confidence of the last detection of the object
+    classes: np.ndarray      # (n,) int32 class ids
+    confidences: np.ndarray  # (n,) float32 score decayed by the frames since the last detection
+
+
+def iou_matrix(a : np.ndarray, b : np.ndarray) -> np.ndarray:
+    """
+    Intersection over union of every pair of boxes.
+
+    @param a: (n, 4) x1 y1 x2 y2.
+    @param b: (m, 4) x1 y1 x2 y2.
+    @return: (n, m) IoU.
+    """
+    a = a[:, None, :]
+    b = b[None, :, :]
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-9)
+
+
+def boxes_to_measurements(boxes : np.ndarray) -> np.ndarray:
+    """
+    @param boxes: (n, 4) x1 y1 x2 y2.
+    @return: (n, 4) centre x, centre y, area and aspect ratio.
+    """
+    width = boxes[:, 2] - boxes[:, 0]
+    height = np.maximum(boxes[:, 3] - boxes[:, 1], 1e-6)
+    return np.stack([boxes[:, 0] + width / 2, boxes[:, 1] + height / 2, width * height, width / height], axis=1)
+
+
+def measurements_to_boxes(measurements : np.ndarray) -> np.ndarray:
+    """
+    @param measurements: (n, 4) or more columns starting with centre x, centre y, area and aspect ratio.
+    @return: (n, 4) x1 y1 x2 y2.
+    """
+    width = np.sqrt(np.maximum(measurements[:, 2] * measurements[:, 3], 0))
+    height = np.divide(measurements[:, 2], width, out=np.zeros_like(width), where=width > 0)
+    return np.stack([measurements[:, 0] - width / 2, measurements[:, 1] - height / 2,
+                     measurements[:, 0] + width / 2, measurements[:, 1] + height / 2], axis=1)
+
+
+class Tracker:
+    """
+    SORT multi-object tracker: every track is a constant velocity Kalman filter over the box centre,
+    area and aspect ratio, and detections are assigned to the predicted tracks by IoU.
+    The filters of all tracks are stepped together as stacked arrays.
+    Between detections update() without detections moves the tracks along their velocity, so
+    detection does not have to run on every frame. The confidence of a track decays with every
+    frame without a detection, which tells when detecting again is due. Detections that arrive
+    some frames after the frame they were made on are matched and applied where the tracks were
+    on that frame and moved to the current one with the track velocities.
+
+    Assignment is by IoU alone, so a track only keeps its identity if its box still overlaps the next
+    detection of the object. Until a track has learned its velocity from two detections, the object
+    may move at most about its box size between detections: detect_every * speed in pixels per
+    frame has to stay below the box width and height, or every detection starts a new track and the
+    old ones coast on for `max_age` frames.
+    """
+    # State: centre x, centre y, area, aspect ratio, and the velocities of the first three
+    F = np.eye(7)
+    F[0, 4] = F[1, 5] = F[2, 6] = 1
+    Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.0001])
+    R = np.diag([1.0, 1.0, 10.0, 10.0])
+    P0 = np.diag([10.0, 10.0, 10.0, 10.0, 10000.0, 10000.0, 10000.0])
+
+    def __init__(self, iou_threshold : float = 0.3, max_age : int = 30, min_hits : int = 1, decay : float = 0.9, class_aware : bool = True):
+        """
+        @param iou_threshold: Smallest IoU of a detection with a predicted track to be assigned to it.
+        @param max_age: Frames a track is kept without a detection.
+        @param min_hits: Detections a track needs before it is reported.
+        @param decay: Factor the confidence of a track is multiplied with every frame without a detection.
+        @param class_aware: Only assign detections to tracks of the same class.
+        """
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.decay = decay
+        self.class_aware = class_aware
+        self.next_id = 0
+        self.frames = 0
+        self._allocate(0)
+
+    def _allocate(self, n):
+        self.ids = np.zeros(n, dtype=np.int64)
+        self.x = np.zeros((n, 7))
+        self.P = np.zeros((n, 7, 7))
+        self.scores = np.zeros(n, dtype=np.float32)
+        self.classes = np.zeros(n, dtype=np.int32)
+        self.hits = np.zeros(n, dtype=np.int64)
+        self.misses = np.zeros(n, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _predict(self):
+        # Keep the area from going negative
+        self.x[self.x[:, 2] + self.x[:, 6] <= 0, 6] = 0
+        self.x = self.x @ self.F.T
+        self.P = self.F @ self.P @ self.F.T + self.Q
+        self.misses += 1
+
+    def _correct(self, tracks, measurements):
+        x, P = self.x[tracks], self.P[tracks]
+        residual = measurements - x[:, :4]
+        gain = P[:, :, :4] @ np.linalg.inv(P[:, :4, :4] + self.R)
+        self.x[tracks] = x + (gain @ residual[:, :, None])[:, :, 0]
+        self.P[tracks] = P - gain @ P[:, :4, :]
+
+    def _associate(self, boxes, classes, age):
+        if len(self) == 0 or len(boxes) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        from scipy.optimize import linear_sum_assignment
+
+        predicted = self.x
+        if age:
+            # Where the tracks were on the frame the detections were made on
+            predicted = self.x[:, :4].copy()
+            predicted[:, :3] -= age * self.x[:, 4:]
+        iou = iou_matrix(measurements_to_boxes(predicted), boxes)
+        if self.class_aware:
+            iou[self.classes[:, None] != classes[None, :]] = 0
+        tracks, detections = linear_sum_assignment(iou, maximize=True)
+        matched = iou[tracks, detections] >= self.iou_threshold
+        return tracks[matched], detections[matched]
+
+    def update(self, boxes : np.ndarray = None, scores : np.ndarray = None, classes : np.ndarray = None, age : int = 0) -> Tracks:
+        """
+        Advance the tracks by one frame and correct them with the detections, if any.
+
+        @param boxes: (n, 4) detected x1 y1 x2 y2, None on a frame without detection.
+        @param scores: (n,) detection confidences, ones if None.
+        @param classes: (n,) class ids, zeros if None.
+        @param age: Frames between the frame the detections were made on and this one, e.g. the
+                    pipeline latency of an asynchronous detector. 0 for detections of this frame.
+        @return: The tracks of the frame.
+        """
+        self.frames += 1
+        self._predict()
+        if boxes is not None:
+            boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+            scores = np.ones(len(boxes), dtype=np.float32) if scores is None else np.asarray(scores, dtype=np.float32)
+            classes = np.zeros(len(boxes), dtype=np.int32) if classes is None else np.asarray(classes, dtype=np.int32)
+            tracks, detections = self._associate(boxes, classes, age)
+            if len(tracks):
+                measurements = boxes_to_measurements(boxes[detections])
+                # Move the old measurements to this frame along the track velocities
+                measurements[:, :3] += age * self.x[tracks, 4:]
+                self._correct(tracks, measurements)
+                self.scores[tracks] = scores[detections]
+                self.hits[tracks] += 1
+                self.misses[tracks] = 0
+
+            # Every detection nothing was assigned to starts a track
+            new = np.ones(len(boxes), dtype=bool)
+            new[detections] = False
+            count = int(new.sum())
+            if count:
+                x = np.zeros((count, 7))
+                x[:, :4] = boxes_to_measurements(boxes[new])
+                self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + count)])
+                self.next_id += count
+                self.x = np.concatenate([self.x, x])
+                self.P = np.concatenate([self.P, np.broadcast_to(self.P0, (count, 7, 7))])
+                self.scores = np.concatenate([self.scores, scores[new]])
+                self.classes = np.concatenate([self.classes, classes[new]])
+                self.hits = np.concatenate([self.hits, np.ones(count, dtype=np.int64)])
+                self.misses = np.concatenate([self.misses, np.zeros(count, dtype=np.int64)])
+
+        keep = self.misses <= self.max_age
+        if not keep.all():
+            for name in ('ids', 'x', 'P', 'scores', 'classes', 'hits', 'misses'):
+                setattr(self, name, getattr(self, name)[keep])
+        return self.tracks()
+
+    def confidences(self) -> np.ndarray:
+        """
+        @return: (n,) score of every track decayed by the frames since its last detection.
+        """
+        return (self.scores * self.decay ** self.misses).astype(np.float32)
+
+    def confidence(self) -> float:
+        """
+        @return: Lowest confidence of the reported tracks, 1 without tracks.
+        """
+        reported = self.hits >= self.min_hits
+        return float(self.confidences()[reported].min()) if reported.any() else 1.0
+
+    def tracks(self) -> Tracks:
+        """
+        @return: The reported tracks, those with at least `min_hits` detections.
+        """
+        reported = self.hits >= self.min_hits
+        return Tracks(self.ids[reported], measurements_to_boxes(self.x[reported]).astype(np.float32),
+                      self.scores[reported], self.classes[reported], self.confidences()[reported])
+
+    def reset(self):
+        """
+        Drop all tracks.
+        """
+        self._allocate(0)
+
+# Run from the AUV folder: python -m modules.Object_Tracker
+if __name__ == "__main__":
+    tracker = Tracker()
+    for frame in range(10):
+        # One object moving right, detected every third frame
+        boxes = np.array([[100 + 5 * frame, 100, 150 + 5 * frame, 140]]) if frame % 3 == 0 else None
+        tracks = tracker.update(boxes)
+        print(f"Frame {frame}: ids {tracks.ids.tolist()}, boxes {tracks.boxes.round(1).tolist()}, confidence {tracker.confidence():.2f}")
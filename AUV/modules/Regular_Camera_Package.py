@@ -1,59 +1,154 @@
+import time
+
 import cv2
 import numpy as np
-from ultralytics import YOLO
+
+from modules.Detection_Pipeline import DetectionStage, YOLOModel
+from modules.Frame_Grabber import CameraSource, FrameGrabber
+from modules.Frame_Preprocessor import FramePreprocessor
+from modules.Object_Tracker import Tracker
 
 class Camera_Package:
-    def __init__(self, model = 'yolov8n.pt'):
-        self.cam = cv2.VideoCapture(0)
-        self.cam.set(cv2.CV_PROP_FRAME_WIDTH, 1920)
-        self.cam.set(cv2.CV_PROP_FRAME_HEIGHT, 1080)
+    def __init__(self, model = 'yolov8n.pt', source = None, imgsz : int = 640, batch_size : int = 1, threads : int = None, max_latency : float = 0.5,
+                 roi : tuple = None, pyramid_level : int = 0, detect_every : int = 1, min_confidence : float = 0.5):
+        """
+        @param model: YOLO weights file or exported model (e.g. yolov8n.onnx for CPU-only machines),
+                      or a callable with the interface of YOLOModel.
+        @param source: Frame source, defaults to camera 0 at 1920x1080. FileSource or SyntheticSource
+                       from modules.Frame_Grabber run without a camera.
+        @param imgsz: Inference size of the YOLO model.
+        @param batch_size: Largest number of frames run through the model at once.
+        @param threads: Number of CPU threads for inference, None leaves the library default.
+        @param max_latency: Frames older than this many seconds are skipped instead of detected.
+        @param roi: (x, y, width, height) region of the frame that is sent and detected in, None for the whole frame.
+        @param pyramid_level: Number of times the region is halved before it is resized, see FramePreprocessor.
+        @param detect_every: track() queues every this many frames for detection and follows the objects
+                             with the tracker in between.
+        @param min_confidence: track() also queues a frame when a track's confidence decays below this.
+        """
+        # Capture runs on its own thread, so detection never waits on the camera and never gets stale frames
+        if source is None:
+            source = CameraSource(0, 1920, 1080)
+        self.grabber = FrameGrabber(source)
+        self.grabber.start()
+
+        # The send image and the model input are made together once per frame
+        self.preprocessor = FramePreprocessor(self.grabber.shape, send_width=480, model_size=imgsz, roi=roi, pyramid_level=pyramid_level)
+        self.send_width = self.preprocessor.send_width
+        self.send_height = self.preprocessor.send_height
+        self.index = None
+        # Index of the last frame returned by grab_image
+        self.sent_index = None
 
-        self.image = None
+        # Detection runs on its own thread too, it only ever sees the newest frames
+        if isinstance(model, str):
+            model = YOLOModel(model, imgsz=imgsz, threads=threads)
+        self.detector = DetectionStage(model, batch_size=batch_size, max_latency=max_latency)
+        self.detector.start()
 
-        self.send_width = 480
-        self.send_height = 270
+        # Tracks follow the detected objects between detections
+        self.tracker = Tracker()
+        self.detect_every = detect_every
+        self.min_confidence = min_confidence
+        self.frames_since_detection = detect_every
+        self.detection_index = None
+        self.tracked_index = None
 
-        self.model = YOLO(model)
+    def preprocess(self, img, index : int = None):
+        """
+        Make the send image and the model input of a frame, once per frame index.
+
+        @param img: Frame from the grabber.
+        @param index: Frame index from the grabber, None to always preprocess.
+        @return: Tuple of the send image and the model image, reused for the next frame.
+        """
+        if index is None or index != self.index:
+            self.preprocessor(img)
+            self.index = index
+        return self.preprocessor.send_image, self.preprocessor.model_image
 
     def grab_image(self):
-        ret, img = self.cam.read()
-        if img is not None:
-            return self.resize(img)
-        else:
+        """
+        @return: The newest frame resized for sending, or None if no new frame arrived within a second
+                 or the grabber has stopped. The array is reused for the next frame.
+        """
+        img, index, timestamp = self.grabber.latest(timeout=1.0)
+        # latest() hands back the last frame again on a timeout and once the grabber has stopped
+        if img is None or index == self.sent_index:
             return None
+        self.sent_index = index
+        return self.preprocess(img, index)[0]
+
+    def detect(self, img, index : int = None, timestamp : float = None):
+        """
+        Queue a frame for detection without waiting for the model.
+
+        @param img: Frame to detect objects in.
+        @param index: Frame index from the grabber.
+        @param timestamp: Capture time from the grabber.
+        @return: Detections (boxes in frame pixels, scores and classes as arrays) of the newest frame processed
+                 so far, which may be an earlier frame than img, or None before the first result.
+        """
+        # Only the small letterboxed model image is queued, YOLO does not need to resize it again
+        self.detector.submit(self.preprocess(img, index)[1], index, timestamp)
+        detections = self.detector.latest()
+        if detections is None:
+            return None
+        return detections._replace(boxes=self.preprocessor.to_frame(detections.boxes))
+
+    def track(self, img, index : int = None, timestamp : float = None):
+        """
+        Follow the objects in a new frame, queueing it for detection only every `detect_every` frames or
+        when a track's confidence has decayed below `min_confidence`. Call it once per frame.
+
+        @param img: Frame from the grabber.
+        @param index: Frame index from the grabber.
+        @param timestamp: Capture time from the grabber.
+        @return: Tracks (identities, boxes in frame pixels, scores, classes and confidences as arrays).
+        """
+        self.frames_since_detection += 1
+        due = self.frames_since_detection >= self.detect_every
+        # A low confidence only asks for a detection when none is on its way already
+        if due or (self.tracker.confidence() < self.min_confidence and not self.detector.pending()):
+            self.detector.submit(self.preprocess(img, index)[1], index, timestamp)
+            self.frames_since_detection = 0
 
-    def detect(self, img):
-        results = self.model(img, stream = True)
-        return results
-
-    def resize(self, img):
-        # Grab the image size and initialize dimensions
-        dim = None
-        (h, w) = image.shape[:2]
-
-        # Return original image if no need to resize
-        if self.send_width is None and self.send_height is None:
-            return image
-
-        # We are resizing height if width is none
-        if self.send_width is None:
-            # Calculate the ratio of the height and construct the dimensions
-            r = self.send_height / float(h)
-            dim = (int(w * r), self.send_height)
-        # We are resizing width if height is none
-        else:
-            # Calculate the ratio of the width and construct the dimensions
-            r = self.send_width / float(w)
-            dim = (self.send_width, int(h * r))
-
-        # Return the resized image
-        return cv2.resize(image, dim, interpolation=inter)
+        detections = self.detector.latest()
+        if detections is None or detections.index == self.detection_index:
+            return self.tracker.update()
+        self.detection_index = detections.index
+        # The detections are of an earlier frame, the tracker moves them along to this one
+        age = 0 if index is None or detections.index is None else max(0, index - detections.index)
+        return self.tracker.update(self.preprocessor.to_frame(detections.boxes), detections.scores, detections.classes, age)
 
     def run(self):
-        pass
+        """
+        Track objects in every new frame and print the tracks and the pipeline timing once per second.
+        Returns when the grabber stops, e.g. at the end of a FileSource that does not loop.
+        """
+        last_print = time.monotonic()
+        try:
+            while True:
+                img, index, timestamp = self.grabber.latest(timeout=1.0)
+                # latest() hands back the last frame again on a timeout and once the grabber has stopped
+                if img is None or index == self.tracked_index:
+                    if not self.grabber.running:
+                        break
+                    continue
+                self.tracked_index = index
+                tracks = self.track(img, index, timestamp)
+                if time.monotonic() - last_print > 1.0:
+                    last_print = time.monotonic()
+                    print(f'Frame {index}: {len(tracks.ids)} tracks, ids {tracks.ids.tolist()}, classes {tracks.classes.tolist()}')
+                    print(self.detector.summary())
+                    print(self.preprocessor.summary())
+        except KeyboardInterrupt:
+            pass
+        self.close()
 
     def close(self):
-        self.cam.release()
+        self.detector.stop()
+        self.grabber.stop()
         cv2.destroyAllWindows()
 
 if __name__ == "__main__":
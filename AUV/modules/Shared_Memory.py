@@ -0,0 +1,239 @@
+import ctypes
+import ctypes.util
+import functools
+import os
+import platform
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Counters live on their own cache lines so the producer and the consumer never write the same line
+COUNTER_STRIDE = 64
+DATA_OFFSET = 2 * COUNTER_STRIDE
+# Failed read attempts before a reader yields the CPU to a writer that may be preempted on the same core
+READ_SPINS = 64
+
+
+def _load_fence():
+    # C11 atomic_thread_fence(memory_order_seq_cst) from libatomic, which ships with the GCC runtime
+    path = ctypes.util.find_library('atomic')
+    if path is not None:
+        try:
+            fence = ctypes.CDLL(path).atomic_thread_fence
+        except (OSError, AttributeError):
+            pass
+        else:
+            fence.argtypes = [ctypes.c_int]
+            fence.restype = None
+            return functools.partial(fence, 5)
+    if platform.machine().lower() in ('x86_64', 'amd64', 'i386', 'i686'):
+        # x86 never reorders stores with stores or loads with loads, which is all the fences below are for
+        return lambda: None
+    raise ImportError(f"Shared_Memory needs libatomic for memory fences on {platform.machine()}, e.g. apt install libatomic1")
+
+# Full memory barrier. ARM (Jetson, Raspberry Pi) may make stores visible to another core out of
+# program order, so the counters are only published after the data, and the data only read after the counters.
+memory_fence = _load_fence()
+
+
+class _SharedBlock:
+    """
+    Base class for the shared-memory channels.
+    The creating process owns the block and unlinks it on close. Forked processes inherit the mapping,
+    and pickling the object, e.g. for a spawned Process, sends only its name and layout so the other
+    process attaches to the same block.
+    """
+    def __init__(self, shape, dtype, slots, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        size = DATA_OFFSET + slots * int(np.prod(self.shape)) * self.dtype.itemsize
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner_pid = os.getpid()
+        else:
+            # Child processes share the resource tracker of their parent, so attaching registers nothing new
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner_pid = None
+
+        buffer = self.shm.buf
+        self._first = np.ndarray((1,), dtype=np.uint64, buffer=buffer, offset=0)
+        self._second = np.ndarray((1,), dtype=np.uint64, buffer=buffer, offset=COUNTER_STRIDE)
+        self._data = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=buffer, offset=DATA_OFFSET)
+        if self.owner_pid is not None:
+            self._first[0] = 0
+            self._second[0] = 0
+
+    def __getstate__(self):
+        return {'shape': self.shape, 'dtype': self.dtype.str, 'slots': self.slots, 'name': self.shm.name}
+
+    def close(self):
+        """
+        Detach from the block, and remove it if this process created it.
+        """
+        # The numpy views must go before the buffer they point into can be released
+        self._first = self._second = self._data = None
+        self.shm.close()
+        if self.owner_pid == os.getpid():
+            self.shm.unlink()
+
+    @staticmethod
+    def _wait(ready, timeout, spin):
+        """
+        Wait until ready() is true: poll while yielding the CPU for `spin` seconds, then poll with short sleeps.
+        Returns False if the timeout expired first.
+        """
+        start = time.perf_counter()
+        while not ready():
+            elapsed = time.perf_counter() - start
+            if timeout is not None and elapsed > timeout:
+                return False
+            if elapsed > spin:
+                time.sleep(50e-6)
+            else:
+                # Yield rather than spin hard, so the other side gets the CPU even on a single core
+                os.sched_yield()
+        return True
+
+
+class SharedSlot(_SharedBlock):
+    """
+    Latest-value slot for one fixed-shape array, protected by a seqlock.
+    The writer never waits, readers always get a complete value and retry if a write overlapped
+    their copy. Meant for one writer and any number of readers.
+    """
+    def __init__(self, shape, dtype=np.float64, name=None):
+        """
+        @param shape: Shape of the array.
+        @param dtype: Data type of the array.
+        @param name: Name of an existing slot to attach to, None to create a new one.
+        """
+        super().__init__(shape, dtype, 1, name)
+
+    def __setstate__(self, state):
+        SharedSlot.__init__(self, state['shape'], state['dtype'], state['name'])
+
+    @property
+    def sequence(self):
+        """
+        Number of completed writes, it changes exactly when a new value is available.
+        """
+        return int(self._first[0]) // 2
+
+    def write(self, value):
+        """
+        Publish a new value.
+        """
+        # Odd while the write is in progress. Aligned 8-byte stores are atomic, the fences keep the
+        # counter and the data from becoming visible to readers in another order
+        self._first[0] += 1
+        memory_fence()
+        self._data[0] = value
+        memory_fence()
+        self._first[0] += 1
+
+    def read(self, out=None):
+        """
+        Copy the current value.
+
+        @param out: Array to copy into, allocated if None.
+        @return: The value.
+        """
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        spins = 0
+        while True:
+            before = int(self._first[0])
+            if not before & 1:
+                memory_fence()
+                out[...] = self._data[0]
+                memory_fence()
+                if int(self._first[0]) == before:
+                    return out
+            spins += 1
+            if spins >= READ_SPINS:
+                spins = 0
+                os.sched_yield()
+
+    def wait(self, last_sequence, timeout=None, spin=0.001):
+        """
+        Wait for a value newer than last_sequence.
+
+        @return: False if the timeout expired first.
+        """
+        return self._wait(lambda: self.sequence != last_sequence, timeout, spin)
+
+
+class SharedRing(_SharedBlock):
+    """
+    Lock-free single-producer/single-consumer ring of fixed-shape arrays.
+    The producer only writes the head counter and the consumer only writes the tail counter,
+    so no lock is needed as long as there is exactly one of each.
+    """
+    def __init__(self, shape, dtype=np.float64, capacity=16, name=None):
+        """
+        @param shape: Shape of every array.
+        @param dtype: Data type of the arrays.
+        @param capacity: Number of arrays the ring holds.
+        @param name: Name of an existing ring to attach to, None to create a new one.
+        """
+        super().__init__(shape, dtype, capacity, name)
+
+    def __setstate__(self, state):
+        SharedRing.__init__(self, state['shape'], state['dtype'], state['slots'], state['name'])
+
+    def __len__(self):
+        return int(self._first[0] - self._second[0])
+
+    def push(self, value):
+        """
+        Append an array, called by the producer only.
+
+        @return: False if the ring is full and the array was not added.
+        """
+        head = int(self._first[0])
+        if head - int(self._second[0]) >= self.slots:
+            return False
+        # The consumer is done with the slot before it is overwritten, and the array is complete before it is published
+        memory_fence()
+        self._data[head % self.slots] = value
+        memory_fence()
+        self._first[0] = head + 1
+        return True
+
+    def pop(self, out=None):
+        """
+        Remove the oldest array, called by the consumer only.
+
+        @param out: Array to copy into, allocated if None.
+        @return: The array, or None if the ring is empty.
+        """
+        tail = int(self._second[0])
+        if tail == int(self._first[0]):
+            return None
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        memory_fence()
+        out[...] = self._data[tail % self.slots]
+        memory_fence()
+        self._second[0] = tail + 1
+        return out
+
+    def wait_push(self, value, timeout=None, spin=0.001):
+        """
+        Append an array, waiting while the ring is full.
+
+        @return: False if the timeout expired first.
+        """
+        return self._wait(lambda: self.push(value), timeout, spin)
+
+    def wait_pop(self, out=None, timeout=None, spin=0.001):
+        """
+        Remove the oldest array, waiting while the ring is empty.
+
+        @return: The array, or None if the timeout expired first.
+        """
+        if not self._wait(lambda: len(self) > 0, timeout, spin):
+            return None
+        return self.pop(out)
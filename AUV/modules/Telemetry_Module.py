@@ -0,0 +1,173 @@
+import csv
+import json
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from modules.Logger_Module import Logger
+
+
+class TelemetrySink(ABC):
+    """
+    Base class for telemetry sinks fed by the control loop.
+    A sink receives the column names once, then one float row per tick. Sinks never
+    import plotting or dataframe libraries, so the control path stays free of them.
+    Subclasses implement write, a sink without it cannot be constructed.
+    """
+    def open(self, columns : list) -> None:
+        """
+        Prepare the sink for a new stream of rows.
+
+        @param columns: Names of the columns of every row.
+        """
+        self.columns = list(columns)
+
+    @abstractmethod
+    def write(self, row : np.ndarray) -> None:
+        """
+        Record one row of telemetry.
+
+        @param row: Float array with one value per column.
+        """
+
+    def close(self) -> None:
+        """
+        Flush and release anything held by the sink.
+        """
+        pass
+
+
+class RingBufferSink(TelemetrySink):
+    """
+    Keeps the most recent rows in a preallocated in-memory buffer.
+    """
+    def __init__(self, capacity : int = 10000):
+        """
+        @param capacity: Maximum number of rows kept, older rows are overwritten.
+        """
+        self.capacity = capacity
+        self.buffer = None
+        self.count = 0
+
+    def open(self, columns : list) -> None:
+        super().open(columns)
+        self.buffer = np.zeros((self.capacity, len(self.columns)))
+        self.count = 0
+
+    def write(self, row : np.ndarray) -> None:
+        self.buffer[self.count % self.capacity] = row
+        self.count += 1
+
+    def data(self) -> np.ndarray:
+        """
+        Return the stored rows, oldest first.
+        """
+        if self.count <= self.capacity:
+            return self.buffer[:self.count].copy()
+        start = self.count % self.capacity
+        return np.concatenate((self.buffer[start:], self.buffer[:start]))
+
+
+class BinaryLogSink(TelemetrySink):
+    """
+    Append-only binary log of float64 rows.
+    The file starts with a magic string and a JSON header holding the column names,
+    followed by raw little-endian rows. Appending to an existing log requires the same columns.
+    """
+    MAGIC = b'AUVTLM1\n'
+
+    def __init__(self, log_file : str):
+        """
+        @param log_file: Path of the log file, created if it does not exist.
+        """
+        self.log_file = log_file
+        self.file = None
+
+    def open(self, columns : list) -> None:
+        super().open(columns)
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > 0:
+            existing_columns, _ = read_binary_log(self.log_file, header_only=True)
+            if existing_columns != self.columns:
+                raise ValueError(f"{self.log_file} was written with different columns")
+            self.file = open(self.log_file, 'ab')
+        else:
+            header = json.dumps(self.columns).encode('utf-8')
+            self.file = open(self.log_file, 'wb')
+            self.file.write(self.MAGIC + len(header).to_bytes(4, 'little') + header)
+
+    def write(self, row : np.ndarray) -> None:
+        self.file.write(np.asarray(row, dtype='<f8').tobytes())
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class CSVSink(TelemetrySink):
+    """
+    Writes rows to a CSV file with a header line, without going through pandas.
+    """
+    def __init__(self, output_file : str, logger : Logger = None):
+        """
+        @param output_file: Path of the CSV file, overwritten if it exists.
+        @param logger: Logger told where the data went when the sink is closed, None to stay quiet.
+        """
+        self.output_file = output_file
+        self.logger = logger
+        self.file = None
+        self.writer = None
+
+    def open(self, columns : list) -> None:
+        super().open(columns)
+        self.file = open(self.output_file, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.columns)
+
+    def write(self, row : np.ndarray) -> None:
+        self.writer.writerow(row.tolist())
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            if self.logger is not None:
+                self.logger.info(f"Data logged to {self.output_file}")
+
+
+def read_binary_log(log_file : str, header_only : bool = False) -> tuple:
+    """
+    Read a log written by BinaryLogSink.
+
+    @param log_file: Path of the log file.
+    @param header_only: Only read the column names.
+    @return: Tuple of the column names and an array of shape (rows, columns). A partially written last row is dropped.
+    """
+    with open(log_file, 'rb') as f:
+        if f.read(len(BinaryLogSink.MAGIC)) != BinaryLogSink.MAGIC:
+            raise ValueError(f"{log_file} is not a telemetry log")
+        header_length = int.from_bytes(f.read(4), 'little')
+        columns = json.loads(f.read(header_length).decode('utf-8'))
+    if header_only:
+        return columns, None
+
+    offset = len(BinaryLogSink.MAGIC) + 4 + header_length
+    data = np.fromfile(log_file, dtype='<f8', offset=offset)
+    num_rows = len(data) // len(columns)
+    return columns, data[:num_rows * len(columns)].reshape(num_rows, len(columns))
+
+
+def read_telemetry(input_file : str) -> tuple:
+    """
+    Read telemetry written by either CSVSink or BinaryLogSink.
+
+    @param input_file: Path of a .csv file or a binary log.
+    @return: Tuple of the column names and an array of shape (rows, columns).
+    """
+    if not input_file.endswith('.csv'):
+        return read_binary_log(input_file)
+    with open(input_file, newline='') as f:
+        columns = next(csv.reader(f))
+    data = np.loadtxt(input_file, delimiter=',', skiprows=1, ndmin=2)
+    return columns, data
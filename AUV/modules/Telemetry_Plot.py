@@ -0,0 +1,68 @@
+import argparse
+
+import numpy as np
+
+from modules.Telemetry_Module import read_telemetry
+
+
+def plot_thrusters(columns : list, data : np.ndarray, title : str = None):
+    """
+    Plot every Thruster_N column over time, in the layout Movement_Package.run used to show.
+
+    @param columns: Column names, including 'Time' and 'Thruster_1' onwards.
+    @param data: Telemetry rows, shape (rows, columns).
+    @param title: Optional title for the figure window.
+    @return: The matplotlib figure.
+    """
+    # Imported here so that only the offline tool ever loads matplotlib
+    import matplotlib.pyplot as plt
+
+    time_axis = data[:, columns.index('Time')]
+    thruster_columns = [i for i, name in enumerate(columns) if name.startswith('Thruster_')]
+
+    # Create a figure with subplots arranged in 3 rows and 3 columns
+    fig, axs = plt.subplots(3, 3, figsize=(15, 10))
+    if title is not None:
+        fig.suptitle(title)
+
+    for i, column in enumerate(thruster_columns[:9]):
+        # Determine the row and column to place each subplot
+        row = i // 3
+        col = i % 3
+        axs[row, col].plot(time_axis, data[:, column], label=f'Thruster {i+1}')
+        axs[row, col].set_xlabel('Time (seconds)')
+        axs[row, col].set_ylabel('Output')
+        axs[row, col].set_title(f'Thruster {i+1} Output Over Time')
+        axs[row, col].legend()
+
+        # Set y-axis centered at 1500 with range from 1000 to 2000
+        axs[row, col].set_ylim([1000, 2000])
+        axs[row, col].axhline(y=1500, color='r', linestyle='--', linewidth=0.3)
+
+    # Hide the subplots that are left empty
+    for i in range(len(thruster_columns), 9):
+        axs[i // 3, i % 3].axis('off')
+
+    plt.tight_layout()
+    return fig
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plot thruster telemetry recorded by Movement_Package.run. Run from the AUV folder: python -m modules.Telemetry_Plot')
+    parser.add_argument('files', nargs='+', help='CSV files or binary telemetry logs')
+    parser.add_argument('--save', action='store_true', help='Save a .png next to each file instead of showing a window')
+    args = parser.parse_args()
+
+    import matplotlib.pyplot as plt
+
+    for input_file in args.files:
+        columns, data = read_telemetry(input_file)
+        fig = plot_thrusters(columns, data, title=input_file)
+        if args.save:
+            fig.savefig(f'{input_file}.png')
+            plt.close(fig)
+    if not args.save:
+        plt.show()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Encoded formats cv2.imencode supports with a quality setting
+CODECS = {'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY), 'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY)}
+
+
+class VideoEncoder:
+    """
+    Compresses camera frames for the surface downlink on a worker thread.
+    Only the newest submitted frame is kept, so a slow link never builds up a backlog. Every encoded
+    frame is handed to a blocking sink, and the time the sink takes measures the throughput the link
+    actually delivers. The send rate is the lower of `target_bitrate` and 80 % of that measurement:
+    a token bucket at that rate skips frames when the link falls behind, and the quality is adjusted
+    after every frame so frames fit the per-frame share of the rate.
+    """
+    def __init__(self, sink, target_bitrate : float = 2e6, fps : float = 30.0, size : tuple = (480, 270), quality : int = 80,
+                 min_quality : int = 20, max_quality : int = 95, codec : str = 'jpeg'):
+        """
+        @param sink: Called with every encoded frame (1-D uint8 array), returns once it has been sent.
+        @param target_bitrate: Upper limit of the stream in bits per second.
+        @param fps: Frame rate the stream aims for, it sets the size budget of every frame.
+        @param size: (width, height) frames are resized to before encoding, None keeps the camera size.
+        @param quality: Starting quality, 0-100.
+        @param min_quality: Lowest quality the adaptation goes down to.
+        @param max_quality: Highest quality the adaptation goes up to.
+        @param codec: 'jpeg' or 'webp'.
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec}, expected one of {tuple(CODECS)}")
+        self.sink = sink
+        self.target_bitrate = target_bitrate
+        self.fps = fps
+        self.size = size
+        self.quality = quality
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.extension, self.quality_flag = CODECS[codec]
+
+        # Measured link throughput in bits per second, None until the first frame was sent
+        self.link_bitrate = None
+        self.frames_submitted = 0
+        self.frames_encoded = 0
+        self.frames_dropped = 0
+        self.frames_skipped = 0
+        self.bytes_sent = 0
+        self.encode_time = 0.0
+        # Capture time of the frame being sent and the capture-to-sent latency of the last frame
+        self.frame_timestamp = None
+        self.latency = None
+
+        self._pending = None
+        self._tokens = 0.0
+        self._last_refill = None
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """
+        Start the encoder thread.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the encoder thread, a frame still waiting is discarded.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def submit(self, frame : np.ndarray, timestamp : float = None):
+        """
+        Hand over a frame without waiting. It replaces a frame that has not been encoded yet.
+
+        @param frame: BGR uint8 image. It is resized or copied right away, so grabber buffers can be passed directly.
+        @param timestamp: Monotonic capture time of the frame, defaults to now.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self.size is None:
+            image = frame.copy()
+        else:
+            image = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        with self._condition:
+            self.frames_submitted += 1
+            if self._pending is not None:
+                self.frames_dropped += 1
+            self._pending = image, timestamp
+            self._condition.notify_all()
+
+    def rate(self) -> float:
+        """
+        @return: Bits per second the stream currently aims for.
+        """
+        if self.link_bitrate is None:
+            return self.target_bitrate
+        return min(self.target_bitrate, 0.8 * self.link_bitrate)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None or not self._running)
+                if not self._running:
+                    return
+                (image, timestamp), self._pending = self._pending, None
+
+            # Token bucket in bytes, holding at most one second worth of stream
+            now = time.monotonic()
+            rate = self.rate() / 8
+            if self._last_refill is not None:
+                self._tokens = min(rate, self._tokens + (now - self._last_refill) * rate)
+            self._last_refill = now
+            if self._tokens < 0:
+                self.frames_skipped += 1
+                continue
+
+            start = time.perf_counter()
+            ok, packet = cv2.imencode(self.extension, image, [self.quality_flag, self.quality])
+            self.encode_time = time.perf_counter() - start
+            if not ok:
+                continue
+            packet = packet.reshape(-1)
+            self.frames_encoded += 1
+
+            self.frame_timestamp = timestamp
+            start = time.perf_counter()
+            self.sink(packet)
+            elapsed = time.perf_counter() - start
+            self.latency = time.monotonic() - timestamp
+            self.bytes_sent += packet.nbytes
+            self._tokens -= packet.nbytes
+            self._measure(packet.nbytes, elapsed)
+            self._adapt(packet.nbytes)
+
+    def _measure(self, size : int, elapsed : float):
+        # Frames absorbed by socket buffers return at once, so the link is not what limits the stream.
+        # The measurement then climbs back toward the rate at which it stops limiting, and the next
+        # send that blocks measures the link again.
+        if elapsed < 1e-3:
+            if self.link_bitrate is not None:
+                bitrate = self.target_bitrate / 0.8
+                if self.link_bitrate < bitrate:
+                    self.link_bitrate = 0.8 * self.link_bitrate + 0.2 * bitrate
+            return
+        bitrate = 8 * size / elapsed
+        self.link_bitrate = bitrate if self.link_bitrate is None else 0.8 * self.link_bitrate + 0.2 * bitrate
+
+    def _adapt(self, size : int):
+        budget = self.rate() / 8 / self.fps
+        if size > 1.1 * budget:
+            self.quality = max(self.min_quality, self.quality - 5)
+        elif size < 0.8 * budget:
+            self.quality = min(self.max_quality, self.quality + 2)
+
+    def stats(self) -> dict:
+        """
+        @return: Frame counters, current quality, measured link rate and target rate in bits per second,
+                 and the time the last frame took to encode and its capture-to-sent latency in seconds.
+        """
+        return {'submitted': self.frames_submitted,
+                'encoded': self.frames_encoded,
+                'dropped': self.frames_dropped,
+                'skipped': self.frames_skipped,
+                'bytes_sent': self.bytes_sent,
+                'quality': self.quality,
+                'link_bitrate': self.link_bitrate,
+                'rate': self.rate(),
+                'encode_time': self.encode_time,
+                'latency': self.latency}
+
+
+class VideoDecoder:
+    """
+    Decodes received video frames on a worker thread, so the UI thread only ever shows finished images.
+    Only the newest received frame is decoded, frames that arrive while one is being decoded replace
+    each other and are counted in `frames_dropped`.
+    """
+    def __init__(self):
+        self.frames_received = 0
+        self.frames_decoded = 0
+        self.frames_dropped = 0
+        self.decode_failures = 0
+        self.decode_time = 0.0
+
+        self._pending = None
+        self._frame = None
+        self._index = -1
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """
+        Start the decoder thread.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the decoder thread.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def submit(self, packet : np.ndarray):
+        """
+        Hand over an encoded frame without waiting.
+
+        @param packet: 1-D uint8 array as produced by VideoEncoder.
+        """
+        with self._condition:
+            self.frames_received += 1
+            if self._pending is not None:
+                self.frames_dropped += 1
+            self._pending = packet
+            self._condition.notify_all()
+
+    def latest(self):
+        """
+        @return: Tuple of the newest decoded image and its index, counting decoded frames.
+                 The image is None before the first frame was decoded.
+        """
+        with self._condition:
+            return self._frame, self._index
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None or not self._running)
+                if not self._running:
+                    return
+                packet, self._pending = self._pending, None
+
+            start = time.perf_counter()
+            frame = cv2.imdecode(packet, cv2.IMREAD_COLOR)
+            self.decode_time = time.perf_counter() - start
+            if frame is None:
+                self.decode_failures += 1
+                continue
+            with self._condition:
+                self._frame = frame
+                self._index += 1
+                self.frames_decoded += 1
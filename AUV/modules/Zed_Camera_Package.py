@@ -1,22 +1,268 @@
+import time
+
 import cv2
 import numpy as np
-import pyzed.sl as sl
 
-class Zed_Camera_Package:
-    def __init__(self):
-        pass
+from modules.Frame_Grabber import FrameGrabber
 
-    def grab_image(self):
-        pass
 
-    def grab_depth_point(self):
-        pass
+class ZedSource:
+    """
+    ZED stereo camera, or an SVO recording played back through the ZED SDK, as a frame source
+    producing the left BGR image and the depth map in metres.
+    """
+    def __init__(self, resolution : str = 'HD720', fps : int = 30, depth_mode : str = 'PERFORMANCE', svo_file : str = None):
+        """
+        @param resolution: Name of an sl.RESOLUTION, e.g. 'HD720' or 'VGA'.
+        @param fps: Capture rate.
+        @param depth_mode: Name of an sl.DEPTH_MODE, e.g. 'PERFORMANCE' or 'ULTRA'.
+        @param svo_file: SVO recording to play back instead of the live camera.
+        """
+        import pyzed.sl as sl
+
+        self.sl = sl
+        init = sl.InitParameters()
+        init.camera_resolution = getattr(sl.RESOLUTION, resolution)
+        init.camera_fps = fps
+        init.depth_mode = getattr(sl.DEPTH_MODE, depth_mode)
+        init.coordinate_units = sl.UNIT.METER
+        if svo_file is not None:
+            init.set_from_svo_file(svo_file)
+            # Play the recording back at its recorded rate, as a live camera would deliver it
+            init.svo_real_time_mode = True
+
+        self.cam = sl.Camera()
+        status = self.cam.open(init)
+        if status != sl.ERROR_CODE.SUCCESS:
+            raise RuntimeError(f'Could not open the ZED camera: {status}')
+        self.runtime = sl.RuntimeParameters()
+
+        size = self.cam.get_camera_information().camera_configuration.resolution
+        self.shape = (size.height, size.width, 3)
+        # The SDK writes into these on every grab, they are allocated once
+        self.image_mat = sl.Mat()
+        self.depth_mat = sl.Mat()
+        self.finished = False
+
+    def allocate(self):
+        """
+        @return: One empty (image, depth) buffer pair.
+        """
+        return np.zeros(self.shape, dtype=np.uint8), np.zeros(self.shape[:2], dtype=np.float32)
+
+    def read(self, out : tuple):
+        """
+        Grab the next frame.
+
+        @param out: (image, depth) buffer pair from allocate().
+        @return: Monotonic capture time in seconds, or None if the grab failed.
+        """
+        sl = self.sl
+        status = self.cam.grab(self.runtime)
+        if status != sl.ERROR_CODE.SUCCESS:
+            if status == sl.ERROR_CODE.END_OF_SVOFILE_REACHED:
+                self.finished = True
+            return None
+        timestamp = time.monotonic()
+        self.cam.retrieve_image(self.image_mat, sl.VIEW.LEFT)
+        self.cam.retrieve_measure(self.depth_mat, sl.MEASURE.DEPTH)
+        image, depth = out
+        # The image comes as BGRA
+        image[...] = self.image_mat.get_data()[:, :, :3]
+        depth[...] = self.depth_mat.get_data()
+        return timestamp
+
+    def close(self):
+        self.cam.close()
+
+
+class DepthFileSource:
+    """
+    Recorded depth as a frame source, for running and benchmarking the depth pipeline without the ZED SDK.
+    Plays back a .npy stack of depth maps in metres, shape (n, height, width), and optionally a .npy stack
+    of the matching BGR images, shape (n, height, width, 3), as written by Zed_Camera_Package.record.
+    Without images a grayscale rendering of the depth is produced.
+    """
+    def __init__(self, depth_path : str, image_path : str = None, fps : float = 30.0, loop : bool = True, max_depth : float = 20.0):
+        """
+        @param depth_path: .npy file of depth maps.
+        @param image_path: .npy file of images, None to render the depth.
+        @param fps: Playback rate, None to read as fast as possible.
+        @param loop: Start over at the end instead of finishing.
+        @param max_depth: Depth shown as black when the images are rendered from the depth.
+        """
+        self.depths = np.load(depth_path, mmap_mode='r')
+        self.images = None if image_path is None else np.load(image_path, mmap_mode='r')
+        self.shape = self.depths.shape[1:] + (3,)
+        self.fps = fps
+        self.loop = loop
+        self.max_depth = max_depth
+        self.finished = False
+        self.position = 0
+        self.next_time = None
+
+    def allocate(self):
+        """
+        @return: One empty (image, depth) buffer pair.
+        """
+        return np.zeros(self.shape, dtype=np.uint8), np.zeros(self.shape[:2], dtype=np.float32)
+
+    def read(self, out : tuple):
+        """
+        Read the next frame, waiting for its turn at `fps`.
+
+        @param out: (image, depth) buffer pair from allocate().
+        @return: Monotonic time the frame was read, or None at the end of a recording that does not loop.
+        """
+        if self.fps is not None:
+            now = time.monotonic()
+            if self.next_time is None:
+                self.next_time = now
+            elif self.next_time > now:
+                time.sleep(self.next_time - now)
+            self.next_time += 1.0 / self.fps
 
-    def grab_depth_image(self):
+        if self.position >= len(self.depths):
+            if not self.loop:
+                self.finished = True
+                return None
+            self.position = 0
+        image, depth = out
+        depth[...] = self.depths[self.position]
+        if self.images is not None:
+            image[...] = self.images[self.position]
+        else:
+            gray = np.nan_to_num(255 * (1 - depth / self.max_depth), nan=0.0, posinf=0.0, neginf=255.0)
+            image[...] = np.clip(gray, 0, 255)[:, :, None]
+        self.position += 1
+        return time.monotonic()
+
+    def close(self):
         pass
 
+
+class Zed_Camera_Package:
+    """
+    ZED camera producer: a background thread grabs the image and the depth map into preallocated
+    buffers, and the grab methods read the newest ones without waiting on the camera.
+    The grab methods share the newest buffer pair, so call them from one thread.
+    """
+    def __init__(self, source = None, send_width : int = 480, send_height : int = 270):
+        """
+        @param source: ZedSource (the default, live camera) or DepthFileSource to run without the ZED SDK.
+        @param send_width: Width of the images and depth maps sent to the surface.
+        @param send_height: Height of the images and depth maps sent to the surface.
+        """
+        if source is None:
+            source = ZedSource()
+        self.grabber = FrameGrabber(source)
+        self.send_width = send_width
+        self.send_height = send_height
+
+        # Depth downsampling keeps the nearest valid depth of every block of pixels that maps to one
+        # output pixel. The block boundaries and the intermediate buffer are computed once here.
+        height, width = self.grabber.shape[:2]
+        self.row_starts = (np.arange(send_height) * height) // send_height
+        self.col_starts = (np.arange(send_width) * width) // send_width
+        self._depth_rows = np.empty((send_height, width), dtype=np.float32)
+
+        self.image = None
+        self.depth = None
+        self.index = -1
+        self.timestamp = None
+        self.grabber.start()
+
+    def update(self, wait : bool = False, timeout : float = None) -> bool:
+        """
+        Take the newest frame from the grabber thread. The grab methods call this themselves.
+
+        @param wait: Wait for a frame newer than the current one.
+        @param timeout: Maximum seconds to wait.
+        @return: True if a frame is available.
+        """
+        buffers, self.index, self.timestamp = self.grabber.latest(wait=wait or self.index < 0, timeout=timeout)
+        if buffers is None:
+            return False
+        self.image, self.depth = buffers
+        return True
+
+    def grab_image(self, wait : bool = True):
+        """
+        @param wait: Wait for a frame newer than the one returned last time.
+        @return: The newest left image resized to the send size, or None if the camera has not delivered a frame.
+        """
+        if not self.update(wait, timeout=1.0):
+            return None
+        return cv2.resize(self.image, (self.send_width, self.send_height), interpolation=cv2.INTER_AREA)
+
+    def grab_depth_point(self, x : int, y : int, radius : int = 2) -> float:
+        """
+        Depth at a pixel of the newest depth map, e.g. at the centre of a detection. Reads only the
+        pixels around (x, y), so the cost does not depend on the resolution.
+
+        @param x: Column in full resolution pixels.
+        @param y: Row in full resolution pixels.
+        @param radius: Half size of the window whose median is taken, so single invalid pixels do not matter.
+                       0 reads the one pixel.
+        @return: Depth in metres, NaN if no pixel in the window has a valid depth.
+        """
+        if not self.update():
+            return np.nan
+        height, width = self.depth.shape
+        window = self.depth[max(0, y - radius):min(height, y + radius + 1), max(0, x - radius):min(width, x + radius + 1)]
+        valid = window[np.isfinite(window)]
+        return float(np.median(valid)) if valid.size else np.nan
+
+    def grab_depth_image(self, out : np.ndarray = None):
+        """
+        The newest depth map downsampled to the send size. Every output pixel holds the nearest
+        depth in the block of pixels it covers, so small close obstacles survive the downsampling.
+
+        @param out: float32 array of shape (send_height, send_width) to write into, allocated if None.
+        @return: The downsampled depth in metres, NaN where a whole block has no depth.
+        """
+        if not self.update():
+            return None
+        if out is None:
+            out = np.empty((self.send_height, self.send_width), dtype=np.float32)
+        # fmin ignores NaN unless every value is NaN
+        np.fmin.reduceat(self.depth, self.row_starts, axis=0, out=self._depth_rows)
+        np.fmin.reduceat(self._depth_rows, self.col_starts, axis=1, out=out)
+        return out
+
+    def record(self, image_path : str, depth_path : str, num_frames : int):
+        """
+        Record consecutive frames to .npy files that DepthFileSource plays back.
+
+        @param image_path: .npy file for the images.
+        @param depth_path: .npy file for the depth maps.
+        @param num_frames: Number of frames to record.
+        """
+        images = np.lib.format.open_memmap(image_path, mode='w+', dtype=np.uint8, shape=(num_frames,) + self.grabber.shape)
+        depths = np.lib.format.open_memmap(depth_path, mode='w+', dtype=np.float32, shape=(num_frames,) + self.grabber.shape[:2])
+        for i in range(num_frames):
+            self.update(wait=True)
+            images[i] = self.image
+            depths[i] = self.depth
+        images.flush()
+        depths.flush()
+
+    def close(self):
+        self.grabber.stop()
+
     def run(self):
-        pass
+        """
+        Print the depth at the image centre and the grabber counters once per second.
+        """
+        try:
+            while True:
+                self.update(wait=True)
+                height, width = self.depth.shape
+                print(f'Frame {self.index}: centre depth {self.grab_depth_point(width // 2, height // 2):.2f} m | '
+                      f'{self.grabber.frames_captured} captured, {self.grabber.frames_dropped} dropped')
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.close()
 
 if __name__ == '__main__':
     ZCP = Zed_Camera_Package()
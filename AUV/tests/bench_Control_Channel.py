@@ -0,0 +1,107 @@
+"""
+Loopback latency and jitter of surface-to-sub commands over the UDP control channel,
+compared with the TCP paths: the old comma separated strings and binary frames.
+Latency is measured from the send timestamp to the moment the receiver has the parsed command.
+
+Run from the AUV folder: python tests/bench_Control_Channel.py
+"""
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Networking_Package import Networking_Package, UDPControlChannel
+
+num_commands = 5000
+period = 0.001
+
+
+def tcp_pair() -> tuple:
+    server = Networking_Package(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    client = Networking_Package(socket.AF_INET, socket.SOCK_STREAM)
+    client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    client.connect(server.getsockname())
+    conn, _ = server.accept()
+    server.close()
+    return client, conn
+
+
+def paced_send(send):
+    # Commands at a fixed rate, as the joystick loop would send them
+    start = time.perf_counter()
+    for i in range(num_commands):
+        send(np.array([time.perf_counter(), i, 0.0, 0.0, 0.0, 0.0]))
+        delay = start + (i + 1) * period - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def run_udp() -> np.ndarray:
+    receiver = UDPControlChannel()
+    receiver.bind(('127.0.0.1', 0))
+    sender = UDPControlChannel()
+    sender.connect(receiver.getsockname())
+
+    thread = threading.Thread(target=paced_send, args=(sender.send_command,))
+    thread.start()
+    latencies = []
+    while len(latencies) < num_commands and receiver.poll(1.0):
+        latencies.append(time.perf_counter() - receiver.latest()[0])
+        if receiver.latest()[1] == num_commands - 1:
+            break
+    thread.join()
+    sender.close()
+    receiver.close()
+    return np.array(latencies)
+
+
+def run_tcp_string() -> np.ndarray:
+    client, conn = tcp_pair()
+
+    def send(values):
+        client.send_string_as_bytes(','.join(str(value) for value in values) + '\n')
+
+    thread = threading.Thread(target=paced_send, args=(send,))
+    thread.start()
+    latencies = []
+    pending = ''
+    while len(latencies) < num_commands:
+        pending += conn.recv_string_as_bytes(4096)
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            values = np.array(line.split(','), dtype=float)
+            latencies.append(time.perf_counter() - values[0])
+    thread.join()
+    client.close()
+    conn.close()
+    return np.array(latencies)
+
+
+def run_tcp_frame() -> np.ndarray:
+    client, conn = tcp_pair()
+    thread = threading.Thread(target=paced_send, args=(client.sendall,))
+    thread.start()
+    latencies = []
+    while len(latencies) < num_commands:
+        values = conn.recv()
+        latencies.append(time.perf_counter() - values[0])
+    thread.join()
+    client.close()
+    conn.close()
+    return np.array(latencies)
+
+
+if __name__ == "__main__":
+    print(f"{'path':<20} {'received':>9} {'mean (us)':>10} {'p50 (us)':>10} {'p99 (us)':>10} {'jitter (us)':>12}")
+    for name, run in (('UDP control', run_udp), ('TCP string', run_tcp_string), ('TCP frame', run_tcp_frame)):
+        latencies = run() * 1e6
+        # Jitter as the mean absolute difference between consecutive latencies (RFC 3550 style)
+        jitter = np.abs(np.diff(latencies)).mean()
+        print(f"{name:<20} {len(latencies):>9} {latencies.mean():>10.1f} {np.median(latencies):>10.1f} "
+              f"{np.percentile(latencies, 99):>10.1f} {jitter:>12.1f}")
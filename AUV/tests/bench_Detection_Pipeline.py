@@ -0,0 +1,63 @@
+"""
+Detection throughput and capture-to-result latency on a 30 fps source: calling the model synchronously
+on every frame from the capture loop, as Camera_Package.detect used to, against DetectionStage with
+micro-batches of 1, 2 and 4 frames.
+
+By default the model is simulated with a fixed cost per call plus a cost per frame, which is how batched
+CPU inference behaves, so the benchmark runs without ultralytics. Pass a model to use YOLO instead:
+Run from the AUV folder: python tests/bench_Detection_Pipeline.py [yolov8n.onnx]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Detection_Pipeline import DetectionStage, YOLOModel
+from modules.Frame_Grabber import FrameGrabber, SyntheticSource
+
+duration = 5.0
+call_cost = 0.030
+frame_cost = 0.012
+
+
+def simulated_model(frames):
+    time.sleep(call_cost + frame_cost * len(frames))
+    return [(np.zeros((1, 4), dtype=np.float32), np.ones(1, dtype=np.float32), np.zeros(1, dtype=np.int32)) for _ in frames]
+
+
+def run_synchronous(model):
+    source = SyntheticSource(640, 480)
+    frame = np.empty(source.shape, dtype=np.uint8)
+    latencies = []
+    start = time.monotonic()
+    while time.monotonic() - start < duration:
+        timestamp = source.read(frame)
+        model([frame])
+        latencies.append(time.monotonic() - timestamp)
+    return len(latencies) / (time.monotonic() - start), np.array(latencies)
+
+
+def run_stage(model, batch_size):
+    with FrameGrabber(SyntheticSource(640, 480)) as grabber, DetectionStage(model, batch_size=batch_size, max_queue=batch_size, max_latency=0.5) as stage:
+        start = time.monotonic()
+        while time.monotonic() - start < duration:
+            frame, index, timestamp = grabber.latest()
+            stage.submit(frame, index, timestamp)
+        latencies = np.array([entry[2] for entry in stage.history])
+        return stage.processed / (time.monotonic() - start), latencies, stage
+
+
+if __name__ == "__main__":
+    model = YOLOModel(sys.argv[1], imgsz=320) if len(sys.argv) > 1 else simulated_model
+    if len(sys.argv) > 1:
+        # Load and warm up outside the timed runs
+        model([np.zeros((480, 640, 3), dtype=np.uint8)])
+
+    print(f"{'mode':<16} {'FPS':>6} {'latency mean (ms)':>18} {'latency p99 (ms)':>17} {'dropped':>8} {'stale':>6}")
+    fps, latencies = run_synchronous(model)
+    print(f"{'synchronous':<16} {fps:>6.1f} {latencies.mean() * 1e3:>18.1f} {np.percentile(latencies, 99) * 1e3:>17.1f} {'-':>8} {'-':>6}")
+    for batch_size in [1, 2, 4]:
+        fps, latencies, stage = run_stage(model, batch_size)
+        print(f"{f'stage, batch {batch_size}':<16} {fps:>6.1f} {latencies.mean() * 1e3:>18.1f} {np.percentile(latencies, 99) * 1e3:>17.1f} {stage.dropped_full:>8} {stage.dropped_stale:>6}")
@@ -0,0 +1,50 @@
+"""
+Frame age seen by a slow consumer (YOLO, network send) reading a 30 fps camera synchronously with
+cam.read() against reading the newest frame from FrameGrabber. Uses SyntheticSource, which models the
+V4L2 driver queue, so no camera is needed.
+
+Run from the AUV folder: python tests/bench_Frame_Grabber.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Frame_Grabber import FrameGrabber, SyntheticSource
+
+fps = 30.0
+num_frames = 60
+
+
+def consume_synchronous(work):
+    source = SyntheticSource(fps=fps)
+    frame = np.empty(source.shape, dtype=np.uint8)
+    ages = np.empty(num_frames)
+    for i in range(num_frames):
+        timestamp = source.read(frame)
+        ages[i] = time.monotonic() - timestamp
+        time.sleep(work)
+    return ages
+
+
+def consume_grabber(work):
+    ages = np.empty(num_frames)
+    with FrameGrabber(SyntheticSource(fps=fps)) as grabber:
+        for i in range(num_frames):
+            frame, index, timestamp = grabber.latest()
+            ages[i] = time.monotonic() - timestamp
+            time.sleep(work)
+        dropped = grabber.frames_dropped
+    return ages, dropped
+
+
+if __name__ == "__main__":
+    print(f"{'consumer work (ms)':>18} {'read':>9} {'age mean (ms)':>14} {'age p99 (ms)':>13} {'dropped':>8}")
+    for work in [0.010, 0.050, 0.100]:
+        ages = consume_synchronous(work) * 1e3
+        print(f"{work * 1e3:>18.0f} {'cam.read':>9} {ages.mean():>14.1f} {np.percentile(ages, 99):>13.1f} {'-':>8}")
+        ages, dropped = consume_grabber(work)
+        ages *= 1e3
+        print(f"{work * 1e3:>18.0f} {'grabber':>9} {ages.mean():>14.1f} {np.percentile(ages, 99):>13.1f} {dropped:>8}")
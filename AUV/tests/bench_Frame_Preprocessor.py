@@ -0,0 +1,77 @@
+"""
+Per-frame preprocessing of a 1920x1080 camera frame for the 480x270 downlink and a 640x640 YOLO input:
+the separate path Camera_Package used to take (resize for sending, copy of the full frame into the
+detection queue, then YOLO letterboxing the full frame itself) against FramePreprocessor, with the
+whole frame and with a region of interest and pyramid levels. Memory is what numpy and OpenCV
+allocate per frame, measured with tracemalloc.
+
+Run from the AUV folder: python tests/bench_Frame_Preprocessor.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Frame_Preprocessor import FramePreprocessor
+
+repeat = 100
+
+
+def letterbox(image, size=640):
+    # What YOLO does to every input image before inference
+    height, width = image.shape[:2]
+    scale = min(size / width, size / height)
+    inner_width, inner_height = round(width * scale), round(height * scale)
+    if (inner_width, inner_height) != (width, height):
+        image = cv2.resize(image, (inner_width, inner_height), interpolation=cv2.INTER_LINEAR)
+    top, left = (size - inner_height) // 2, (size - inner_width) // 2
+    return cv2.copyMakeBorder(image, top, size - inner_height - top, left, size - inner_width - left, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+
+def separate(frame):
+    send_image = cv2.resize(frame, (480, 270), interpolation=cv2.INTER_AREA)
+    queued = frame.copy()
+    return send_image, letterbox(queued)
+
+
+def fused(preprocessor):
+    def run(frame):
+        send_image, model_image = preprocessor(frame)
+        return send_image, letterbox(model_image.copy())
+    return run
+
+
+def measure(function, frame):
+    function(frame)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(frame)
+    seconds = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    for _ in range(10):
+        function(frame)
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, allocated
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    frame = cv2.resize(rng.integers(0, 255, (54, 96, 3), dtype=np.uint8), (1920, 1080), interpolation=cv2.INTER_CUBIC)
+    roi = (240, 0, 1440, 1080)
+    preprocessors = [('fused', FramePreprocessor(frame.shape)),
+                     ('fused, area', FramePreprocessor(frame.shape, interpolation=cv2.INTER_AREA)),
+                     ('fused, pyramid 1', FramePreprocessor(frame.shape, pyramid_level=1)),
+                     ('fused, ROI', FramePreprocessor(frame.shape, roi=roi)),
+                     ('fused, ROI, pyr 1', FramePreprocessor(frame.shape, roi=roi, pyramid_level=1))]
+    runs = [('separate', separate, None)] + [(name, fused(preprocessor), preprocessor) for name, preprocessor in preprocessors]
+
+    print(f"{'path':<18} {'time (ms)':>10} {'peak allocated (MB)':>20} {'buffers (MB)':>13}")
+    for name, function, preprocessor in runs:
+        seconds, allocated = measure(function, frame)
+        buffers = '-' if preprocessor is None else f'{preprocessor.buffer_bytes() / 1e6:.2f}'
+        print(f"{name:<18} {seconds * 1e3:>10.2f} {allocated / 1e6:>20.2f} {buffers:>13}")
@@ -0,0 +1,125 @@
+"""
+Does the control rate hold under load? Runs the Movement_Package -> Hardware_Interface tick against the
+pty microcontroller emulator at 100 Hz with LoopScheduler, idle and next to synthetic camera, network
+and CPU load, and compares it with the old pacing of sleeping a fixed period after every tick.
+
+Run from the AUV folder: python tests/bench_Loop_Scheduler.py
+Pass a SCHED_FIFO priority as the first argument (needs root), e.g. python tests/bench_Loop_Scheduler.py 80
+"""
+import os
+import socket
+import sys
+import threading
+import time
+from multiprocessing import Process
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Hardware_Interface import Hardware_Interface
+from modules.Loop_Scheduler import LoopScheduler
+from modules.Movement_Package import Movement_Package
+from modules.Serial_Emulator import SerialEmulator
+
+rate = 100
+duration = 5.0
+
+
+def camera_load(stop):
+    # Colour conversion and 2x downsampling of 720p frames, roughly what the camera thread does per frame
+    frame = np.random.randint(0, 255, (720, 1280, 3), dtype=np.uint8)
+    while not stop.is_set():
+        gray = frame @ np.array([0.114, 0.587, 0.299])
+        gray[::2, ::2].astype(np.uint8)
+
+
+def network_load(stop):
+    # Stream 1 MB frames over a local TCP connection
+    server = socket.create_server(('127.0.0.1', 0))
+    client = socket.create_connection(server.getsockname())
+    conn, _ = server.accept()
+    payload = bytes(1 << 20)
+
+    def drain():
+        while conn.recv(1 << 20):
+            pass
+    drain_thread = threading.Thread(target=drain, daemon=True)
+    drain_thread.start()
+    while not stop.is_set():
+        client.sendall(payload)
+    # Closing the sending side ends the drain thread before its socket goes away
+    client.close()
+    drain_thread.join()
+    conn.close()
+    server.close()
+
+
+def cpu_hog():
+    while True:
+        pass
+
+
+def control_tick(mp, hi, desired):
+    _, thruster_output = mp.update(desired, mp.sensor_data)
+    hi.transmit(thruster_output)
+    hi.recv()
+
+
+def run_scheduler(mp, hi, desired, priority):
+    scheduler = LoopScheduler(rate, priority=priority)
+    scheduler.run(lambda tick: control_tick(mp, hi, desired), num_ticks=int(duration * rate))
+    return scheduler
+
+
+def run_fixed_sleep(mp, hi, desired):
+    # The old pacing: work, then sleep one period
+    start = time.perf_counter()
+    ticks = int(duration * rate)
+    for _ in range(ticks):
+        control_tick(mp, hi, desired)
+        time.sleep(1.0 / rate)
+    return ticks / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    priority = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    emulator = SerialEmulator()
+    port = emulator.start()
+    hi = Hardware_Interface(port)
+    hi.start()
+    mp = Movement_Package()
+    desired = np.array([0.5, 0.0, 0.2, 0.0, 0.0, 0.1])
+
+    print(f"{'load':<10} {'rate (Hz)':>10} {'misses':>7} {'skipped':>8} {'late p50 (us)':>14} {'late p99 (us)':>14} {'late max (us)':>14} {'work p99 (us)':>14}")
+    for load in ['idle', 'camera', 'network', 'cpu', 'all']:
+        stop = threading.Event()
+        threads = []
+        processes = []
+        if load in ('camera', 'all'):
+            threads.append(threading.Thread(target=camera_load, args=(stop,), daemon=True))
+        if load in ('network', 'all'):
+            threads.append(threading.Thread(target=network_load, args=(stop,), daemon=True))
+        if load in ('cpu', 'all'):
+            processes = [Process(target=cpu_hog, daemon=True) for _ in range(os.cpu_count())]
+        for worker in threads + processes:
+            worker.start()
+
+        start = time.perf_counter()
+        scheduler = run_scheduler(mp, hi, desired, priority)
+        achieved = scheduler.ticks / (time.perf_counter() - start)
+
+        stop.set()
+        for thread in threads:
+            thread.join()
+        for process in processes:
+            process.terminate()
+            process.join()
+
+        recent = scheduler.recent() * 1e6
+        print(f"{load:<10} {achieved:>10.1f} {scheduler.misses:>7} {scheduler.skipped:>8} {np.percentile(recent[:, 0], 50):>14.0f} "
+              f"{np.percentile(recent[:, 0], 99):>14.0f} {recent[:, 0].max():>14.0f} {np.percentile(recent[:, 1], 99):>14.0f}")
+
+    print(f"Fixed sleep after every tick, idle: {run_fixed_sleep(mp, hi, desired):.1f} Hz instead of {rate} Hz")
+    hi.close()
+    emulator.stop()
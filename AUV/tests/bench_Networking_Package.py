@@ -0,0 +1,96 @@
+"""
+Throughput benchmark of Networking_Package over a localhost TCP socket.
+Compares the old np.savez framing with recv() and recv_many() on the binary frame protocol,
+for small control frames and 480x270 camera frames.
+
+Run from the AUV folder: python tests/bench_Networking_Package.py
+"""
+import os
+import socket
+import sys
+import threading
+import time
+from io import BytesIO
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Networking_Package import Networking_Package
+
+
+def connected_pair() -> tuple:
+    server = Networking_Package(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    client = Networking_Package(socket.AF_INET, socket.SOCK_STREAM)
+    client.connect(server.getsockname())
+    conn, _ = server.accept()
+    server.close()
+    return client, conn
+
+
+def savez_send(sock, frame):
+    # The framing Networking_Package used before the binary protocol
+    f = BytesIO()
+    np.savez(f, frame=frame)
+    out = bytearray(f"{len(f.getvalue())}:".encode())
+    f.seek(0)
+    out += f.read()
+    socket.socket.sendall(sock, out)
+
+
+def savez_recv(sock, state):
+    # Old receive loop, with leftover bytes carried in state so the benchmark stays correct
+    length = None
+    frame_buffer = state.pop('leftover', bytearray())
+    while True:
+        if length is None and b":" in frame_buffer:
+            length_str, _, frame_buffer = frame_buffer.partition(b":")
+            length = int(length_str)
+        if length is not None and len(frame_buffer) >= length:
+            state['leftover'] = frame_buffer[length:]
+            return np.load(BytesIO(frame_buffer[:length]), allow_pickle=True)["frame"]
+        frame_buffer += socket.socket.recv(sock, 65536)
+
+
+def run(frame, num_frames, mode) -> float:
+    client, conn = connected_pair()
+
+    def sender():
+        for _ in range(num_frames):
+            if mode == 'savez':
+                savez_send(client, frame)
+            else:
+                client.sendall(frame)
+
+    thread = threading.Thread(target=sender)
+    start = time.perf_counter()
+    thread.start()
+    received = 0
+    state = {}
+    while received < num_frames:
+        if mode == 'savez':
+            savez_recv(conn, state)
+            received += 1
+        elif mode == 'recv':
+            conn.recv()
+            received += 1
+        else:
+            received += len(conn.recv_many())
+    elapsed = time.perf_counter() - start
+    thread.join()
+    client.close()
+    conn.close()
+    return num_frames / elapsed
+
+
+if __name__ == "__main__":
+    cases = {
+        'control (6 x f8)': (np.zeros(6), 50000),
+        'camera (270x480x3 u1)': (np.zeros((270, 480, 3), dtype=np.uint8), 1000),
+    }
+    print(f"{'frame':<24} {'mode':<10} {'frames/s':>12} {'MB/s':>10}")
+    for name, (frame, num_frames) in cases.items():
+        for mode in ('savez', 'recv', 'recv_many'):
+            rate = run(frame, num_frames if mode != 'savez' else num_frames // 10, mode)
+            print(f"{name:<24} {mode:<10} {rate:>12.0f} {rate * frame.nbytes / 1e6:>10.1f}")
@@ -0,0 +1,204 @@
+"""
+Tracking between detections: detection frame rate and accuracy when YOLO runs on every frame against
+running it every Nth frame, and when a track's confidence decays, with the Tracker following the
+objects in between. Accuracy is measured per frame against the reference boxes: the share of them
+matched by an output box at IoU >= 0.5 (recall), the share of output boxes matching one (precision),
+and the mean IoU of the matches.
+
+The pipeline rows run Camera_Package.track on frames paced at `fps`, with detection on the
+asynchronous DetectionStage, so the detections arrive some frames after the frame they were made on.
+They compare feeding the tracker those detections as if they were of the current frame against
+moving them along to it with the track velocities.
+
+By default the recording is a simulated 1920x1080 scene of swaying objects and the detector returns
+its boxes with pixel noise and missed detections, taking a fixed time per frame like CPU inference,
+so the benchmark runs without ultralytics. Pass a video and a model to use YOLO on a real recording,
+with the detections of every frame as the reference:
+Run from the AUV folder: python tests/bench_Object_Tracker.py [video.mp4 yolov8n.pt]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Object_Tracker import Tracker, iou_matrix
+
+num_frames = 300
+num_objects = 5
+detection_cost = 0.040
+noise = 2.0
+miss_rate = 0.05
+fps = 30.0
+
+
+def simulated_recording():
+    # Boxes of every object in every frame, drifting across the frame and swaying like a swimming target
+    rng = np.random.default_rng(0)
+    t = np.arange(num_frames)[:, None]
+    start = rng.uniform([200, 200], [1500, 800], (num_objects, 2))
+    velocity = rng.uniform(-4, 4, (num_objects, 2))
+    sway = rng.uniform(5, 20, num_objects)
+    period = rng.uniform(40, 120, num_objects)
+    size = rng.uniform([60, 60], [200, 160], (num_objects, 2))
+    x = start[:, 0] + velocity[:, 0] * t + sway * np.sin(2 * np.pi * t / period)
+    y = start[:, 1] + velocity[:, 1] * t + sway * np.cos(2 * np.pi * t / period)
+    boxes = np.stack([x, y, x + size[:, 0], y + size[:, 1]], axis=2)
+    classes = np.arange(num_objects, dtype=np.int32) % 2
+    return [(frame_boxes, np.full(num_objects, 0.9, dtype=np.float32), classes) for frame_boxes in boxes]
+
+
+def simulated_detector(reference):
+    rng = np.random.default_rng(1)
+
+    def detect(frame):
+        time.sleep(detection_cost)
+        boxes, scores, classes = reference[frame]
+        found = rng.random(len(boxes)) > miss_rate
+        return boxes[found] + rng.normal(0, noise, (int(found.sum()), 4)), scores[found], classes[found]
+    return detect
+
+
+def yolo_detector(video, model):
+    from modules.Detection_Pipeline import YOLOModel
+    from modules.Frame_Grabber import FileSource
+
+    source = FileSource(video, fps=None, loop=False)
+    frames = []
+    frame = np.empty(source.shape, dtype=np.uint8)
+    while source.read(frame) is not None:
+        frames.append(frame.copy())
+    model = YOLOModel(model)
+    model(frames[:1])
+
+    def detect(index):
+        return model([frames[index]])[0]
+    return detect, len(frames)
+
+
+def run(detect, count, detect_every, min_confidence=0.0):
+    tracker = Tracker()
+    outputs = []
+    detections = 0
+    since = detect_every
+    start = time.perf_counter()
+    for frame in range(count):
+        since += 1
+        if since >= detect_every or tracker.confidence() < min_confidence:
+            tracks = tracker.update(*detect(frame))
+            detections += 1
+            since = 0
+        else:
+            tracks = tracker.update()
+        outputs.append(tracks.boxes)
+    return count / (time.perf_counter() - start), detections, outputs
+
+
+class IndexSource:
+    # Stands in for the camera while run_pipeline hands the frames to Camera_Package.track itself
+    shape = (1080, 1920, 3)
+    finished = False
+
+    def read(self, out):
+        time.sleep(0.01)
+        return None
+
+    def close(self):
+        pass
+
+
+def encode_index(frame, index):
+    # Plain colour frames survive the resize into the model image, so the model can tell which frame it got
+    frame[...] = (index & 255, (index >> 8) & 255, (index >> 16) & 255)
+
+
+def index_model(reference, preprocessor):
+    rng = np.random.default_rng(1)
+    scale = preprocessor.scale / 2 ** preprocessor.pyramid_level
+    x, y = preprocessor.roi[:2]
+    offset = np.array([preprocessor.left - x * scale, preprocessor.top - y * scale] * 2)
+
+    def model(images):
+        results = []
+        for image in images:
+            time.sleep(detection_cost)
+            b, g, r = (int(value) for value in image[preprocessor.model_size // 2, preprocessor.model_size // 2])
+            boxes, scores, classes = reference[b | g << 8 | r << 16]
+            found = rng.random(len(boxes)) > miss_rate
+            noisy = boxes[found] + rng.normal(0, noise, (int(found.sum()), 4))
+            # Model image pixels, which Camera_Package maps back to the frame
+            results.append(((noisy * scale + offset).astype(np.float32), scores[found], classes[found]))
+        return results
+    return model
+
+
+def run_pipeline(reference, detect_every, compensate):
+    from modules.Regular_Camera_Package import Camera_Package
+
+    camera = Camera_Package(model=lambda images: [], source=IndexSource(), detect_every=detect_every)
+    camera.detector.model = index_model(reference, camera.preprocessor)
+    if not compensate:
+        update = camera.tracker.update
+        camera.tracker.update = lambda *detections: update(*detections[:3])
+    frame = np.empty(IndexSource.shape, dtype=np.uint8)
+    outputs = []
+    ages = []
+    start = time.perf_counter()
+    try:
+        for index in range(len(reference)):
+            time.sleep(max(0.0, start + index / fps - time.perf_counter()))
+            encode_index(frame, index)
+            tracks = camera.track(frame, index, time.monotonic())
+            if camera.detection_index is not None:
+                ages.append(index - camera.detection_index)
+            outputs.append(tracks.boxes)
+    finally:
+        camera.detector.stop()
+        camera.grabber.stop()
+    return camera.detector.processed, float(np.mean(ages)), outputs
+
+
+def accuracy(outputs, reference):
+    matched = total_reference = total_output = 0
+    ious = []
+    for boxes, (reference_boxes, _, _) in zip(outputs, reference):
+        total_reference += len(reference_boxes)
+        total_output += len(boxes)
+        if len(boxes) == 0 or len(reference_boxes) == 0:
+            continue
+        iou = iou_matrix(np.asarray(reference_boxes), boxes)
+        # Greedy one-to-one matching, best pairs first
+        while iou.size and iou.max() >= 0.5:
+            i, j = np.unravel_index(iou.argmax(), iou.shape)
+            ious.append(iou[i, j])
+            iou[i, :] = 0
+            iou[:, j] = 0
+            matched += 1
+    return matched / max(total_reference, 1), matched / max(total_output, 1), float(np.mean(ious)) if ious else 0.0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        detect, count = yolo_detector(sys.argv[1], sys.argv[2])
+        reference = [detect(frame) for frame in range(count)]
+    else:
+        reference = simulated_recording()
+        count = len(reference)
+        detect = simulated_detector(reference)
+
+    print(f"{'mode':<24} {'FPS':>6} {'detections':>11} {'recall':>7} {'precision':>10} {'mean IoU':>9}")
+    for name, detect_every, min_confidence in [('every frame', 1, 0.0), ('every 2nd', 2, 0.0), ('every 3rd', 3, 0.0),
+                                               ('every 5th', 5, 0.0), ('every 10th', 10, 0.0), ('every 10th or conf < 0.6', 10, 0.6)]:
+        rate, detections, outputs = run(detect, count, detect_every, min_confidence)
+        recall, precision, mean_iou = accuracy(outputs, reference)
+        print(f"{name:<24} {rate:>6.1f} {detections:>11} {recall:>7.3f} {precision:>10.3f} {mean_iou:>9.3f}")
+
+    if len(sys.argv) <= 2:
+        print(f"\n{'pipeline at 30 FPS':<32} {'detections':>11} {'age (frames)':>13} {'recall':>7} {'precision':>10} {'mean IoU':>9}")
+        for detect_every in (1, 3):
+            for compensate in (False, True):
+                detections, age, outputs = run_pipeline(reference, detect_every, compensate)
+                recall, precision, mean_iou = accuracy(outputs, reference)
+                name = f"every {detect_every}, {'moved to the frame' if compensate else 'as of the frame'}"
+                print(f"{name:<32} {detections:>11} {age:>13.1f} {recall:>7.3f} {precision:>10.3f} {mean_iou:>9.3f}")
@@ -0,0 +1,60 @@
+"""
+Benchmark the vectorized PIDBank against the list of scalar PID objects
+that Movement_Package.update used to loop over.
+
+Run from the AUV folder: python tests/bench_PID_Bank.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Movement_Package import PID, PIDBank
+
+Kp = [0.78, 0.6, 0.6, 0.6, 0.6, 0.6]
+Ki = [0.15, 0.05, 0.05, 0.05, 0.05, 0.05]
+Kd = [0.05, 0.05, 0.05, 0.05, 0.05, 0.05]
+limits = [1.0] * 6
+num_ticks = 20000
+
+
+def run_pid_list(num_dof: int) -> float:
+    PIDs = [PID(Kp[i % 6], Ki[i % 6], Kd[i % 6], 1.0, -1.0, 1.0, -1.0) for i in range(num_dof)]
+    desired = np.ones(num_dof)
+    sensor = np.zeros(num_dof)
+    output = np.zeros(num_dof)
+    clock = [0.0]
+
+    def tick():
+        clock[0] += 0.01
+        for i in range(len(PIDs)):
+            PIDs[i].set_target(desired[i])
+            output[i] = PIDs[i].update(sensor[i], clock[0])
+
+    return timeit.timeit(tick, number=num_ticks) / num_ticks
+
+
+def run_pid_bank(num_dof: int, batch_size: int = None) -> float:
+    gains = [np.resize(g, num_dof) for g in (Kp, Ki, Kd)]
+    bounds = np.resize(limits, num_dof)
+    bank = PIDBank(*gains, bounds, -bounds, bounds, -bounds, batch_size=batch_size)
+    bank.set_target(1.0)
+    sensor = np.zeros(bank.shape)
+    clock = [0.0]
+
+    def tick():
+        clock[0] += 0.01
+        bank.update(sensor, clock[0])
+
+    return timeit.timeit(tick, number=num_ticks) / num_ticks
+
+
+if __name__ == "__main__":
+    print(f"{'DOF':>5} {'batch':>6} {'PID list (us)':>14} {'PIDBank (us)':>13}")
+    for num_dof in (6, 12, 48):
+        print(f"{num_dof:>5} {1:>6} {run_pid_list(num_dof) * 1e6:>14.2f} {run_pid_bank(num_dof) * 1e6:>13.2f}")
+    for batch_size in (10, 100, 1000):
+        list_time = run_pid_list(6) * batch_size
+        print(f"{6:>5} {batch_size:>6} {list_time * 1e6:>14.2f} {run_pid_bank(6, batch_size) * 1e6:>13.2f}")
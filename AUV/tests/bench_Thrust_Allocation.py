@@ -0,0 +1,50 @@
+"""
+Benchmark ThrustAllocator against the plain thruster_matrix dot product that
+Movement_Package.update used before, for solve latency and wrench error.
+
+Run from the AUV folder: python tests/bench_Thrust_Allocation.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Movement_Package import Movement_Package
+
+num_samples = 5000
+
+
+def latency(function, wrenches) -> np.ndarray:
+    samples = np.empty(len(wrenches))
+    for i, wrench in enumerate(wrenches):
+        samples[i] = timeit.timeit(lambda: function(wrench), number=20) / 20
+    return samples * 1e6
+
+
+if __name__ == "__main__":
+    mp = Movement_Package()
+    allocator = mp.thrust_allocator
+    rng = np.random.default_rng(0)
+
+    cases = {
+        'light (|w| <= 0.2)': rng.uniform(-0.2, 0.2, (num_samples, mp.num_dof)),
+        'full (|w| <= 1.0)': rng.uniform(-1.0, 1.0, (num_samples, mp.num_dof)),
+    }
+
+    print(f"{'case':<20} {'method':<26} {'mean (us)':>10} {'p99 (us)':>10} {'wrench error':>13}")
+    for name, wrenches in cases.items():
+        target = wrenches * allocator.authority
+        methods = {
+            'dot + clip (old)': lambda w: np.clip(w.dot(mp.thruster_matrix), -1, 1),
+            'pinv + clip': lambda w: np.clip(allocator.pinv @ (w * allocator.authority), -1, 1),
+            'ThrustAllocator': allocator.allocate,
+        }
+        for method, function in methods.items():
+            times = latency(function, wrenches[:500])
+            commands = np.array([function(w) for w in wrenches])
+            # Error against the best wrench reachable without limits, i.e. the unconstrained least-squares solution
+            reachable = target @ (allocator.effect_matrix @ allocator.pinv).T
+            error = np.linalg.norm(commands @ allocator.effect_matrix.T - reachable, axis=1).mean()
+            print(f"{name:<20} {method:<26} {times.mean():>10.2f} {np.percentile(times, 99):>10.2f} {error:>13.4f}")
@@ -0,0 +1,92 @@
+"""
+Video downlink over a simulated tether: raw 480x270 frames against VideoEncoder JPEG at a fixed quality
+and with rate adaptation. The link is a blocking sink that takes size / bandwidth seconds per frame,
+and its bandwidth drops from 8 to 2 Mbit/s halfway through every run. Frames are camera-like
+synthetic images (smooth texture plus sensor noise, panning every frame) submitted at 30 fps.
+
+Run from the AUV folder: python tests/bench_Video_Stream.py
+"""
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Video_Stream import VideoEncoder
+
+fps = 30.0
+duration = 6.0
+bandwidths = (8e6, 2e6)
+
+
+class SimulatedLink:
+    def __init__(self):
+        self.start = time.monotonic()
+        # Per delivered frame: time, bytes, capture-to-delivered latency, quality
+        self.delivered = []
+
+    def bandwidth(self):
+        return bandwidths[0] if time.monotonic() - self.start < duration / 2 else bandwidths[1]
+
+    def __call__(self, packet, timestamp, quality=np.nan):
+        time.sleep(8 * packet.nbytes / self.bandwidth())
+        now = time.monotonic()
+        self.delivered.append((now, packet.nbytes, now - timestamp, quality))
+
+
+def make_frames(count=60):
+    rng = np.random.default_rng(0)
+    texture = cv2.resize(rng.integers(0, 255, (36, 64, 3), dtype=np.uint8), (1280 + count * 8, 720), interpolation=cv2.INTER_CUBIC)
+    frames = []
+    for i in range(count):
+        frame = texture[:, i * 8:i * 8 + 1280].astype(np.int16) + rng.normal(0, 6, (720, 1280, 3)).astype(np.int16)
+        frames.append(np.clip(frame, 0, 255).astype(np.uint8))
+    return frames
+
+
+def run_raw(frames):
+    # Raw frames at the send size, sent one after the other: the link is the only limit
+    link = SimulatedLink()
+    raw = [cv2.resize(frame, (480, 270), interpolation=cv2.INTER_AREA) for frame in frames]
+    i = 0
+    while time.monotonic() - link.start < duration:
+        # Send the newest camera frame, the ones captured while the link was busy are lost
+        i = int((time.monotonic() - link.start) * fps)
+        link(raw[i % len(raw)].reshape(-1), link.start + i / fps)
+        time.sleep(max(0.0, link.start + (i + 1) / fps - time.monotonic()))
+    return link
+
+
+def run_encoder(frames, adaptive):
+    link = SimulatedLink()
+    encoder = VideoEncoder(lambda packet: link(packet, encoder.frame_timestamp, encoder.quality), target_bitrate=6e6, fps=fps, quality=80)
+    if not adaptive:
+        encoder.min_quality = encoder.max_quality = encoder.quality
+        encoder.rate = lambda: float('inf')
+    with encoder:
+        i = 0
+        while time.monotonic() - link.start < duration:
+            encoder.submit(frames[i % len(frames)])
+            i += 1
+            time.sleep(max(0.0, link.start + i / fps - time.monotonic()))
+    return link
+
+
+if __name__ == "__main__":
+    frames = make_frames()
+    print(f"{'mode':<14} {'link (Mbit/s)':>13} {'FPS':>5} {'Mbit/s':>7} {'latency mean (ms)':>18} {'latency max (ms)':>17} {'quality':>8}")
+    for name, run in [('raw', run_raw), ('jpeg q80', lambda f: run_encoder(f, False)), ('jpeg adaptive', lambda f: run_encoder(f, True))]:
+        link = run(frames)
+        delivered = np.array(link.delivered)
+        half = link.start + duration / 2
+        # Skip the first second of each phase, so the numbers show where the stream settles
+        for bandwidth, mask in [(bandwidths[0], (delivered[:, 0] >= link.start + 1) & (delivered[:, 0] < half)),
+                                (bandwidths[1], delivered[:, 0] >= half + 1)]:
+            seconds = duration / 2 - 1
+            rows = delivered[mask]
+            quality = '-' if np.isnan(rows[:, 3]).any() else f'{rows[:, 3].mean():.0f}'
+            print(f"{name:<14} {bandwidth / 1e6:>13g} {len(rows) / seconds:>5.1f} {8 * rows[:, 1].sum() / seconds / 1e6:>7.2f} "
+                  f"{rows[:, 2].mean() * 1e3:>18.1f} {rows[:, 2].max() * 1e3:>17.1f} {quality:>8}")
@@ -0,0 +1,92 @@
+"""
+Depth pipeline of Zed_Camera_Package on a recorded 1280x720 depth sequence played back at 30 fps
+by DepthFileSource, so it runs without the ZED SDK:
+- downsampling the depth map to the 480x270 send size with a loop over blocks against the
+  vectorised reduceat in grab_depth_image, and cv2.resize for comparison, which is fast but
+  keeps one pixel per block and so loses small close obstacles,
+- grab_depth_point against reading the depth map synchronously from the source on every query,
+- the age of the depth map a query sees.
+
+Run from the AUV folder: python tests/bench_Zed_Camera_Package.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Zed_Camera_Package import DepthFileSource, Zed_Camera_Package
+
+height, width = 720, 1280
+num_frames = 30
+
+
+def make_depths(path):
+    # A sloped floor with sensor noise, holes where the stereo match failed and a one pixel wide close pole
+    rng = np.random.default_rng(0)
+    floor = np.linspace(8.0, 1.0, height, dtype=np.float32)[:, None].repeat(width, axis=1)
+    depths = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(num_frames, height, width))
+    for i in range(num_frames):
+        depth = floor + rng.normal(0, 0.05, (height, width)).astype(np.float32)
+        depth[rng.random((height, width)) < 0.05] = np.nan
+        depth[200:500, 601 + i] = 0.5
+        depths[i] = depth
+    depths.flush()
+
+
+def downsample_loop(depth, row_starts, col_starts):
+    rows = list(row_starts) + [depth.shape[0]]
+    cols = list(col_starts) + [depth.shape[1]]
+    out = np.empty((len(row_starts), len(col_starts)), dtype=np.float32)
+    for i in range(len(row_starts)):
+        for j in range(len(col_starts)):
+            out[i, j] = np.nanmin(depth[rows[i]:rows[i + 1], cols[j]:cols[j + 1]])
+    return out
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'depth.npy')
+        make_depths(path)
+        zed = Zed_Camera_Package(DepthFileSource(path, fps=30))
+        zed.update(wait=True)
+        depth = zed.depth.copy()
+
+        print(f"{'downsampling':<20} {'time (ms)':>10} {'pole depth (m)':>15}")
+        out = np.empty((zed.send_height, zed.send_width), dtype=np.float32)
+        for name, function, repeat in [
+                ('loop over blocks', lambda: downsample_loop(depth, zed.row_starts, zed.col_starts), 1),
+                ('reduceat', lambda: zed.grab_depth_image(out), 20),
+                ('cv2.resize nearest', lambda: cv2.resize(depth, (zed.send_width, zed.send_height), interpolation=cv2.INTER_NEAREST), 20)]:
+            seconds, result = timed(function, repeat)
+            print(f"{name:<20} {seconds * 1e3:>10.2f} {np.nanmin(result[75:185]):>15.2f}")
+
+        print(f"\n{'depth point':<20} {'time (us)':>10} {'age mean (ms)':>14} {'age max (ms)':>13}")
+        # Synchronous: every query reads the next depth map from the source itself, as a grab-per-call camera does
+        source = DepthFileSource(path, fps=30)
+        buffers = source.allocate()
+        ages = []
+        start = time.perf_counter()
+        for _ in range(30):
+            timestamp = source.read(buffers)
+            value = float(np.nanmedian(buffers[1][358:363, 638:643]))
+            ages.append(time.monotonic() - timestamp)
+        print(f"{'synchronous read':<20} {(time.perf_counter() - start) / 30 * 1e6:>10.0f} {np.mean(ages) * 1e3:>14.2f} {np.max(ages) * 1e3:>13.2f}")
+
+        ages = []
+        start = time.perf_counter()
+        for _ in range(2000):
+            value = zed.grab_depth_point(640, 360)
+            ages.append(time.monotonic() - zed.timestamp)
+        print(f"{'grab_depth_point':<20} {(time.perf_counter() - start) / 2000 * 1e6:>10.0f} {np.mean(ages) * 1e3:>14.2f} {np.max(ages) * 1e3:>13.2f}")
+        zed.close()
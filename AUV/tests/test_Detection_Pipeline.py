@@ -0,0 +1,80 @@
+"""
+DetectionStage with stand-in models: results, and how model errors are survived.
+
+Run from the AUV folder: python -m pytest tests/test_Detection_Pipeline.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Detection_Pipeline import DetectionStage
+
+FRAME = np.zeros((8, 8, 3), dtype=np.uint8)
+
+
+def empty(frames):
+    return [(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int32)) for _ in frames]
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+class Flaky:
+    # Raises on the frames whose first pixel is odd
+    def __call__(self, frames):
+        if any(frame[0, 0, 0] % 2 for frame in frames):
+            raise RuntimeError('inference failed')
+        return empty(frames)
+
+
+class Fatal(BaseException):
+    pass
+
+
+def test_results_come_back_in_order():
+    with DetectionStage(empty, max_queue=8) as stage:
+        for index in range(3):
+            stage.submit(FRAME, index)
+            assert stage.get(timeout=2.0).index == index
+        assert stage.pending() == 0
+
+
+def test_failed_batch_is_counted_and_the_worker_goes_on():
+    with DetectionStage(Flaky(), max_queue=8) as stage:
+        stage.submit(FRAME + 1, 0)
+        assert wait_for(lambda: stage.failed == 1)
+        assert stage.pending() == 0
+        assert isinstance(stage.last_error, RuntimeError)
+        stage.submit(FRAME, 1)
+        assert stage.get(timeout=2.0).index == 1
+        assert stage.running
+        assert 'failed' in stage.summary()
+
+
+def test_wrong_number_of_results_fails_the_batch():
+    with DetectionStage(lambda frames: [], max_queue=8) as stage:
+        stage.submit(FRAME, 0)
+        assert wait_for(lambda: stage.failed == 1)
+        assert stage.pending() == 0
+
+
+def test_fatal_error_stops_the_stage(monkeypatch):
+    monkeypatch.setattr('threading.excepthook', lambda args: None)
+
+    def model(frames):
+        raise Fatal()
+
+    stage = DetectionStage(model)
+    stage.start()
+    stage.submit(FRAME, 0)
+    assert wait_for(lambda: not stage.running)
+    # get() without a timeout returns instead of waiting for a result that never comes
+    assert stage.get() is None
+    stage.stop()
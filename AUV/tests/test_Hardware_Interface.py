@@ -0,0 +1,58 @@
+"""
+Hardware_Interface against the pty microcontroller emulator.
+
+Run from the AUV folder: python -m pytest tests/test_Hardware_Interface.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Hardware_Interface import Hardware_Interface
+from modules.Serial_Emulator import SerialEmulator
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_close_writes_last_command():
+    # At 9600 baud every command holds the writer for ~40 ms, so close always lands while it waits on the line
+    for _ in range(5):
+        with SerialEmulator(num_thrusters=8, baudrate=9600) as emulator:
+            hi = Hardware_Interface(emulator.port, baudrate=9600)
+            hi.start()
+            hi.transmit(np.full(8, 1700))
+            assert wait_for(lambda: hi.commands_sent == 1)
+            hi.transmit(np.full(8, 1500))
+            hi.close()
+            assert wait_for(lambda: len(emulator.commands) == 2)
+            assert np.array_equal(emulator.commands[-1][1], np.full(8, 1500))
+
+
+def test_transmit_keeps_only_newest_command():
+    with SerialEmulator(num_thrusters=8, baudrate=9600) as emulator:
+        hi = Hardware_Interface(emulator.port, baudrate=9600)
+        hi.start()
+        for pwm in range(1500, 1510):
+            hi.transmit(np.full(8, pwm))
+        hi.close()
+        assert wait_for(lambda: len(emulator.commands) == hi.commands_sent)
+        assert hi.commands_sent + hi.commands_coalesced == 10
+        assert np.array_equal(emulator.commands[-1][1], np.full(8, 1509))
+
+
+def test_recv_returns_sensor_packets():
+    with SerialEmulator(num_thrusters=8, sensor_function=lambda pwm: [1, 2, 3, 4]) as emulator:
+        hi = Hardware_Interface(emulator.port)
+        hi.start()
+        assert hi.recv() is None
+        hi.transmit(np.full(8, 1500))
+        assert wait_for(lambda: hi.recv() is not None)
+        assert np.array_equal(hi.recv(), [1, 2, 3, 4])
+        hi.close()
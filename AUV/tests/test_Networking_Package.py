@@ -0,0 +1,89 @@
+"""
+UDPControlChannel datagram checks and session handover, over loopback.
+
+Run from the AUV folder: python -m pytest tests/test_Networking_Package.py
+"""
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Networking_Package import CONTROL_HEADER, CONTROL_MAGIC, CONTROL_VERSION, UDPControlChannel
+
+NUM_VALUES = 6
+
+
+def command(session, sequence, timestamp, value):
+    return (CONTROL_HEADER.pack(CONTROL_MAGIC, CONTROL_VERSION, NUM_VALUES, session, sequence, timestamp)
+            + np.full(NUM_VALUES, value, dtype='<f8').tobytes())
+
+
+@pytest.fixture
+def channel():
+    receiver = UDPControlChannel(NUM_VALUES, session_grace=0.2)
+    receiver.bind(('127.0.0.1', 0))
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender.connect(receiver.getsockname())
+
+    def deliver(datagram):
+        sender.send(datagram)
+        return receiver.poll(timeout=1.0)
+
+    yield receiver, deliver
+    sender.close()
+    receiver.close()
+
+
+def test_commands_between_two_channels():
+    receiver = UDPControlChannel(NUM_VALUES)
+    receiver.bind(('127.0.0.1', 0))
+    sender = UDPControlChannel(NUM_VALUES)
+    try:
+        sender.send_command(np.arange(NUM_VALUES), receiver.getsockname())
+        assert receiver.poll(timeout=1.0)
+        assert receiver.latest_values.tolist() == list(range(NUM_VALUES))
+    finally:
+        sender.close()
+        receiver.close()
+
+
+def test_oversized_and_short_datagrams_are_dropped(channel):
+    receiver, deliver = channel
+    assert not deliver(command(1, 0, 100.0, 1.0) + b'\x00')
+    assert not deliver(command(1, 0, 100.0, 1.0)[:-1])
+    assert receiver.latest_session is None
+    assert receiver.dropped == 2
+    assert deliver(command(1, 0, 100.0, 1.0))
+
+
+def test_stale_sequence_is_dropped(channel):
+    receiver, deliver = channel
+    assert deliver(command(1, 5, 100.0, 1.0))
+    assert not deliver(command(1, 4, 100.1, 2.0))
+    assert receiver.latest_values[0] == 1.0
+
+
+def test_restarted_sender_takes_over_and_old_session_stays_out(channel):
+    receiver, deliver = channel
+    assert deliver(command(1, 50, 100.0, 1.0))
+    # The restarted sender starts its sequence over, with newer timestamps
+    assert deliver(command(2, 0, 101.0, 2.0))
+    # Delayed datagrams of the old session never replace the new one again
+    assert not deliver(command(1, 51, 100.1, 1.0))
+    assert deliver(command(2, 1, 101.1, 3.0))
+    assert receiver.latest_session == 2
+    assert receiver.latest_values[0] == 3.0
+
+
+def test_older_session_waits_for_the_grace_period(channel):
+    receiver, deliver = channel
+    assert deliver(command(1, 0, 100.0, 1.0))
+    # A sender whose clock is behind is only accepted once the current session has gone quiet
+    assert not deliver(command(2, 0, 50.0, 2.0))
+    time.sleep(0.3)
+    assert deliver(command(2, 1, 50.1, 2.0))
+    assert receiver.latest_session == 2
@@ -0,0 +1,97 @@
+"""
+Tracker association, track lifetime and delayed detections.
+
+Run from the AUV folder: python -m pytest tests/test_Object_Tracker.py
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Object_Tracker import Tracker, iou_matrix
+
+
+def box(x, y=100.0, size=100.0):
+    return np.array([[x, y, x + size, y + size]])
+
+
+def test_iou_matrix():
+    iou = iou_matrix(box(0, 0, 10), np.concatenate([box(0, 0, 10), box(5, 0, 10), box(20, 0, 10)]))
+    assert np.allclose(iou, [[1.0, 50 / 150, 0.0]])
+
+
+def test_id_persists_between_detections():
+    tracker = Tracker()
+    # 10 px per frame, detected every 5th frame, with a box far larger than the 50 px between detections
+    for frame in range(40):
+        tracks = tracker.update(box(100 + 10 * frame) if frame % 5 == 0 else None)
+        assert tracks.ids.tolist() == [0]
+    assert tracker.next_id == 1
+    # The tracks coast along the learned velocity between detections
+    assert abs(tracks.boxes[0, 0] - (100 + 10 * 39)) < 10
+
+
+def test_unmatched_detection_starts_a_track():
+    tracker = Tracker()
+    tracker.update(box(100))
+    tracks = tracker.update(np.concatenate([box(100), box(600)]))
+    assert tracks.ids.tolist() == [0, 1]
+
+
+def test_fast_object_outruns_iou_gating():
+    # 50 px between detections with a 40 px box: the boxes never overlap, so every detection starts a track
+    tracker = Tracker()
+    for frame in range(21):
+        tracks = tracker.update(box(100 + 10 * frame, size=40) if frame % 5 == 0 else None)
+    assert tracker.next_id == 5
+    assert len(tracks.ids) == 5
+
+
+def test_track_expires_after_max_age():
+    tracker = Tracker(max_age=3)
+    tracker.update(box(100))
+    for _ in range(3):
+        assert len(tracker.update().ids) == 1
+    assert len(tracker.update().ids) == 0
+
+
+def test_min_hits_hides_new_tracks():
+    tracker = Tracker(min_hits=2)
+    assert len(tracker.update(box(100)).ids) == 0
+    assert tracker.update(box(102)).ids.tolist() == [0]
+
+
+def test_class_aware_gate():
+    aware = Tracker(class_aware=True)
+    aware.update(box(100), classes=np.array([0]))
+    assert aware.update(box(100), classes=np.array([1])).ids.tolist() == [0, 1]
+
+    unaware = Tracker(class_aware=False)
+    unaware.update(box(100), classes=np.array([0]))
+    assert unaware.update(box(100), classes=np.array([1])).ids.tolist() == [0]
+
+
+def test_confidence_decays_without_detections():
+    tracker = Tracker(decay=0.5)
+    tracker.update(box(100), scores=np.array([0.8]))
+    tracker.update()
+    tracker.update()
+    assert np.isclose(tracker.confidence(), 0.2)
+
+
+def test_delayed_detections_are_moved_to_the_current_frame():
+    delay = 4
+    results = {}
+    for age in (0, delay):
+        tracker = Tracker()
+        for frame in range(60):
+            # Detections of frame - delay, handed over on every 3rd frame, as an asynchronous detector would
+            detected = frame - delay
+            boxes = box(100 + 10 * detected) if frame % 3 == 0 and detected >= 0 else None
+            tracks = tracker.update(boxes, age=age)
+        results[age] = abs(tracks.boxes[0, 0] - (100 + 10 * 59))
+        assert tracker.next_id == 1
+    # Applied as if they were of the current frame, the track lags by the delay, moved along it does not
+    assert results[0] > 20
+    assert results[delay] < 5
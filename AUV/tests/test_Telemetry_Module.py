@@ -0,0 +1,50 @@
+"""
+Telemetry sinks: the abstract base and the CSV sink.
+
+Run from the AUV folder: python -m pytest tests/test_Telemetry_Module.py
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Telemetry_Module import CSVSink, RingBufferSink, TelemetrySink
+
+
+class MessageLogger:
+    def __init__(self):
+        self.messages = []
+
+    def info(self, message):
+        self.messages.append(message)
+
+
+def test_sink_without_write_cannot_be_constructed():
+    class Incomplete(TelemetrySink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_ring_buffer_keeps_newest_rows():
+    sink = RingBufferSink(capacity=3)
+    sink.open(['a', 'b'])
+    for i in range(5):
+        sink.write(np.array([i, -i], dtype=float))
+    assert sink.data()[:, 0].tolist() == [2, 3, 4]
+
+
+def test_csv_sink_writes_rows_and_logs_on_close(tmp_path, capsys):
+    logger = MessageLogger()
+    output_file = str(tmp_path / 'telemetry.csv')
+    sink = CSVSink(output_file, logger)
+    sink.open(['a', 'b'])
+    sink.write(np.array([1.0, 2.0]))
+    sink.close()
+    with open(output_file) as f:
+        assert f.read().splitlines() == ['a,b', '1.0,2.0']
+    assert logger.messages == [f'Data logged to {output_file}']
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,62 @@
+"""
+ThrustAllocator saturation handling, on the thruster geometry of Movement_Package.
+
+Run from the AUV folder: python -m pytest tests/test_Thrust_Allocation.py
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Movement_Package import Movement_Package, ThrustAllocator
+
+EFFECT_MATRIX = Movement_Package().thruster_matrix
+PRIORITIES = [[3, 4, 5], [2], [0, 1]]
+
+
+def delivered(allocator, u):
+    # Normalized wrench the commands produce, on the axes with authority (this geometry has no yaw)
+    return (allocator.effect_matrix @ u / allocator.authority)[:5]
+
+
+def test_feasible_request_is_met_exactly():
+    allocator = ThrustAllocator(EFFECT_MATRIX, priorities=PRIORITIES)
+    wrench = np.array([0.3, -0.2, 0.4, 0.1, -0.1, 0.0])
+    u = allocator.allocate(wrench)
+    assert np.allclose(delivered(allocator, u), wrench[:5])
+    assert np.allclose(u, ThrustAllocator(EFFECT_MATRIX).allocate(wrench))
+
+
+def test_full_request_holds_attitude_first():
+    allocator = ThrustAllocator(EFFECT_MATRIX, priorities=PRIORITIES)
+    u = allocator.allocate(np.ones(6))
+    assert np.all(u <= 1.0) and np.all(u >= -1.0)
+    surge, sway, heave, roll, pitch = delivered(allocator, u)
+    # Roll and pitch use all of the vertical thrusters, heave gets nothing, surge and sway share the horizontal ones
+    assert np.allclose([roll, pitch], 1.0)
+    assert abs(heave) < 1e-9
+    assert np.allclose([surge, sway], 0.5)
+
+
+def test_lower_priority_gives_way():
+    allocator = ThrustAllocator(EFFECT_MATRIX, priorities=PRIORITIES)
+    u = allocator.allocate(np.array([0.0, 0.0, 1.0, 0.2, 0.2, 0.0]))
+    heave, roll, pitch = delivered(allocator, u)[2:]
+    assert np.allclose([roll, pitch], 0.2)
+    assert 0.0 < heave < 1.0
+
+
+def test_without_priorities_the_shortfall_is_shared():
+    allocator = ThrustAllocator(EFFECT_MATRIX)
+    u = allocator.allocate(np.ones(6))
+    roll, pitch = delivered(allocator, u)[3:]
+    assert roll < 0.1 and pitch < 0.1
+
+
+def test_batch_matches_single_requests():
+    allocator = ThrustAllocator(EFFECT_MATRIX, priorities=PRIORITIES)
+    wrenches = np.random.default_rng(0).uniform(-1.0, 1.0, (200, 6))
+    batch = allocator.allocate(wrenches)
+    assert np.allclose(batch, [allocator.allocate(wrench) for wrench in wrenches])
+    assert np.all(batch <= 1.0) and np.all(batch >= -1.0)
@@ -0,0 +1,35 @@
+"""
+VideoEncoder link measurement, fed sends of known size and duration directly.
+
+Run from the AUV folder: python -m pytest tests/test_Video_Stream.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Video_Stream import VideoEncoder
+
+
+def test_rate_follows_a_slow_link():
+    encoder = VideoEncoder(lambda packet: None, target_bitrate=2e6)
+    for _ in range(50):
+        # 2500 bytes in 0.1 s, a 200 kbit/s link
+        encoder._measure(2500, 0.1)
+    assert abs(encoder.link_bitrate - 200e3) < 1e3
+    assert abs(encoder.rate() - 160e3) < 1e3
+
+
+def test_rate_recovers_once_sends_are_instant():
+    encoder = VideoEncoder(lambda packet: None, target_bitrate=2e6)
+    for _ in range(50):
+        encoder._measure(2500, 0.1)
+    for _ in range(50):
+        encoder._measure(2500, 1e-5)
+    assert encoder.rate() > 0.99 * encoder.target_bitrate
+
+
+def test_instant_sends_alone_measure_nothing():
+    encoder = VideoEncoder(lambda packet: None, target_bitrate=2e6)
+    encoder._measure(2500, 1e-5)
+    assert encoder.link_bitrate is None
+    assert encoder.rate() == encoder.target_bitrate
@@ -0,0 +1,129 @@
+// Reference implementation of the binary serial protocol of modules/Serial_Protocol.py for the microcontroller.
+//
+// Frame: 0xA5 | payload length | kind | sequence (uint16 LE) | payload | CRC16 (uint16 LE)
+// The CRC is CRC-16/CCITT-FALSE over everything after the start byte.
+// Thruster frames (kind 1) carry uint16 PWM values, sensor frames (kind 2) carry int16 readings.
+//
+// Usage:
+//   SerialDecoder decoder;
+//   while (Serial.available()) {
+//     if (serial_decoder_feed(&decoder, Serial.read()) && decoder.kind == SERIAL_KIND_THRUSTER) {
+//       // decoder.payload holds decoder.length bytes of PWM values
+//       uint8_t frame[SERIAL_MAX_FRAME];
+//       size_t size = serial_encode_frame(frame, SERIAL_KIND_SENSOR, decoder.sequence, (uint8_t *)sensors, sizeof(sensors));
+//       Serial.write(frame, size);
+//     }
+//   }
+
+#ifndef SERIAL_PROTOCOL_H
+#define SERIAL_PROTOCOL_H
+
+#include <stddef.h>
+#include <stdint.h>
+
+#define SERIAL_START_BYTE 0xA5
+#define SERIAL_MAX_PAYLOAD 64
+#define SERIAL_HEADER_SIZE 5
+#define SERIAL_MAX_FRAME (SERIAL_HEADER_SIZE + SERIAL_MAX_PAYLOAD + 2)
+
+#define SERIAL_KIND_THRUSTER 1
+#define SERIAL_KIND_SENSOR 2
+
+static inline uint16_t serial_crc16_update(uint16_t crc, uint8_t byte) {
+  crc ^= (uint16_t)byte << 8;
+  for (uint8_t bit = 0; bit < 8; bit++) {
+    crc = (crc & 0x8000) ? (uint16_t)((crc << 1) ^ 0x1021) : (uint16_t)(crc << 1);
+  }
+  return crc;
+}
+
+// Write one frame into out, which must hold SERIAL_HEADER_SIZE + length + 2 bytes. Returns the frame size.
+static inline size_t serial_encode_frame(uint8_t *out, uint8_t kind, uint16_t sequence, const uint8_t *payload, uint8_t length) {
+  size_t size = 0;
+  out[size++] = SERIAL_START_BYTE;
+  out[size++] = length;
+  out[size++] = kind;
+  out[size++] = (uint8_t)(sequence & 0xFF);
+  out[size++] = (uint8_t)(sequence >> 8);
+  for (uint8_t i = 0; i < length; i++) {
+    out[size++] = payload[i];
+  }
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 1; i < size; i++) {
+    crc = serial_crc16_update(crc, out[i]);
+  }
+  out[size++] = (uint8_t)(crc & 0xFF);
+  out[size++] = (uint8_t)(crc >> 8);
+  return size;
+}
+
+// Byte-at-a-time decoder. A bad length or CRC drops the frame and waits for the next start byte.
+typedef struct {
+  uint8_t state;
+  uint8_t length;
+  uint8_t kind;
+  uint16_t sequence;
+  uint8_t received;
+  uint16_t crc;
+  uint16_t frame_crc;
+  uint8_t payload[SERIAL_MAX_PAYLOAD];
+  uint16_t crc_errors;
+} SerialDecoder;
+
+// Returns 1 when byte completes a valid frame, whose fields are then in the decoder.
+static inline int serial_decoder_feed(SerialDecoder *d, uint8_t byte) {
+  switch (d->state) {
+    case 0:  // start byte
+      if (byte == SERIAL_START_BYTE) {
+        d->crc = 0xFFFF;
+        d->state = 1;
+      }
+      return 0;
+    case 1:  // length
+      if (byte > SERIAL_MAX_PAYLOAD) {
+        d->state = 0;
+        return 0;
+      }
+      d->length = byte;
+      d->crc = serial_crc16_update(d->crc, byte);
+      d->state = 2;
+      return 0;
+    case 2:  // kind
+      d->kind = byte;
+      d->crc = serial_crc16_update(d->crc, byte);
+      d->state = 3;
+      return 0;
+    case 3:  // sequence, low byte
+      d->sequence = byte;
+      d->crc = serial_crc16_update(d->crc, byte);
+      d->state = 4;
+      return 0;
+    case 4:  // sequence, high byte
+      d->sequence |= (uint16_t)byte << 8;
+      d->crc = serial_crc16_update(d->crc, byte);
+      d->received = 0;
+      d->state = d->length ? 5 : 6;
+      return 0;
+    case 5:  // payload
+      d->payload[d->received++] = byte;
+      d->crc = serial_crc16_update(d->crc, byte);
+      if (d->received == d->length) {
+        d->state = 6;
+      }
+      return 0;
+    case 6:  // CRC, low byte
+      d->frame_crc = byte;
+      d->state = 7;
+      return 0;
+    default:  // CRC, high byte
+      d->frame_crc |= (uint16_t)byte << 8;
+      d->state = 0;
+      if (d->frame_crc != d->crc) {
+        d->crc_errors++;
+        return 0;
+      }
+      return 1;
+  }
+}
+
+#endif
@@ -1,19 +1,30 @@
 import cv2
 
+from modules.Frame_Grabber import CameraSource, FrameGrabber
+
 class Camera_Package:
     """
     ## Camera_Package Class
     Responsible for capturing video frames from a camera using OpenCV.
+    Frames are captured on a background thread by a FrameGrabber, so a slow consumer always gets
+    the newest frame instead of whatever has been waiting in the driver queue.
     """
 
-    def __init__(self):
+    def __init__(self, source=None):
         """
         ### __init__ method
-        Initializes the CP class by setting camera properties.
+        Initializes the CP class by setting camera properties and starting the capture thread.
+
+        **Parameters:**
+        - `source`: Frame source, defaults to camera 0 at 1280x720. Use FileSource or SyntheticSource
+          from modules.Frame_Grabber to run without a camera.
         """
-        self.cam = cv2.VideoCapture(0)
-        self.cam.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-        self.cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+        if source is None:
+            source = CameraSource(0, 1280, 720)
+        self.grabber = FrameGrabber(source)
+        self.grabber.start()
+        # Index of the last frame returned by get_frame
+        self.sent_index = None
 
         self.cam_send_width = int(1280 / 4)  # convert to int to avoid float
         self.cam_send_height = int(720 / 4)  # convert to int to avoid float
@@ -21,17 +32,17 @@ class Camera_Package:
     def get_frame(self):
         """
         ### get_frame method
-        Captures a frame from the camera and resizes it.
+        Takes the newest captured frame and resizes it, waiting up to one second if no new frame has arrived.
 
         **Returns:**
-        - Resized frame or None if capture failed.
+        - Resized frame, or None if no new frame arrived within the second or the grabber has stopped.
         """
-        ret, frame = self.cam.read()
-        if ret:
-            frame = self.resize_image(frame, width=self.cam_send_width, height=self.cam_send_height)
-            return frame
-        else:
+        frame, index, timestamp = self.grabber.latest(timeout=1.0)
+        # latest() hands back the last frame again on a timeout and once the grabber has stopped
+        if frame is None or index == self.sent_index:
             return None
+        self.sent_index = index
+        return self.resize_image(frame, width=self.cam_send_width, height=self.cam_send_height)
 
     def run(self):
         """
@@ -40,6 +51,8 @@ class Camera_Package:
         """
         while True:
             frame = self.get_frame()
+            if frame is None and not self.grabber.running:
+                break
             if frame is not None:
                 cv2.imshow('frame', frame)
                 if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -48,9 +61,9 @@ class Camera_Package:
     def __del__(self):
         """
         ### __del__ method
-        Releases the camera when the object is deleted.
+        Stops the capture thread and releases the camera when the object is deleted.
         """
-        self.cam.release()
+        self.grabber.stop()
 
     @staticmethod
     def resize_image(image, width=None, height=None, inter=cv2.INTER_AREA):
@@ -9,7 +9,10 @@
 # - numpy
 #
 # ## How to Run
-# - Initialize a `CM` object and call its `get_data` and `print` methods in a loop.
+# - Initialize a `CM` object and call its `poll` and `print` methods in a loop.
+# - `poll` waits for joystick events and only returns a command when the sticks moved or a heartbeat is due.
+
+import time
 
 import pygame
 import numpy as np
@@ -17,30 +20,49 @@ import numpy as np
 class Controller_Module:
     """
     ## CM (Control Module) Class
-    
-    The `CM` class is used to read input data from an RC flight controller 
+
+    The `CM` class is used to read input data from an RC flight controller
     and store it as a numpy array.
-    
+    The joystick state is kept up to date from pygame joystick events, shaped with a deadzone
+    and quantization, and written into `data` in place.
+
     ### Attributes
     - `joystick`: The pygame Joystick object.
     - `data`: A numpy array that stores joystick data.
+    - `axes`: Raw axis values from the joystick events.
+    - `buttons`: Button states from the joystick events.
+    - `emitted`: Number of commands returned by `poll`.
     """
-    
-    def __init__(self, num_of_axis: int = 5):
+
+    def __init__(self, num_of_axis: int = 5, deadzone: float = 0.05, quantization: float = 0.01, threshold: float = 0.02, heartbeat: float = 0.2):
         """
         Initialize the CM object and call the method to initialize the joystick.
-        
+
         ### Parameters
         - `num_of_axis`: Number of axes to initialize in the data array. Default is 6.
+        - `deadzone`: Axis values closer to the centre than this read as 0, the rest of the travel is rescaled to the full range.
+        - `quantization`: Step the axis values are rounded to, 0 to keep them as they are.
+        - `threshold`: Smallest change of any value that makes `poll` return a new command.
+        - `heartbeat`: Seconds after which `poll` repeats an unchanged command, so the receiver knows the surface is alive.
         """
         self.joystick = None
         self.data = np.zeros(num_of_axis)
+        self.deadzone = deadzone
+        self.quantization = quantization
+        self.threshold = threshold
+        self.heartbeat = heartbeat
+
+        # The last command `poll` returned and when
+        self.sent = np.zeros(num_of_axis)
+        self.sent_time = None
+        self.emitted = 0
+        self._difference = np.zeros(num_of_axis)
         self.init_joystick()
 
     def init_joystick(self):
         """
         Initialize the pygame library and the joystick.
-        
+
         This method will keep retrying until a joystick is found.
         """
         pygame.init()
@@ -52,40 +74,123 @@ class Controller_Module:
             else:
                 print("No joystick found. Retrying in 3 seconds.")
                 pygame.time.wait(3000)
-        
+
         self.joystick = pygame.joystick.Joystick(0)
         self.joystick.init()
 
-    def get_data(self):
+        # Read the whole state once, from here on the events keep it up to date
+        self.axes = np.array([self.joystick.get_axis(i) for i in range(self.joystick.get_numaxes())])
+        self.buttons = np.array([self.joystick.get_button(i) for i in range(self.joystick.get_numbuttons())], dtype=np.int8)
+        self._shaped = np.zeros_like(self.axes)
+        self.update()
+
+    def handle(self, event) -> bool:
         """
-        Update the `data` array with the latest joystick values.
-        
+        Apply one pygame event to the joystick state.
+
+        ### Parameters
+        - `event`: A pygame event.
+
         ### Returns
-        - `data`: The updated data array.
+        - True if the event changed an axis or a button.
         """
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
+        if event.type == pygame.QUIT:
+            pygame.quit()
+            quit()
+        elif event.type == pygame.JOYAXISMOTION:
+            self.axes[event.axis] = event.value
+        elif event.type == pygame.JOYBUTTONDOWN:
+            self.buttons[event.button] = 1
+        elif event.type == pygame.JOYBUTTONUP:
+            self.buttons[event.button] = 0
+        elif event.type == pygame.JOYDEVICEREMOVED:
+            # Wait for the controller to come back and start over from its current state
+            self.init_joystick()
+        else:
+            return False
+        return True
 
-        self.joystick.init()
+    def update(self):
+        """
+        Shape the raw axes and map them into the `data` array.
+        """
+        shaped = self._shaped
+        # Deadzone, with the travel outside it rescaled so full deflection still reads 1
+        np.abs(self.axes, out=shaped)
+        np.subtract(shaped, self.deadzone, out=shaped)
+        np.maximum(shaped, 0, out=shaped)
+        np.multiply(shaped, 1 / (1 - self.deadzone), out=shaped)
+        np.copysign(shaped, self.axes, out=shaped)
+        if self.quantization:
+            np.multiply(shaped, 1 / self.quantization, out=shaped)
+            np.round(shaped, out=shaped)
+            np.multiply(shaped, self.quantization, out=shaped)
+            # Rounding leaves -0.0 behind
+            shaped += 0.0
 
-        joy_data = [round(self.joystick.get_axis(i), 2) for i in range(self.joystick.get_numaxes())]
-        joy_data.append([self.joystick.get_button(i) for i in range(self.joystick.get_numbuttons())])
         # Axis 0 = Left Joystick X
         # Axis 1 = Left Joystick Y
         # Axis 2 = Right Joystick X
         # Axis 3 = Right Joystick Y
-        if joy_data[8][0]:
-            self.data[3] = joy_data[2]
+        if self.buttons[0]:
+            self.data[3] = shaped[2]
         else:
-            self.data[1] = joy_data[2]
-        self.data[0] = joy_data[3]
-        self.data[2] = joy_data[1]
-        self.data[4] = joy_data[0]
+            self.data[1] = shaped[2]
+        self.data[0] = shaped[3]
+        self.data[2] = shaped[1]
+        self.data[4] = shaped[0]
+
+    def get_data(self):
+        """
+        Update the `data` array with the latest joystick values.
 
+        ### Returns
+        - `data`: The updated data array.
+        """
+        if any([self.handle(event) for event in pygame.event.get()]):
+            self.update()
         return self.data
-    
+
+    def changed(self) -> bool:
+        """
+        ### Returns
+        - True if `data` differs from the last command returned by `poll` by at least `threshold`,
+          or a value went to or left 0, so releasing a stick always stops the motion.
+        """
+        np.subtract(self.data, self.sent, out=self._difference)
+        np.abs(self._difference, out=self._difference)
+        return bool((self._difference >= self.threshold).any() or ((self.data == 0) != (self.sent == 0)).any())
+
+    def poll(self, timeout: float = None):
+        """
+        Wait for joystick events until there is a command to send: the values changed beyond
+        `threshold`, or `heartbeat` seconds passed since the last command.
+        Nothing is busy waiting, the thread sleeps in pygame until an event arrives or the heartbeat is due.
+
+        ### Parameters
+        - `timeout`: Maximum seconds to wait, None to wait until there is a command. 0 checks without waiting.
+
+        ### Returns
+        - `data` if a command is due, None if the timeout passed first. The array is updated in place by later calls.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.get_data()
+            now = time.monotonic()
+            if self.sent_time is None or now - self.sent_time >= self.heartbeat or self.changed():
+                self.sent[:] = self.data
+                self.sent_time = now
+                self.emitted += 1
+                return self.data
+
+            wait = self.sent_time + self.heartbeat - now
+            if deadline is not None:
+                if now >= deadline:
+                    return None
+                wait = min(wait, deadline - now)
+            if self.handle(pygame.event.wait(max(1, int(wait * 1000)))):
+                self.update()
+
     def print(self):
         """
         Print the current state of the `data` array.
@@ -95,6 +200,5 @@ class Controller_Module:
 if __name__ == "__main__":
     cm = Controller_Module()
     while True:
-        cm.get_data()
+        cm.poll()
         cm.print()
-        pygame.time.wait(10)
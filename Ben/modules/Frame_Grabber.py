@@ -0,0 +1,332 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class CameraSource:
+    """
+    OpenCV capture device as a frame source.
+    """
+    def __init__(self, index=0, width=1280, height=720):
+        """
+        Parameters:
+        index (int): Device index or path, as passed to cv2.VideoCapture.
+        width (int): Requested frame width.
+        height (int): Requested frame height.
+        """
+        import cv2
+
+        self.cam = cv2.VideoCapture(index)
+        self.cam.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.cam.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        # Ask the driver to queue as little as possible, the grabber keeps the newest frame itself
+        self.cam.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.shape = (int(self.cam.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(self.cam.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+        self.finished = False
+
+    def read(self, out):
+        """
+        Capture the next frame into out.
+
+        Parameters:
+        out (np.ndarray): Preallocated uint8 array of `shape`.
+
+        Returns:
+        float: Monotonic capture time in seconds, or None if the capture failed.
+        """
+        ret, frame = self.cam.read(out)
+        if not ret:
+            return None
+        if frame is not out:
+            # The device switched resolution, keep the preallocated layout
+            out[...] = frame[:out.shape[0], :out.shape[1]]
+        return time.monotonic()
+
+    def close(self):
+        self.cam.release()
+
+
+class FileSource:
+    """
+    Recorded frames as a frame source: a video file read with OpenCV, or a .npy stack of frames
+    with shape (n, height, width, 3) that needs no OpenCV at all.
+    Frames are paced at `fps` so consumers see the same timing as from a camera.
+    """
+    def __init__(self, path, fps=30.0, loop=True):
+        """
+        Parameters:
+        path (str): Video file, or .npy file of frames.
+        fps (float): Playback rate, None to read as fast as possible.
+        loop (bool): Start over at the end instead of finishing.
+        """
+        self.fps = fps
+        self.loop = loop
+        self.finished = False
+        self.position = 0
+        self.next_time = None
+        if path.endswith('.npy'):
+            self.cam = None
+            self.frames = np.load(path, mmap_mode='r')
+            self.shape = self.frames.shape[1:]
+        else:
+            import cv2
+
+            self.cam = cv2.VideoCapture(path)
+            self.frames = None
+            self.shape = (int(self.cam.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(self.cam.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+
+    def read(self, out):
+        """
+        Read the next frame into out, waiting for its turn at `fps`.
+
+        Parameters:
+        out (np.ndarray): Preallocated uint8 array of `shape`.
+
+        Returns:
+        float: Monotonic time the frame was read, or None at the end of a file that does not loop.
+        """
+        if self.fps is not None:
+            now = time.monotonic()
+            if self.next_time is None:
+                self.next_time = now
+            elif self.next_time > now:
+                time.sleep(self.next_time - now)
+            self.next_time += 1.0 / self.fps
+
+        if self.frames is not None:
+            if self.position >= len(self.frames):
+                if not self.loop:
+                    self.finished = True
+                    return None
+                self.position = 0
+            out[...] = self.frames[self.position]
+            self.position += 1
+            return time.monotonic()
+
+        ret, frame = self.cam.read(out)
+        if not ret and self.loop:
+            import cv2
+
+            self.cam.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cam.read(out)
+        if not ret:
+            self.finished = True
+            return None
+        if frame is not out:
+            out[...] = frame
+        return time.monotonic()
+
+    def close(self):
+        if self.cam is not None:
+            self.cam.release()
+
+
+class SyntheticSource:
+    """
+    Generated frames as a frame source, for benchmarks and tests without a camera.
+    It models a V4L2 capture queue: a frame is captured every 1 / fps seconds into one of
+    `buffer_count` driver buffers, and once they are all full new frames are discarded until the
+    consumer dequeues one. A consumer reading synchronously and slower than fps therefore gets old
+    frames, as from a real camera. Every frame is a gradient shifted by its index, with the index
+    written into the first pixels so it can be recovered with `frame_index`.
+    """
+    def __init__(self, width=1280, height=720, fps=30.0, buffer_count=4):
+        """
+        Parameters:
+        width (int): Frame width.
+        height (int): Frame height.
+        fps (float): Capture rate of the simulated camera.
+        buffer_count (int): Number of driver buffers, 4 is the V4L2 default of OpenCV.
+        """
+        self.shape = (height, width, 3)
+        self.fps = fps
+        self.buffer_count = buffer_count
+        self.finished = False
+        self.queue = deque()
+        self.captured = 0
+        self.discarded = 0
+        self.next_time = time.monotonic()
+        self.pattern = np.tile(np.arange(width, dtype=np.uint8)[None, :, None], (height, 1, 3))
+
+    def _capture(self, now):
+        while self.next_time <= now:
+            if len(self.queue) < self.buffer_count:
+                self.queue.append((self.captured, self.next_time))
+            else:
+                self.discarded += 1
+            self.captured += 1
+            self.next_time += 1.0 / self.fps
+
+    def read(self, out):
+        """
+        Dequeue the oldest captured frame into out, waiting for the next capture if none is queued.
+
+        Parameters:
+        out (np.ndarray): Preallocated uint8 array of `shape`.
+
+        Returns:
+        float: Monotonic capture time of the frame in seconds.
+        """
+        self._capture(time.monotonic())
+        if not self.queue:
+            time.sleep(max(0.0, self.next_time - time.monotonic()))
+            self._capture(self.next_time)
+        index, timestamp = self.queue.popleft()
+        np.add(self.pattern, index & 0xFF, out=out)
+        out[0, :8, 0] = np.frombuffer(np.uint64(index).tobytes(), dtype=np.uint8)
+        return timestamp
+
+    @staticmethod
+    def frame_index(frame):
+        """
+        Returns:
+        int: Index of a frame produced by SyntheticSource.
+        """
+        return int(np.frombuffer(frame[0, :8, 0].tobytes(), dtype=np.uint64)[0])
+
+    def close(self):
+        pass
+
+
+class FrameGrabber:
+    """
+    Captures frames on a background thread and keeps only the newest one.
+    Three preallocated buffers rotate between the grabber and the consumer (triple buffering): the
+    grabber fills the back buffer and swaps it with the newest complete frame, and `latest` swaps the
+    newest frame to the front, where the consumer reads it without a copy. Neither side ever waits for
+    the other, so a slow consumer gets the newest frame instead of a queue of stale ones, and frames it
+    never got to are counted in `frames_dropped`. Meant for one consumer thread.
+    """
+    def __init__(self, source):
+        """
+        Parameters:
+        source: CameraSource, FileSource, SyntheticSource or any object with `shape`,
+            `finished`, read(out) returning the capture time or None, and close().
+            A source that captures more than one uint8 image, e.g. image and depth,
+            also provides allocate() returning one empty buffer set for read(out).
+        """
+        self.source = source
+        self.shape = tuple(source.shape)
+        if hasattr(source, 'allocate'):
+            self._buffers = [source.allocate() for _ in range(3)]
+        else:
+            self._buffers = [np.zeros(self.shape, dtype=np.uint8) for _ in range(3)]
+        # Index of the frame in every buffer and its capture time
+        self._indices = [-1, -1, -1]
+        self._timestamps = [None, None, None]
+        self._back, self._middle, self._front = 0, 1, 2
+        self._fresh = False
+
+        self.frames_captured = 0
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.read_failures = 0
+
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """
+        Start the grabber thread.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the grabber thread and close the source.
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.source.close()
+
+    @property
+    def running(self) -> bool:
+        """
+        True while the grabber thread is capturing. It turns False on stop() and when a source that
+        does not loop, e.g. a FileSource, runs out of frames.
+        """
+        return self._running
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        while self._running:
+            timestamp = self.source.read(self._buffers[self._back])
+            if timestamp is None:
+                self.read_failures += 1
+                if self.source.finished:
+                    break
+                time.sleep(0.001)
+                continue
+            with self._condition:
+                if self._fresh:
+                    self.frames_dropped += 1
+                self._indices[self._back] = self.frames_captured
+                self._timestamps[self._back] = timestamp
+                self._back, self._middle = self._middle, self._back
+                self._fresh = True
+                self.frames_captured += 1
+                self._condition.notify_all()
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+    def latest(self, wait=True, timeout=None):
+        """
+        Get the newest frame. The returned array is reused: it stays valid until the next call.
+
+        Parameters:
+        wait (bool): If no frame newer than the last one returned has arrived yet, wait for one.
+            False returns the last frame again, recognisable by its unchanged index.
+        timeout (float): Maximum seconds to wait, None to wait until a frame arrives or the grabber stops.
+
+        Returns:
+        tuple: Tuple of the frame, its index and its monotonic capture time.
+        The frame is None if nothing has been captured yet.
+        """
+        with self._condition:
+            if not self._fresh and wait:
+                self._condition.wait_for(lambda: self._fresh or not self._running, timeout)
+            if self._fresh:
+                self._middle, self._front = self._front, self._middle
+                self._fresh = False
+                self.frames_read += 1
+            index = self._indices[self._front]
+            timestamp = self._timestamps[self._front]
+        if index < 0:
+            return None, index, None
+        return self._buffers[self._front], index, timestamp
+
+    def age(self):
+        """
+        Returns:
+        float: Seconds since the newest captured frame was taken, None if nothing has been captured yet.
+        """
+        with self._condition:
+            newest = self._middle if self._fresh else self._front
+            timestamp = self._timestamps[newest]
+        return None if timestamp is None else time.monotonic() - timestamp
+
+# Run from the Ben folder: python -m modules.Frame_Grabber
+if __name__ == "__main__":
+    with FrameGrabber(SyntheticSource()) as grabber:
+        for _ in range(30):
+            frame, index, timestamp = grabber.latest()
+            print(f'Frame {index} ({SyntheticSource.frame_index(frame)}), {(time.monotonic() - timestamp) * 1e3:.1f} ms old')
+            # A consumer slower than the camera, it still always gets a fresh frame
+            time.sleep(0.1)
+        print(f'{grabber.frames_captured} captured, {grabber.frames_read} read, {grabber.frames_dropped} dropped')
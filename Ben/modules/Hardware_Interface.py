@@ -1,10 +1,28 @@
 import serial
 import time
 
+import numpy as np
+
+from modules.Message_Schema import NUM_SENSORS, parse_sensor_line, thruster_line
+from modules.Serial_Protocol import FrameDecoder, KIND_SENSOR, SENSOR_DTYPE, encode_thruster_frame
+
 class HI:
-    def __init__(self):
+    def __init__(self, port='/dev/ttyACM0', baudrate=115200, timeout=1, protocol='ascii'):
+        """
+            port can be a device path, e.g. the pseudo-terminal of modules.Serial_Emulator, or an already open serial-like object
+            protocol is 'ascii' for '1500,...,1500R' commands and text sensor lines, or 'binary' for the CRC framed protocol of modules.Serial_Protocol
+        """
+        if protocol not in ('ascii', 'binary'):
+            raise ValueError("protocol must be 'ascii' or 'binary'")
+        self.protocol = protocol
+        self.sequence = 0
+        self.decoder = FrameDecoder()
+        self.data = None
         try:
-            self.ser = serial.Serial('/dev/ttyACM0', 115200, timeout=1)
+            if isinstance(port, str):
+                self.ser = serial.Serial(port, baudrate, timeout=timeout)
+            else:
+                self.ser = port
             self.ser.flush()
         except serial.SerialException as e:
             print("Serial exception occurred: {}".format(e))
@@ -26,6 +44,40 @@ class HI:
             print("Error receiving data: {}".format(e))
             return None
 
+    def send_thrusters(self, pwm):
+        """
+            Send one thruster command in the configured protocol
+        """
+        if self.protocol == 'binary':
+            frame = encode_thruster_frame(pwm, self.sequence)
+            self.sequence = (self.sequence + 1) & 0xFFFF
+        else:
+            frame = thruster_line(pwm).encode('utf-8')
+        try:
+            self.ser.write(frame)
+        except serial.SerialException as e:
+            print("Error sending data: {}".format(e))
+
+    def recv_sensors(self):
+        """
+            Read the next sensor reading in the configured protocol, as an array of NUM_SENSORS floats or None on timeout
+        """
+        if self.protocol == 'ascii':
+            line = self.recv()
+            return parse_sensor_line(line) if line else None
+        deadline = time.monotonic() + (self.ser.timeout or 0)
+        try:
+            while True:
+                for kind, sequence, payload in self.decoder.feed(self.ser.read(max(1, self.ser.in_waiting))):
+                    if kind == KIND_SENSOR and len(payload) == NUM_SENSORS * SENSOR_DTYPE.itemsize:
+                        self.data = np.frombuffer(payload, dtype=SENSOR_DTYPE).astype(np.float32)
+                        return self.data
+                if time.monotonic() >= deadline:
+                    return None
+        except serial.SerialException as e:
+            print("Error receiving data: {}".format(e))
+            return None
+
     def close(self):
         try:
             self.ser.close()
@@ -0,0 +1,197 @@
+import os
+import time
+import warnings
+
+import numpy as np
+
+# Timing histograms use power-of-two microsecond bins: bin 0 counts values below 1 us,
+# bin k counts [2^(k-1), 2^k) us, and the last bin everything from about one second up
+HISTOGRAM_BINS = 22
+HISTOGRAM_EDGES_US = np.concatenate(([0.0], 2.0 ** np.arange(HISTOGRAM_BINS - 1)))
+
+
+class LoopScheduler:
+    """
+    Runs a control loop at a fixed rate against absolute deadlines.
+    Every deadline is start + n * period, so sleep overshoot and jitter never accumulate into drift.
+    The loop sleeps until shortly before each deadline and spins the rest of the way, which is as
+    close to clock_nanosleep(TIMER_ABSTIME) as Python gets. Every tick records how late it woke up
+    and how long its work took, in histograms and a ring buffer of recent ticks, and a tick whose
+    work runs past the next deadline counts as a deadline miss.
+    """
+    def __init__(self, rate, spin=0.0002, cpus=None, priority=None, history_size=4096):
+        """
+        Parameters:
+        rate (float): Loop rate in Hz, e.g. 100.
+        spin (float): Seconds before each deadline to stop sleeping and spin, trading CPU for wake-up precision.
+        cpus (list): CPU ids to pin the calling thread to, e.g. [3]. None leaves the affinity alone.
+        priority (int): SCHED_FIFO priority (1-99) for the calling thread, None keeps the normal scheduler.
+                        Needs root or CAP_SYS_NICE, the loop runs without it otherwise.
+        history_size (int): Number of recent ticks kept in the history ring buffer.
+        """
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.spin = spin
+        self.cpus = cpus
+        self.priority = priority
+        self.realtime = False
+
+        # Wake-up lateness and work time of recent ticks in seconds, one row per tick
+        self.history = np.zeros((history_size, 2))
+        self.reset_stats()
+        self.next_deadline = None
+
+    def reset_stats(self):
+        """
+        Clear the counters, histograms and history.
+        """
+        self.ticks = 0
+        self.misses = 0
+        self.skipped = 0
+        self.lateness_histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self.work_histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self.lateness_max = 0.0
+        self.lateness_total = 0.0
+        self.work_max = 0.0
+        self.work_total = 0.0
+        self.history[:] = 0.0
+
+    def configure_thread(self):
+        """
+        Apply the CPU affinity and SCHED_FIFO priority to the calling thread.
+
+        Returns:
+        bool: True if the thread now runs with the requested real-time priority.
+        """
+        if self.cpus is not None:
+            try:
+                os.sched_setaffinity(0, self.cpus)
+            except (OSError, AttributeError) as error:
+                warnings.warn(f'Could not pin the control loop to CPUs {self.cpus}: {error}')
+        if self.priority is not None:
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(self.priority))
+                self.realtime = True
+            except (OSError, AttributeError) as error:
+                warnings.warn(f'Could not set SCHED_FIFO priority {self.priority}, running with the normal scheduler: {error}')
+        return self.realtime
+
+    def start(self):
+        """
+        Start the first tick now. Call from the thread that runs the loop.
+        """
+        self.configure_thread()
+        self.tick_start = time.perf_counter()
+        self.next_deadline = self.tick_start + self.period
+
+    def wait(self):
+        """
+        End the current tick: record its work time and sleep until the next deadline.
+        If the work overran by whole periods, those ticks are skipped instead of run back to back,
+        so the loop keeps its phase.
+
+        Returns:
+        float: How late the loop woke up for the new tick, in seconds.
+        """
+        now = time.perf_counter()
+        work = now - self.tick_start
+        if now > self.next_deadline:
+            self.misses += 1
+            overrun = int((now - self.next_deadline) / self.period)
+            self.skipped += overrun
+            self.next_deadline += overrun * self.period
+
+        remaining = self.next_deadline - now - self.spin
+        if remaining > 0:
+            time.sleep(remaining)
+        while True:
+            now = time.perf_counter()
+            if now >= self.next_deadline:
+                break
+        lateness = now - self.next_deadline
+
+        self._record(lateness, work)
+        self.tick_start = now
+        self.next_deadline += self.period
+        return lateness
+
+    def _record(self, lateness, work):
+        self.history[self.ticks % len(self.history)] = lateness, work
+        self.ticks += 1
+        self.lateness_histogram[min(int(lateness * 1e6).bit_length(), HISTOGRAM_BINS - 1)] += 1
+        self.work_histogram[min(int(work * 1e6).bit_length(), HISTOGRAM_BINS - 1)] += 1
+        self.lateness_total += lateness
+        self.work_total += work
+        if lateness > self.lateness_max:
+            self.lateness_max = lateness
+        if work > self.work_max:
+            self.work_max = work
+
+    def run(self, step, num_ticks=None):
+        """
+        Call step once per period until it returns False or num_ticks ticks have run.
+
+        Parameters:
+        step (callable): Called with the tick index, does the work of one tick.
+        num_ticks (int): Number of ticks to run, None to run until step returns False.
+        """
+        self.start()
+        tick = 0
+        while num_ticks is None or tick < num_ticks:
+            if step(tick) is False:
+                break
+            self.wait()
+            tick += 1
+
+    def recent(self):
+        """
+        Lateness and work time of the ticks in the history ring buffer.
+
+        Returns:
+        np.ndarray: Oldest first, shape (n, 2).
+        """
+        size = len(self.history)
+        if self.ticks <= size:
+            return self.history[:self.ticks].copy()
+        start = self.ticks % size
+        return np.concatenate((self.history[start:], self.history[:start]))
+
+    def stats(self):
+        """
+        Tick and deadline-miss counters, lateness and work time in seconds, and both histograms.
+        The histogram bins are bounded by HISTOGRAM_EDGES_US.
+
+        Returns:
+        dict: The statistics.
+        """
+        ticks = max(self.ticks, 1)
+        return {'rate': self.rate,
+                'ticks': self.ticks,
+                'misses': self.misses,
+                'skipped': self.skipped,
+                'miss_rate': self.misses / ticks,
+                'lateness_mean': self.lateness_total / ticks,
+                'lateness_max': self.lateness_max,
+                'work_mean': self.work_total / ticks,
+                'work_max': self.work_max,
+                'lateness_histogram': self.lateness_histogram.copy(),
+                'work_histogram': self.work_histogram.copy()}
+
+    def summary(self):
+        """
+        One line with the counters and timing, for the log.
+        """
+        stats = self.stats()
+        return (f"{stats['ticks']} ticks at {self.rate:g} Hz, {stats['misses']} deadline misses, {stats['skipped']} skipped | "
+                f"lateness mean {stats['lateness_mean'] * 1e6:.0f} us max {stats['lateness_max'] * 1e6:.0f} us | "
+                f"work mean {stats['work_mean'] * 1e6:.0f} us max {stats['work_max'] * 1e6:.0f} us")
+
+# Run from the Ben folder: python -m modules.Loop_Scheduler
+if __name__ == "__main__":
+    scheduler = LoopScheduler(100)
+    scheduler.run(lambda tick: None, num_ticks=500)
+    print(scheduler.summary())
+    print('Lateness histogram (us):')
+    for low, count in zip(HISTOGRAM_EDGES_US, scheduler.lateness_histogram):
+        if count:
+            print(f'  >= {low:>9.0f}: {count}')
@@ -0,0 +1,89 @@
+import time
+
+import numpy as np
+
+# Sizes of the records, matching Controller_Module, MP and the sensor line read by HI
+NUM_AXES = 5
+NUM_THRUSTERS = 6
+NUM_SENSORS = 4
+
+# Every record is a packed NumPy structured dtype. The leading kind byte lets a receiver detect a
+# stream that carries the wrong record type, the sequence number and timestamp are set by the encoder.
+SCHEMAS = {
+    'controller': (1, 'axes', np.dtype([('kind', 'u1'), ('sequence', '<u4'), ('timestamp', '<f8'), ('axes', '<f4', (NUM_AXES,))])),
+    'thruster': (2, 'pwm', np.dtype([('kind', 'u1'), ('sequence', '<u4'), ('timestamp', '<f8'), ('pwm', '<u2', (NUM_THRUSTERS,))])),
+    'sensor': (3, 'values', np.dtype([('kind', 'u1'), ('sequence', '<u4'), ('timestamp', '<f8'), ('values', '<f4', (NUM_SENSORS,))])),
+}
+
+
+class MessageCodec:
+    """
+    Encoder and decoder for one fixed-width record type.
+    Encoding writes into a preallocated record and decoding is a np.frombuffer view, so nothing
+    is formatted or parsed as text on either side.
+    """
+    def __init__(self, name : str):
+        """
+        @param name: Record type, one of the keys of SCHEMAS.
+        """
+        self.name = name
+        self.kind, self.field, self.dtype = SCHEMAS[name]
+        self.size = self.dtype.itemsize
+        self.sequence = 0
+
+        self._record = np.zeros(1, dtype=self.dtype)
+        self._record['kind'] = self.kind
+        self._bytes = self._record.view(np.uint8)
+        self.recv_buffer = bytearray(self.size)
+
+    def encode(self, values : np.ndarray, timestamp : float = None) -> np.ndarray:
+        """
+        Fill the send record with new values.
+
+        @param values: Values of the record field, e.g. the controller axes.
+        @param timestamp: Time the values were taken. Defaults to now.
+        @return: The record as a uint8 array, reused by the next call.
+        """
+        self._record['sequence'] = self.sequence
+        self._record['timestamp'] = time.time() if timestamp is None else timestamp
+        self._record[self.field][0] = values
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        return self._bytes
+
+    def decode(self, buffer) -> np.ndarray:
+        """
+        View one or more records in a buffer without copying.
+
+        @param buffer: Bytes holding a whole number of records.
+        @return: Structured array of the records.
+        """
+        records = np.frombuffer(buffer, dtype=self.dtype)
+        if (records['kind'] != self.kind).any():
+            raise ValueError(f"Buffer does not hold {self.name} records")
+        return records
+
+
+def thruster_line(pwm : np.ndarray) -> str:
+    """
+    Format thruster PWM values as the ASCII command read by the ESC firmware, e.g. '1500,1500,1500,1500,1500,1500R'.
+
+    @param pwm: Integer PWM values, one per thruster.
+    @return: The command string.
+    """
+    return ','.join(map(str, np.asarray(pwm, dtype=np.int64).tolist())) + 'R'
+
+
+def parse_sensor_line(line : str) -> np.ndarray:
+    """
+    Parse one sensor line read from the serial port, e.g. '12,340,56,7' or '[12,340,56,7]'.
+
+    @param line: The line without its newline.
+    @return: Sensor values, NaN where a value is missing or malformed.
+    """
+    values = np.full(NUM_SENSORS, np.nan, dtype=np.float32)
+    for i, value in enumerate(line.strip('[] ').split(',')[:NUM_SENSORS]):
+        try:
+            values[i] = float(value)
+        except ValueError:
+            pass
+    return values
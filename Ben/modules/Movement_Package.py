@@ -1,5 +1,204 @@
 import numpy as np
 
+class PWMMapper:
+    """
+    Maps normalized thruster commands to integer PWM values.
+    Scale and offset are precomputed per thruster, and each call is a single vectorized
+    clip, deadband, scale and round written into a preallocated uint16 buffer.
+    """
+    def __init__(self, num_thrusters : int, in_min = -1.0, in_max = 1.0, out_min = 1000, out_max = 2000, deadband = 0.0):
+        """
+        Initialize the mapper. Every range and deadband may be a scalar or one value per thruster.
+
+        @param num_thrusters: Number of thrusters.
+        @param in_min: Lowest normalized command, mapped to out_min.
+        @param in_max: Highest normalized command, mapped to out_max.
+        @param out_min: PWM value for in_min.
+        @param out_max: PWM value for in_max.
+        @param deadband: Commands with an absolute value below this are treated as zero.
+        """
+        shape = (num_thrusters,)
+        self.in_min = np.broadcast_to(np.asarray(in_min, dtype=float), shape).copy()
+        self.in_max = np.broadcast_to(np.asarray(in_max, dtype=float), shape).copy()
+        out_min = np.broadcast_to(np.asarray(out_min, dtype=float), shape)
+        out_max = np.broadcast_to(np.asarray(out_max, dtype=float), shape)
+        self.deadband = np.broadcast_to(np.asarray(deadband, dtype=float), shape).copy()
+        self.has_deadband = bool(np.any(self.deadband > 0))
+
+        self.scale = (out_max - out_min) / (self.in_max - self.in_min)
+        self.offset = out_min - self.in_min * self.scale
+
+        self.buffer = np.zeros(shape, dtype=np.uint16)
+        self._scratch = np.zeros(shape)
+
+    def __call__(self, data : np.ndarray, out : np.ndarray = None) -> np.ndarray:
+        """
+        Map commands to PWM values.
+
+        @param data: Normalized commands, shape (num_thrusters,) or (..., num_thrusters).
+        @param out: Optional uint16 array to write into. Single commands default to the internal
+                    buffer, which is overwritten by the next call.
+        @return: The PWM values as uint16.
+        """
+        data = np.asarray(data, dtype=float)
+        if data.shape == self.buffer.shape:
+            value = np.minimum(data, self.in_max, out=self._scratch)
+            if out is None:
+                out = self.buffer
+        else:
+            value = np.minimum(data, self.in_max)
+            if out is None:
+                out = np.empty(data.shape, dtype=np.uint16)
+        np.maximum(value, self.in_min, out=value)
+
+        if self.has_deadband:
+            value *= np.abs(value) >= self.deadband
+        value *= self.scale
+        value += self.offset
+        np.rint(value, out=value)
+        np.copyto(out, value, casting='unsafe')
+        return out
+
+class ThrustAllocator:
+    """
+    Saturation-aware thrust allocation using a redistributed pseudo-inverse.
+    The pseudo-inverse of the thruster effect matrix is computed once. When some thrusters
+    saturate they are pinned at their limit and the remaining wrench is re-solved over the
+    free thrusters, so the commanded wrench is kept instead of being distorted by clipping.
+    Pseudo-inverses of each saturation pattern are cached and reused on later ticks, and the
+    number of redistribution passes is capped so every tick has a fixed worst-case cost.
+
+    When the wrench cannot be produced at all, axis priorities decide what gives way: the groups
+    are allocated in order, each on top of what the groups before it achieved, and a group that
+    does not fit is scaled down as a whole, leaving nothing for the groups after it on the
+    thrusters it saturated. Without priorities the shortfall is spread over every axis.
+    """
+    def __init__(self, effect_matrix : np.ndarray, u_min = -1.0, u_max = 1.0, max_iterations : int = None, normalize : bool = True,
+                 priorities : list = None):
+        """
+        Initialize the allocator.
+
+        @param effect_matrix: Wrench produced by a unit command of each thruster, shape (num_dof, num_thrusters).
+        @param u_min: Lowest thruster command, scalar or one per thruster.
+        @param u_max: Highest thruster command, scalar or one per thruster.
+        @param max_iterations: Cap on redistribution passes. Defaults to the number of thrusters.
+        @param normalize: Scale each requested axis by its maximum achievable wrench, so that a
+                          normalized request of 1.0 asks for the full authority of that axis.
+        @param priorities: Groups of axis indices, highest priority first, e.g. [[3, 4, 5], [2], [0, 1]]
+                           to hold attitude before heave before surge and sway. Axes left out form a
+                           last group. None spreads any shortfall over every axis.
+        """
+        self.effect_matrix = np.asarray(effect_matrix, dtype=float)
+        num_thrusters = self.effect_matrix.shape[1]
+        self.u_min = np.broadcast_to(np.asarray(u_min, dtype=float), (num_thrusters,)).copy()
+        self.u_max = np.broadcast_to(np.asarray(u_max, dtype=float), (num_thrusters,)).copy()
+        self.max_iterations = num_thrusters if max_iterations is None else max_iterations
+
+        if normalize:
+            self.authority = (np.abs(self.effect_matrix) * np.maximum(np.abs(self.u_min), np.abs(self.u_max))).sum(axis=1)
+        else:
+            self.authority = np.ones(self.effect_matrix.shape[0])
+
+        self.priorities = None
+        if priorities is not None:
+            grouped = [axis for group in priorities for axis in group]
+            rest = [axis for axis in range(self.effect_matrix.shape[0]) if axis not in grouped]
+            self.priorities = [np.asarray(group, dtype=int) for group in list(priorities) + ([rest] if rest else [])]
+
+        self.pinv = np.linalg.pinv(self.effect_matrix)
+        self._pinv_cache = {}
+        self.iterations = 0
+
+    def _free_pinv(self, fixed : np.ndarray) -> np.ndarray:
+        """
+        Return the pseudo-inverse restricted to the free thrusters, zero rows for the fixed ones.
+        """
+        key = fixed.tobytes()
+        free_pinv = self._pinv_cache.get(key)
+        if free_pinv is None:
+            free_pinv = np.zeros_like(self.pinv)
+            free_pinv[~fixed] = np.linalg.pinv(self.effect_matrix[:, ~fixed])
+            self._pinv_cache[key] = free_pinv
+        return free_pinv
+
+    def _redistribute(self, wrench : np.ndarray, u : np.ndarray) -> np.ndarray:
+        """
+        Pin saturated thrusters and re-solve the remaining wrench over the free ones.
+        """
+        fixed = np.zeros(len(u), dtype=bool)
+        for iteration in range(self.max_iterations):
+            self.iterations = iteration + 1
+            over = (u > self.u_max) & ~fixed
+            under = (u < self.u_min) & ~fixed
+            if not (over.any() or under.any()):
+                break
+            u[over] = self.u_max[over]
+            u[under] = self.u_min[under]
+            fixed |= over | under
+            if fixed.all():
+                break
+            residual = wrench - self.effect_matrix @ np.where(fixed, u, 0.0)
+            u = np.where(fixed, u, self._free_pinv(fixed) @ residual)
+        return np.clip(u, self.u_min, self.u_max, out=u)
+
+    def _achieves(self, u : np.ndarray, wrench : np.ndarray) -> bool:
+        # Cheaper than np.allclose on these small arrays
+        return float(np.abs(self.effect_matrix @ u - wrench).max()) <= 1e-6
+
+    def _prioritize(self, wrench : np.ndarray) -> np.ndarray:
+        """
+        Allocate the priority groups in turn. Every group is first re-solved with redistribution together
+        with what the groups before it achieved. If that cannot be produced, the group's wrench is added
+        along the pseudo-inverse, scaled down until the first thruster reaches its limit.
+        """
+        u = np.zeros(self.effect_matrix.shape[1])
+        achieved = np.zeros_like(wrench)
+        request = np.zeros_like(wrench)
+        for group in self.priorities:
+            request.fill(0.0)
+            request[group] = wrench[group]
+            target = achieved + request
+            candidate = self._redistribute(target, self.pinv @ target)
+            if self._achieves(candidate, target):
+                u, achieved = candidate, target
+                continue
+            step = self.pinv @ request
+            with np.errstate(divide='ignore', invalid='ignore'):
+                room = np.where(step > 0, (self.u_max - u) / step, np.where(step < 0, (self.u_min - u) / step, np.inf))
+            scale = min(1.0, max(0.0, float(room.min())))
+            u = u + scale * step
+            achieved = achieved + scale * request
+        return np.clip(u, self.u_min, self.u_max, out=u)
+
+    def _saturate(self, wrench : np.ndarray, u : np.ndarray) -> np.ndarray:
+        """
+        Allocate a wrench whose pseudo-inverse solution saturates.
+        """
+        u = self._redistribute(wrench, u)
+        if self.priorities is None or self._achieves(u, wrench):
+            return u
+        return self._prioritize(wrench)
+
+    def allocate(self, wrench : np.ndarray) -> np.ndarray:
+        """
+        Compute thruster commands for a requested wrench.
+
+        @param wrench: Normalized wrench, shape (num_dof,) or (batch, num_dof).
+        @return: Thruster commands within [u_min, u_max], shape (num_thrusters,) or (batch, num_thrusters).
+        """
+        wrench = np.asarray(wrench, dtype=float) * self.authority
+        u = wrench @ self.pinv.T
+        self.iterations = 0
+
+        saturated = ((u > self.u_max) | (u < self.u_min))
+        if u.ndim == 1:
+            return self._saturate(wrench, u) if saturated.any() else u
+
+        # Only the rows that saturate need the per-row redistribution passes
+        for row in np.flatnonzero(saturated.any(axis=1)):
+            u[row] = self._saturate(wrench[row], u[row])
+        return u
+
 class MP:
     def __init__(self):
         # Define Constants for Easy Modification
@@ -17,6 +216,13 @@ class MP:
         # Initialize the thruster matrix
         self.thruster_matrix = self.create_thruster_matrix()
 
+        # Pseudo-inverse of the effect matrix, computed once for update. When the request cannot
+        # be met, roll and yaw are held first, then heave, then surge and sway
+        self.thrust_allocator = ThrustAllocator(self.thruster_matrix.T, priorities=[[3, 4], [2], [0, 1]])
+
+        # PWM range of the ESCs, precomputed once for map_data
+        self.pwm_mapper = PWMMapper(self.num_thrusters, out_min=1100, out_max=1900)
+
     def create_thruster_matrix(self):
         """
         Create a thruster mixing matrix to map thruster forces to vehicle movements.
@@ -44,28 +250,23 @@ class MP:
         """
         Update the thruster outputs based on desired vehicle movements.
         """
-        data = np.array(data).reshape(-1, 1)  # Convert to column vector
+        data = np.array(data, dtype=float).ravel()
         max_index = 0
         last_max = 0.0
         for i in range(len(data)):
             if abs(data[i]) > last_max:
                 max_index = i
-        self.thruster_data = np.dot(self.thruster_matrix, data)  # Matrix multiplication
+        # Saturation-aware allocation instead of the raw matrix product
+        self.thruster_data = self.thrust_allocator.allocate(data)
         return_data = self.thruster_data[max_index]
         return return_data
     
     def map_data(self):
         """
-        Map the thruster outputs based on desired vehicle movements.
+        Map the thruster outputs to integer PWM values for the ESCs.
+        The returned buffer is reused and overwritten by the next call.
         """
-        in_min = -1
-        in_max = 1
-        out_min = 1100
-        out_max = 1900
-        out_data = np.zeros(len(self.thruster_data))
-        for x in range(len(self.thruster_data)):
-            out_data[x] = (x - in_min) * (out_max - out_min) // (in_max - in_min) + out_min
-        return out_data
+        return self.pwm_mapper(self.thruster_data.ravel())
     
     def print_out(self):
         """
@@ -1,23 +1,117 @@
 #!/usr/bin/env python3
 
-from io import BytesIO
 import logging
 import socket
-from typing import Tuple, Union, Any
+import struct
+import time
+from typing import Tuple, Union, Any, List
 import numpy as np
 
+# Frame header: magic, version, dtype code, ndim, shape (up to 4 dims), payload length, sequence number, timestamp
+FRAME_MAGIC = b'AUVF'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('<4sBBBx4IQId')
+FRAME_MAX_DIMS = 4
+
+# dtype codes carried in the header, the index into this tuple is sent on the wire
+FRAME_DTYPES = tuple(np.dtype(code) for code in ('u1', 'i1', '<u2', '<i2', '<u4', '<i4', '<u8', '<i8', '<f4', '<f8', '?'))
+
+class FrameReader:
+    """
+    FrameReader class documentation.
+    Parses frames from a persistent receive buffer, keeping bytes past the end of a frame for the next call.
+    Frames are returned as views that stay valid until the next call to fill.
+    """
+    def __init__(self, capacity: int = 1 << 20):
+        """
+        __init__ method documentation.
+        """
+        self.buffer = bytearray(capacity)
+        self.start = 0
+        self.end = 0
+        self.last_sequence = None
+        self.last_timestamp = None
+
+    def fill(self, sock: socket.socket, bufsize: int, flags: int = 0) -> int:
+        """
+        fill method documentation.
+        Returns the number of bytes received, 0 if the connection was closed.
+        """
+        pending = self.end - self.start
+        needed = max(self.__pending_frame_size(), FRAME_HEADER.size, pending + 1)
+        if needed > len(self.buffer):
+            # A new buffer instead of resizing, frames returned earlier may still reference the old one
+            buffer = bytearray(max(needed, 2 * len(self.buffer)))
+            buffer[:pending] = self.buffer[self.start:self.end]
+            self.buffer = buffer
+            self.start, self.end = 0, pending
+        elif self.start > 0 and (pending == 0 or self.start + needed > len(self.buffer)):
+            # Only the partial frame left over at the end is moved to the front
+            self.buffer[:pending] = self.buffer[self.start:self.end]
+            self.start, self.end = 0, pending
+
+        view = memoryview(self.buffer)[self.end:]
+        count = sock.recv_into(view, min(bufsize, len(view)), flags)
+        self.end += count
+        return count
+
+    def __pending_frame_size(self) -> int:
+        """
+        __pending_frame_size method documentation.
+        """
+        if self.end - self.start < FRAME_HEADER.size:
+            return 0
+        length = FRAME_HEADER.unpack_from(self.buffer, self.start)[FRAME_MAX_DIMS + 4]
+        return FRAME_HEADER.size + length
+
+    def frame_ready(self) -> bool:
+        """
+        frame_ready method documentation.
+        """
+        size = self.__pending_frame_size()
+        return size > 0 and self.end - self.start >= size
+
+    def next_frame(self) -> Union[np.ndarray, None]:
+        """
+        next_frame method documentation.
+        """
+        if not self.frame_ready():
+            return None
+        size = self.__pending_frame_size()
+
+        magic, version, dtype_code, ndim, *rest = FRAME_HEADER.unpack_from(self.buffer, self.start)
+        shape, (length, sequence, timestamp) = rest[:FRAME_MAX_DIMS], rest[FRAME_MAX_DIMS:]
+        if magic != FRAME_MAGIC or version != FRAME_VERSION:
+            raise ValueError(f"Invalid frame header: {bytes(self.buffer[self.start:self.start + FRAME_HEADER.size])!r}")
+
+        dtype = FRAME_DTYPES[dtype_code]
+        frame = np.frombuffer(self.buffer, dtype=dtype, count=length // dtype.itemsize, offset=self.start + FRAME_HEADER.size)
+        self.start += size
+        self.last_sequence = sequence
+        self.last_timestamp = timestamp
+        return frame.reshape(tuple(shape[:ndim]))
+
 class NP(socket.socket):
     """
     NP class documentation.
+    Frames are sent as a fixed binary header followed by the raw array buffer.
     """
+    # Per-connection state, created on first use
+    _send_sequence = 0
+    _reader = None
 
     def sendall(self, frame: np.ndarray) -> None:
         """
         sendall method documentation.
+        The header and the array buffer are handed to sendmsg together, so the frame is never copied.
         """
-        out = self.__pack_frame(frame)
-        super_socket = super()
-        super_socket.sendall(out)
+        # np.ascontiguousarray would promote 0-d arrays to 1-d, so only copy when the layout requires it
+        frame = np.asarray(frame)
+        if not frame.flags.c_contiguous:
+            frame = frame.copy()
+        header = self.__pack_header(frame, self._send_sequence)
+        self._send_sequence = (self._send_sequence + 1) & 0xFFFFFFFF
+        self.__sendmsg_all([header, memoryview(frame.reshape(-1).view(np.uint8))])
         logging.debug("frame sent")
 
     def send_string_as_bytes(self, string: str) -> None:
@@ -28,33 +122,87 @@ class NP(socket.socket):
         super().sendall(byte_array)
         logging.debug("String '{}' sent as bytes".format(string))
 
-    def recv(self, bufsize: int = 1024) -> np.ndarray:
+    @property
+    def reader(self) -> FrameReader:
+        """
+        reader property documentation.
+        """
+        if self._reader is None:
+            self._reader = FrameReader()
+        return self._reader
+
+    @property
+    def last_sequence(self) -> Union[int, None]:
+        """
+        last_sequence property documentation.
+        """
+        return self.reader.last_sequence
+
+    @property
+    def last_timestamp(self) -> Union[float, None]:
+        """
+        last_timestamp property documentation.
+        """
+        return self.reader.last_timestamp
+
+    def recv(self, bufsize: int = 65536) -> np.ndarray:
         """
         recv method documentation.
+        Returns a view of the persistent receive buffer that stays valid until the next recv or recv_many, copy it to keep it.
         """
-        length = None
-        frame_buffer = bytearray()
-        while True:
-            data = super().recv(bufsize)
-            if len(data) == 0:
+        reader = self.reader
+        while not reader.frame_ready():
+            if reader.fill(self, bufsize) == 0:
                 return np.array([])
-            frame_buffer += data
+        logging.debug("frame received")
+        return reader.next_frame()
 
-            while True:
-                if length is None:
-                    if b":" not in frame_buffer:
-                        break
-                    length_str, _, frame_buffer = frame_buffer.partition(b":")
-                    length = int(length_str)
+    def recv_many(self, bufsize: int = 1 << 20) -> List[np.ndarray]:
+        """
+        recv_many method documentation.
+        Blocks until one frame is complete, then drains the socket without blocking and returns every complete frame.
+        """
+        reader = self.reader
+        while not reader.frame_ready():
+            if reader.fill(self, bufsize) == 0:
+                return []
 
-                if len(frame_buffer) < length:
+        # Drain into the free space at the end of the buffer only, so nothing is moved or grown
+        while reader.end < len(reader.buffer):
+            try:
+                if reader.fill(self, bufsize, socket.MSG_DONTWAIT) == 0:
                     break
+            except (BlockingIOError, InterruptedError):
+                break
 
-                frame_data = frame_buffer[:length]
-                frame_buffer = frame_buffer[length:]
-                frame = np.load(BytesIO(frame_data), allow_pickle=True)["frame"]
-                logging.debug("frame received")
-                return frame
+        frames = []
+        while reader.frame_ready():
+            frames.append(reader.next_frame())
+        logging.debug("{} frames received".format(len(frames)))
+        return frames
+
+    def send_record(self, record: np.ndarray) -> None:
+        """
+        send_record method documentation.
+        Sends the raw bytes of a fixed-width record from MessageCodec.encode, without a frame header.
+        """
+        super().sendall(record)
+        logging.debug("record sent")
+
+    def recv_record(self, codec) -> Union[np.ndarray, None]:
+        """
+        recv_record method documentation.
+        Reads exactly one record into the receive buffer of the codec and returns it as a view, or None if the connection was closed.
+        """
+        view = memoryview(codec.recv_buffer)
+        received = 0
+        while received < codec.size:
+            count = super().recv_into(view[received:])
+            if count == 0:
+                return None
+            received += count
+        logging.debug("record received")
+        return codec.decode(codec.recv_buffer)[0]
 
     def recv_string_as_bytes(self, bufsize: int = 1024) -> str:
         """
@@ -79,20 +227,30 @@ class NP(socket.socket):
             sock.setblocking(True)
         return sock, addr
 
-    @staticmethod
-    def __pack_frame(frame: np.ndarray) -> bytearray:
+    def __sendmsg_all(self, buffers: list) -> None:
         """
-        __pack_frame static method documentation.
+        __sendmsg_all method documentation.
         """
-        f = BytesIO()
-        np.savez(f, frame=frame)
-
-        packet_size = len(f.getvalue())
-        header = "{}:".format(packet_size)
-        header_bytes = bytes(header.encode())
+        buffers = [memoryview(buffer) for buffer in buffers]
+        while buffers:
+            sent = self.sendmsg(buffers)
+            while buffers and sent >= len(buffers[0]):
+                sent -= len(buffers[0])
+                buffers.pop(0)
+            if buffers:
+                buffers[0] = buffers[0][sent:]
 
-        out = bytearray(header_bytes)
-        f.seek(0)
-        out += f.read()
+    @staticmethod
+    def __pack_header(frame: np.ndarray, sequence: int) -> bytes:
+        """
+        __pack_header static method documentation.
+        """
+        dtype = frame.dtype
+        if dtype not in FRAME_DTYPES:
+            raise ValueError(f"Unsupported frame dtype: {frame.dtype}")
+        if frame.ndim > FRAME_MAX_DIMS:
+            raise ValueError(f"Frames may have at most {FRAME_MAX_DIMS} dimensions, got {frame.ndim}")
 
-        return out
+        shape = tuple(frame.shape) + (0,) * (FRAME_MAX_DIMS - frame.ndim)
+        return FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, FRAME_DTYPES.index(dtype), frame.ndim,
+                                 *shape, frame.nbytes, sequence, time.time())
@@ -0,0 +1,186 @@
+import argparse
+import os
+import pty
+import select
+import threading
+import time
+import tty
+from collections import deque
+
+import numpy as np
+
+from modules.Serial_Protocol import FRAME_OVERHEAD, FrameDecoder, KIND_THRUSTER, THRUSTER_DTYPE, encode_sensor_frame
+
+
+class SerialEmulator:
+    """
+    ## SerialEmulator Class
+    Stand-in for the thruster/sensor microcontroller on a pseudo-terminal.
+    It reads PWM commands such as '1500,1500,1500,1500,1500,1500R' and answers every command with
+    one sensor line such as '12,340,56,7\\n'. Processing latency and the time the bytes take on
+    the wire at the configured baud rate are both simulated, so the serial path can be run and
+    timed on any Linux machine. Open `port` with HI like a real board.
+    With protocol 'binary' it speaks the CRC framed protocol of modules.Serial_Protocol instead,
+    answering every thruster frame with a sensor frame carrying the same sequence number.
+    """
+
+    def __init__(self, num_thrusters=6, baudrate=115200, latency=0.0, start_marker=b'', end_marker=b'R', sensor_function=None, protocol='ascii'):
+        """
+        ### __init__ method
+        **Parameters:**
+        - `num_thrusters`: Number of PWM values expected in every command.
+        - `baudrate`: Simulated line rate in bits per second, None for no throttling.
+        - `latency`: Simulated processing time of the microcontroller in seconds.
+        - `start_marker`: Bytes that start a command, empty if commands have no start marker.
+        - `end_marker`: Bytes that end a command.
+        - `sensor_function`: Called with the PWM values of each command, returns the sensor values to answer with.
+        - `protocol`: 'ascii' or 'binary', the markers only apply to 'ascii'.
+        """
+        self.num_thrusters = num_thrusters
+        self.baudrate = baudrate
+        self.latency = latency
+        self.start_marker = start_marker
+        self.end_marker = end_marker
+        self.sensor_function = self.default_sensors if sensor_function is None else sensor_function
+        self.protocol = protocol
+        self.decoder = FrameDecoder()
+
+        self.master = None
+        self.slave = None
+        self.port = None
+        # Time each valid command was received and its PWM values, newest last
+        self.commands = deque(maxlen=10000)
+        self.malformed = 0
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """
+        ### start method
+        Opens the pseudo-terminal and starts answering commands in a background thread.
+
+        **Returns:**
+        - Path of the serial port to open, e.g. '/dev/pts/3'.
+        """
+        self.master, self.slave = pty.openpty()
+        # Raw mode, so no echo and no line editing alter the bytes
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        """
+        ### stop method
+        Stops the background thread and closes the pseudo-terminal.
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def byte_time(self, count):
+        """
+        ### byte_time method
+        Time `count` bytes take on the wire, with 10 bits per byte for 8N1 framing.
+        """
+        if self.baudrate is None:
+            return 0.0
+        return count * 10 / self.baudrate
+
+    def default_sensors(self, pwm):
+        """
+        ### default_sensors method
+        Placeholder readings in the ranges HI.recv documents, [0-100, 0-1000, 0-100, 0-50]:
+        thrust effort in percent, the PWM sum modulo 1001, the command count modulo 101 and 0.
+        """
+        effort = np.abs(pwm - 1500).mean() / 400
+        return [round(100 * min(effort, 1.0)), int(pwm.sum()) % 1001, len(self.commands) % 101, 0]
+
+    def _run(self):
+        pending = bytearray()
+        while self._running:
+            ready, _, _ = select.select([self.master], [], [], 0.05)
+            if not ready:
+                continue
+            data = os.read(self.master, 4096)
+            if self.protocol == 'binary':
+                self._handle_frames(data)
+                continue
+            pending += data
+            while True:
+                end = pending.find(self.end_marker)
+                if end < 0:
+                    break
+                message = bytes(pending[:end])
+                del pending[:end + len(self.end_marker)]
+                # The command has only fully arrived once all of its bytes crossed the line
+                time.sleep(self.byte_time(len(message) + len(self.end_marker)))
+                self._handle(message)
+
+    def _handle(self, message):
+        if self.start_marker:
+            start = message.rfind(self.start_marker)
+            if start < 0:
+                self.malformed += 1
+                return
+            message = message[start + len(self.start_marker):]
+        try:
+            pwm = np.array([int(value) for value in message.split(b',')])
+        except ValueError:
+            self.malformed += 1
+            return
+        if len(pwm) != self.num_thrusters:
+            self.malformed += 1
+            return
+
+        self.commands.append((time.monotonic(), pwm))
+        reply = (','.join(str(value) for value in self.sensor_function(pwm)) + '\n').encode('utf-8')
+        time.sleep(self.latency + self.byte_time(len(reply)))
+        os.write(self.master, reply)
+
+    def _handle_frames(self, data):
+        for kind, sequence, payload in self.decoder.feed(data):
+            # Header, payload and CRC all have to cross the line first
+            time.sleep(self.byte_time(len(payload) + FRAME_OVERHEAD))
+            if kind != KIND_THRUSTER or len(payload) != self.num_thrusters * THRUSTER_DTYPE.itemsize:
+                self.malformed += 1
+                continue
+            pwm = np.frombuffer(payload, dtype=THRUSTER_DTYPE).astype(np.int64)
+            self.commands.append((time.monotonic(), pwm))
+            reply = encode_sensor_frame(self.sensor_function(pwm), sequence)
+            time.sleep(self.latency + self.byte_time(len(reply)))
+            os.write(self.master, reply)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Emulate the thruster/sensor microcontroller on a pseudo-terminal. Run from the Ben folder: python -m modules.Serial_Emulator')
+    parser.add_argument('--baudrate', type=int, default=115200, help='Simulated line rate, 0 disables throttling')
+    parser.add_argument('--latency', type=float, default=0.0, help='Simulated processing time in seconds')
+    parser.add_argument('--thrusters', type=int, default=6, help='Number of PWM values per command')
+    parser.add_argument('--protocol', choices=('ascii', 'binary'), default='ascii', help='Serial protocol, matching "serial_protocol" in configs/sub.json')
+    args = parser.parse_args()
+
+    with SerialEmulator(args.thrusters, args.baudrate or None, args.latency, protocol=args.protocol) as emulator:
+        print(f'Emulating the microcontroller on {emulator.port}, set it as "serial_port" in configs/sub.json')
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print(f'{len(emulator.commands)} commands answered, {emulator.malformed} malformed')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import struct
+
+import numpy as np
+
+# Frame layout: start byte, payload length, kind, sequence number, payload, CRC16 of everything after the start byte
+START_BYTE = 0xA5
+FRAME_HEADER = struct.Struct('<BBBH')
+FRAME_CRC = struct.Struct('<H')
+MAX_PAYLOAD = 64
+FRAME_OVERHEAD = FRAME_HEADER.size + FRAME_CRC.size
+
+KIND_THRUSTER = 1
+KIND_SENSOR = 2
+
+# Payload layouts: thruster commands are uint16 PWM values, sensor readings are int16 (all documented ranges are integers)
+THRUSTER_DTYPE = np.dtype('<u2')
+SENSOR_DTYPE = np.dtype('<i2')
+
+
+def _crc16_table():
+    table = np.zeros(256, dtype=np.uint16)
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table[byte] = crc & 0xFFFF
+    return table.tolist()
+
+CRC16_TABLE = _crc16_table()
+
+
+def crc16(data, crc=0xFFFF):
+    """
+    CRC-16/CCITT-FALSE (polynomial 0x1021, initial value 0xFFFF), the variant most microcontroller libraries provide.
+
+    Parameters:
+    data (bytes): Bytes to checksum.
+    crc (int): Running CRC, to checksum data in several pieces.
+
+    Returns:
+    int: The CRC of the data.
+    """
+    table = CRC16_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def encode_frame(kind, sequence, payload):
+    """
+    Build one frame around a payload.
+
+    Parameters:
+    kind (int): KIND_THRUSTER or KIND_SENSOR.
+    sequence (int): Sequence number, wrapped to 16 bits.
+    payload (bytes): At most MAX_PAYLOAD bytes.
+
+    Returns:
+    bytes: The complete frame.
+    """
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"Payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    frame = bytearray(FRAME_HEADER.pack(START_BYTE, len(payload), kind, sequence & 0xFFFF))
+    frame += payload
+    frame += FRAME_CRC.pack(crc16(frame[1:]))
+    return bytes(frame)
+
+
+def encode_thruster_frame(pwm, sequence):
+    """
+    Frame of packed uint16 PWM values, 19 bytes for 6 thrusters instead of 30 for the ASCII command.
+    """
+    return encode_frame(KIND_THRUSTER, sequence, np.asarray(pwm, dtype=THRUSTER_DTYPE).tobytes())
+
+
+def encode_sensor_frame(values, sequence):
+    """
+    Frame of packed int16 sensor values, as sent back by the microcontroller.
+    """
+    return encode_frame(KIND_SENSOR, sequence, np.asarray(values, dtype=SENSOR_DTYPE).tobytes())
+
+
+class FrameDecoder:
+    """
+    Streaming decoder for frames read from the serial port in arbitrary pieces.
+    After a corrupted or truncated frame it drops the start byte and searches for the next one,
+    so one bad byte costs at most the frames it overlaps.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+        self.crc_errors = 0
+        self.skipped_bytes = 0
+
+    def feed(self, data):
+        """
+        Add received bytes and decode every complete frame.
+
+        Parameters:
+        data (bytes): Bytes read from the port.
+
+        Returns:
+        list: Tuples of (kind, sequence, payload bytes), oldest first.
+        """
+        buffer = self.buffer
+        buffer += data
+        frames = []
+        position = 0
+        while True:
+            start = buffer.find(START_BYTE, position)
+            if start < 0:
+                self.skipped_bytes += len(buffer) - position
+                position = len(buffer)
+                break
+            self.skipped_bytes += start - position
+            position = start
+            if len(buffer) - start < FRAME_HEADER.size:
+                break
+            _, length, kind, sequence = FRAME_HEADER.unpack_from(buffer, start)
+            if length > MAX_PAYLOAD:
+                # Not a real header, the start byte value appeared inside other data
+                position = start + 1
+                self.skipped_bytes += 1
+                continue
+            end = start + FRAME_HEADER.size + length + FRAME_CRC.size
+            if len(buffer) < end:
+                break
+            crc, = FRAME_CRC.unpack_from(buffer, end - FRAME_CRC.size)
+            if crc != crc16(buffer[start + 1:end - FRAME_CRC.size]):
+                self.crc_errors += 1
+                position = start + 1
+                self.skipped_bytes += 1
+                continue
+            frames.append((kind, sequence, bytes(buffer[start + FRAME_HEADER.size:end - FRAME_CRC.size])))
+            position = end
+        del buffer[:position]
+        return frames
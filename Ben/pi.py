@@ -1,10 +1,12 @@
 from modules.Networking_Package import NP
+from modules.Message_Schema import MessageCodec, NUM_SENSORS
 from datetime import datetime
 import logging
 import socket
 import time
 import json
 import threading
+import numpy as np
 import pandas as pd
 
 # Logging configuration
@@ -32,7 +34,9 @@ logger.info('Config file loaded')
 class PI:
     def __init__(self, internal : bool = True):
         self.internal = internal
-        self.data = pd.DataFrame(columns=['time', 'x', 'y', 'z', 'roll', 'pitch', 'yaw', 'Sensor_1', 'Sensor_2', 'Sensor_3'])
+        self.rows = []
+        self.controller_codec = MessageCodec('controller')
+        self.sensor_codec = MessageCodec('sensor')
         
         if internal: # Connect to the TX2
             self.client = NP(socket.AF_INET, socket.SOCK_STREAM)
@@ -48,24 +52,28 @@ class PI:
             logger.info('Connected to TX2 and Controller')
             print('Connected to TX2 and Controller')
         
-        self.command_list = ['0.0,0.0,0.0,0.0,0.0\n', 
-                             '1.0,0.0,0.0,0.0,0.0\n',
-                             '-1.0,0.0,0.0,0.0,0.0\n',
-                             '0.0,1.0,0.0,0.0,0.0\n',
-                             '0.0,-1.0,0.0,0.0,0.0\n',
-                             '0.0,0.0,1.0,0.0,0.0\n',
-                             '0.0,0.0,-1.0,0.0,0.0\n',
-                             '0.0,0.0,0.0,1.0,0.0\n',
-                             '0.0,0.0,0.0,-1.0,0.0\n',
-                             '0.0,0.0,0.0,0.0,1.0\n',
-                             '0.0,0.0,0.0,0.0,-1.0\n']
+        self.command_list = np.array([[0.0, 0.0, 0.0, 0.0, 0.0],
+                                      [1.0, 0.0, 0.0, 0.0, 0.0],
+                                      [-1.0, 0.0, 0.0, 0.0, 0.0],
+                                      [0.0, 1.0, 0.0, 0.0, 0.0],
+                                      [0.0, -1.0, 0.0, 0.0, 0.0],
+                                      [0.0, 0.0, 1.0, 0.0, 0.0],
+                                      [0.0, 0.0, -1.0, 0.0, 0.0],
+                                      [0.0, 0.0, 0.0, 1.0, 0.0],
+                                      [0.0, 0.0, 0.0, -1.0, 0.0],
+                                      [0.0, 0.0, 0.0, 0.0, 1.0],
+                                      [0.0, 0.0, 0.0, 0.0, -1.0]])
+
+    def send_command(self, command):
+        self.client.send_record(self.controller_codec.encode(command))
 
     def seperate_thread(self):
         while True:
-            data = [self.client.recv_string_as_bytes().split(',')]
-            self.data.append(data, ignore_index=True)
-            print(data)
-            time.sleep(0.1)
+            record = self.client.recv_record(self.sensor_codec)
+            if record is None:
+                break
+            self.rows.append([record['timestamp'], *record['values']])
+            print(record['values'])
 
     def run(self):
         thread = threading.Thread(target=self.seperate_thread)
@@ -79,33 +87,32 @@ class PI:
                 auto = True
             while True:
                 if auto:
-                    self.client.send_string_as_bytes(self.command_list[0]) # Send the stop command
+                    self.send_command(self.command_list[0]) # Send the stop command
                     time.sleep(1)
-                    self.client.send_string_as_bytes(self.command_list[1]) # Send the forward command
+                    self.send_command(self.command_list[1]) # Send the forward command
                     time.sleep(5)
-                    self.client.send_string_as_bytes(self.command_list[2]) # Send the backward command
+                    self.send_command(self.command_list[2]) # Send the backward command
                     time.sleep(10)
-                    self.client.send_string_as_bytes(self.command_list[1]) # Send the forward command
+                    self.send_command(self.command_list[1]) # Send the forward command
                     time.sleep(5)
-                    self.client.send_string_as_bytes(self.command_list[3]) # Send the right command
+                    self.send_command(self.command_list[3]) # Send the right command
                     time.sleep(5)
-                    self.client.send_string_as_bytes(self.command_list[4]) # Send the left command
+                    self.send_command(self.command_list[4]) # Send the left command
                     time.sleep(10)
-                    self.client.send_string_as_bytes(self.command_list[3]) # Send the right command
+                    self.send_command(self.command_list[3]) # Send the right command
                     time.sleep(5)
                 else:
-                    data = self.controller.recv_string_as_bytes()
-                    if data == 'q':
+                    if self.controller.recv_record(self.controller_codec) is None:
                         break
-                    self.client.send(data)
-                    time.sleep(0.1)
+                    # Forward the record from the surface unchanged, the surface's loop scheduler sets the rate
+                    self.client.send_record(self.controller_codec.recv_buffer)
                 
         except KeyboardInterrupt:
             out_data = f'out/data-{timestamp}.csv'
-            self.data.to_csv(out_data)
+            pd.DataFrame(self.rows, columns=['time'] + [f'Sensor_{i+1}' for i in range(NUM_SENSORS)]).to_csv(out_data)
             logger.info(f'Data Stored in {out_data}')
             logger.info('Keyboard Interrupt')
-            self.client.send(self.command_list[0])
+            self.send_command(self.command_list[0])
             thread.join()
             exit()
 
@@ -1,6 +1,9 @@
 from modules.Movement_Package import MP
 from modules.Hardware_Interface import HI
 from modules.Networking_Package import NP
+from modules.Message_Schema import MessageCodec, NUM_AXES, NUM_THRUSTERS, NUM_SENSORS
+from modules.Shared_Memory import SharedRing
+from modules.Loop_Scheduler import LoopScheduler
 import socket
 import numpy as np
 import logging
@@ -8,7 +11,7 @@ import platform
 import sys
 from datetime import datetime
 import json
-from multiprocessing import Process, Pipe
+from multiprocessing import Process
 import pandas as pd
 
 # Logging configuration
@@ -32,36 +35,24 @@ with open('configs/sub.json') as config_file:
     config = json.load(config_file)
 logger.info('Config file loaded')
 
-def array_to_str(arr):
-    """
-    Convert a numpy array to a string representation.
-
-    Parameters:
-    arr (np.ndarray): The numpy array to be converted.
-
-    Returns:
-    str: String representation of the numpy array.
-    """
-    return np.array2string(arr)
-
-
-def run_MP(conn : Pipe):
+def run_MP(inbox : SharedRing, outbox : SharedRing):
     mp = MP()
+    data = np.empty(inbox.shape, dtype=inbox.dtype)
     while True:
-        data = conn.recv()
-        if data is not None:
-            mp.update(data)
-            mp.map_data()
-            conn.send(mp.thruster_data)
-
-def run_HI(conn : Pipe):
-    hi = HI()
+        inbox.wait_pop(data)
+        mp.update(data)
+        outbox.wait_push(mp.map_data())
+
+def run_HI(inbox : SharedRing, outbox : SharedRing):
+    # Point serial_port at the pty of modules.Serial_Emulator to run without the board
+    hi = HI(config.get('serial_port', '/dev/ttyACM0'), protocol=config.get('serial_protocol', 'ascii'))
+    data = np.empty(inbox.shape, dtype=inbox.dtype)
+    no_reading = np.full(outbox.shape, np.nan, dtype=outbox.dtype)
     while True:
-        data = conn.recv()
-        if data is not None:
-            data = array_to_str(data)
-            hi.send(data)
-            conn.send(hi.recv())
+        inbox.wait_pop(data)
+        hi.send_thrusters(data)
+        sensors = hi.recv_sensors()
+        outbox.wait_push(no_reading if sensors is None else sensors)
 
 def main():
     # Define and initialize variables
@@ -75,11 +66,14 @@ def main():
     print(f'Connection accepted from {addr}')
     logger.info(f'Connection accepted from {addr}')
 
-    mp_parent, mp_child = Pipe()
-    hi_parent, hi_child = Pipe()
+    # Fixed-shape shared-memory rings instead of Pipes, so no array is pickled on the way
+    mp_inbox = SharedRing((NUM_AXES,), np.float64, capacity=4)
+    mp_outbox = SharedRing((NUM_THRUSTERS,), np.uint16, capacity=4)
+    hi_inbox = SharedRing((NUM_THRUSTERS,), np.uint16, capacity=4)
+    hi_outbox = SharedRing((NUM_SENSORS,), np.float32, capacity=4)
 
-    mp_process = Process(target=run_MP, args=(mp_child,))
-    hi_process = Process(target=run_HI, args=(hi_child,))
+    mp_process = Process(target=run_MP, args=(mp_inbox, mp_outbox))
+    hi_process = Process(target=run_HI, args=(hi_inbox, hi_outbox))
 
     print('Processes starting')
     logger.info('Processes started')
@@ -91,51 +85,58 @@ def main():
     logger.info('HI started')
 
     i = 0
+    sensor_codec = MessageCodec('sensor')
+    controllerData_List = np.array([[0.0, 0.0, 0.0, 0.0, 0.0],
+                                    [1.0, 0.0, 0.0, 0.0, 0.0],
+                                    [-1.0, 0.0, 0.0, 0.0, 0.0],
+                                    [0.0, 1.0, 0.0, 0.0, 0.0],
+                                    [0.0, -1.0, 0.0, 0.0, 0.0],
+                                    [0.0, 0.0, 1.0, 0.0, 0.0],
+                                    [0.0, 0.0, -1.0, 0.0, 0.0],
+                                    [0.0, 0.0, 0.0, 1.0, 0.0],
+                                    [0.0, 0.0, 0.0, -1.0, 0.0],
+                                    [0.0, 0.0, 0.0, 0.0, 1.0],
+                                    [0.0, 0.0, 0.0, 0.0, -1.0]])
     columns = ['Controller Data', 'Thruster Data', 'Sensor Data']
     data = pd.DataFrame(columns=columns)
 
+    # Fixed-rate loop against absolute deadlines, its summary shows whether the rate holds
+    scheduler = LoopScheduler(config.get('loop_rate', 100), cpus=config.get('cpu_affinity'), priority=config.get('realtime_priority'))
+    scheduler.start()
+
     try:
         while True:
             # Do not recieve data only send to the surface
-            controllerData_List = ['0.0,0.0,0.0,0.0,0.0\n',
-                            '1.0,0.0,0.0,0.0,0.0\n',
-                            '-1.0,0.0,0.0,0.0,0.0\n',
-                            '0.0,1.0,0.0,0.0,0.0\n',
-                            '0.0,-1.0,0.0,0.0,0.0\n',
-                            '0.0,0.0,1.0,0.0,0.0\n',
-                            '0.0,0.0,-1.0,0.0,0.0\n',
-                            '0.0,0.0,0.0,1.0,0.0\n',
-                            '0.0,0.0,0.0,-1.0,0.0\n',
-                            '0.0,0.0,0.0,0.0,1.0\n',
-                            '0.0,0.0,0.0,0.0,-1.0\n']
-            
             controllerData = controllerData_List[i]
 
-            # Convert the string to a numpy array of floats
-            numeric_data = np.array(controllerData.strip().split(','), dtype=float)
-
             # Send the data to the thrusters after mapping
-            mp_parent.send(numeric_data)
-            thruster_data = mp_parent.recv()
+            mp_inbox.wait_push(controllerData)
+            thruster_data = mp_outbox.wait_pop()
             logger.info(f'Thruster data sent: {thruster_data}')
             print(f'Thruster data sent: {thruster_data}')
 
             # Receive data from the sensors and send motor data
-            hi_parent.send(thruster_data)
-            sensorData = hi_parent.recv()
+            hi_inbox.wait_push(thruster_data)
+            sensorData = hi_outbox.wait_pop()
+            if np.isnan(sensorData).all():
+                sensorData = None
             logger.info(f'Sensor data received: {sensorData}')
             print(f'Sensor data received: {sensorData}')
 
             # Append data to DataFrame
             new_row = {
-                'Controller Data': controllerData.strip(),
+                'Controller Data': controllerData.tolist(),
                 'Thruster Data': thruster_data.tolist(),
                 'Sensor Data': sensorData
             }
 
             # Send sensorData and frame to the surface
-            conn.send_string_as_bytes(sensorData)
-            logger.info(f'Data sent to surface: {sensorData}')
+            if sensorData is not None:
+                conn.send_record(sensor_codec.encode(sensorData))
+                logger.info(f'Data sent to surface: {sensorData}')
+            if scheduler.ticks % int(scheduler.rate) == 0:
+                logger.info(scheduler.summary())
+            scheduler.wait()
 
 
     except KeyboardInterrupt as e:
@@ -143,6 +144,8 @@ def main():
         logger.info('Keyboard interrupt detected')
 
     # Close the connection and end the program
+    logger.info(scheduler.summary())
+    print(scheduler.summary())
     conn.close()
     mp_process.join()
     hi_process.join()
@@ -151,8 +154,8 @@ def main():
     logger.info('Program ended')
     print('Connection closed')
     print('Program ended')
-    mp_parent.close()
-    hi_parent.close()
+    for ring in (mp_inbox, mp_outbox, hi_inbox, hi_outbox):
+        ring.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
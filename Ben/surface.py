@@ -1,10 +1,11 @@
 from modules.Networking_Package import NP
 from modules.Controller_Module import Controller_Module
+from modules.Message_Schema import MessageCodec
+from modules.Loop_Scheduler import LoopScheduler
 from datetime import datetime
 
 import logging
 import socket
-import time
 
 import json
 
@@ -36,13 +37,19 @@ class surface:
         self.server.listen(5)
         self.conn, self.addr = self.server.accept()
 
-        self.controller = Controller_Module()
+        self.controller = Controller_Module(**config.get('controller', {}))
+        self.codec = MessageCodec('controller')
+        # Send rate in Hz, paced against absolute deadlines instead of sleeping after every send
+        self.scheduler = LoopScheduler(config.get('send_rate', 10))
+
+    def send_controls(self, tick):
+        # Only changed values and the heartbeat go out, not the same record every tick
+        data = self.controller.poll(timeout=0)
+        if data is not None:
+            self.conn.send_record(self.codec.encode(data))
 
     def run(self):
-        while True:
-            data = self.controller.get_data()
-            self.conn.send(str(data).encode())
-            time.sleep(0.1)
+        self.scheduler.run(self.send_controls)
 
 if __name__ == '__main__':
     su = surface()
@@ -0,0 +1,38 @@
+"""
+Loop latency of the sub.py control path (MP update, PWM mapping, serial command and sensor reply)
+against the pty microcontroller emulator, for a few line rates and processing latencies.
+
+Run from the Ben folder: python tests/bench_serial_loop.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Hardware_Interface import HI
+from modules.Message_Schema import parse_sensor_line, thruster_line
+from modules.Movement_Package import MP
+from modules.Serial_Emulator import SerialEmulator
+
+num_loops = 200
+
+if __name__ == "__main__":
+    mp = MP()
+    commands = np.random.default_rng(0).uniform(-1, 1, (num_loops, mp.num_dof))
+
+    print(f"{'baudrate':>9} {'latency (ms)':>13} {'mean (ms)':>10} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for baudrate, latency in ((None, 0.0), (115200, 0.0), (115200, 0.002), (57600, 0.0)):
+        with SerialEmulator(baudrate=baudrate, latency=latency) as emulator:
+            hi = HI(emulator.port)
+            times = np.empty(num_loops)
+            for i, command in enumerate(commands):
+                start = time.perf_counter()
+                mp.update(command)
+                hi.send(thruster_line(mp.map_data()))
+                parse_sensor_line(hi.recv())
+                times[i] = time.perf_counter() - start
+            hi.close()
+        times *= 1e3
+        print(f"{baudrate or 'none':>9} {latency * 1e3:>13.1f} {times.mean():>10.3f} {np.median(times):>9.3f} {np.percentile(times, 99):>9.3f}")
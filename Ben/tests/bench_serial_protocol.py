@@ -0,0 +1,55 @@
+"""
+Binary CRC framed serial protocol against the ASCII protocol: bytes per frame, frames per second the
+line can carry, encode/decode cost, and command/reply round trips per second through the pty emulator.
+
+Run from the Ben folder: python tests/bench_serial_protocol.py
+"""
+import os
+import sys
+import time
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Hardware_Interface import HI
+from modules.Message_Schema import parse_sensor_line, thruster_line
+from modules.Serial_Emulator import SerialEmulator
+from modules.Serial_Protocol import FrameDecoder, encode_sensor_frame, encode_thruster_frame
+
+baudrate = 115200
+num_round_trips = 300
+
+if __name__ == "__main__":
+    pwm = np.array([1500, 1623, 1377, 1900, 1100, 1512])
+    sensors = [100, 1000, 100, 50]
+
+    ascii_command = thruster_line(pwm).encode('utf-8')
+    ascii_reply = (','.join(map(str, sensors)) + '\n').encode('utf-8')
+    binary_command = encode_thruster_frame(pwm, 0)
+    binary_reply = encode_sensor_frame(sensors, 0)
+    decoder = FrameDecoder()
+
+    cpu = {
+        'ascii': (timeit.timeit(lambda: thruster_line(pwm).encode('utf-8'), number=20000) / 20000,
+                  timeit.timeit(lambda: parse_sensor_line(ascii_reply.decode('utf-8').rstrip()), number=20000) / 20000),
+        'binary': (timeit.timeit(lambda: encode_thruster_frame(pwm, 0), number=20000) / 20000,
+                   timeit.timeit(lambda: decoder.feed(binary_reply), number=20000) / 20000),
+    }
+
+    print(f"{'protocol':<8} {'cmd (B)':>8} {'reply (B)':>10} {'cmd/s on wire':>14} {'encode (us)':>12} {'decode (us)':>12} {'round trips/s':>14}")
+    for protocol, command, reply in (('ascii', ascii_command, ascii_reply), ('binary', binary_command, binary_reply)):
+        # One-way command rate the line allows at 10 bits per byte
+        wire_rate = baudrate / 10 / len(command)
+
+        with SerialEmulator(baudrate=baudrate, protocol=protocol) as emulator:
+            hi = HI(emulator.port, protocol=protocol)
+            start = time.perf_counter()
+            for _ in range(num_round_trips):
+                hi.send_thrusters(pwm)
+                hi.recv_sensors()
+            round_trips = num_round_trips / (time.perf_counter() - start)
+            hi.close()
+
+        encode, decode = cpu[protocol]
+        print(f"{protocol:<8} {len(command):>8} {len(reply):>10} {wire_rate:>14.0f} {encode * 1e6:>12.2f} {decode * 1e6:>12.2f} {round_trips:>14.0f}")
@@ -0,0 +1,114 @@
+"""
+Per-tick latency of the sub.py process hand-off: a worker process receives the 5 controller values and
+answers with 6 PWM values, once over a Pipe pair as before and once over shared-memory rings and slots.
+
+Run from the Ben folder: python tests/bench_shared_memory.py
+"""
+import os
+import sys
+import time
+from multiprocessing import Pipe, Process
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Shared_Memory import SharedRing, SharedSlot
+
+num_ticks = 5000
+controller_data = np.array([0.5, -0.25, 0.0, 1.0, -1.0])
+thruster_data = np.array([1500, 1623, 1377, 1900, 1100, 1512], dtype=np.uint16)
+
+
+def pipe_worker(conn):
+    while True:
+        data = conn.recv()
+        if data is None:
+            return
+        conn.send(thruster_data)
+
+
+def ring_worker(inbox, outbox, spin):
+    data = np.empty(inbox.shape, dtype=inbox.dtype)
+    while True:
+        inbox.wait_pop(data, spin=spin)
+        if np.isnan(data[0]):
+            return
+        outbox.wait_push(thruster_data, spin=spin)
+
+
+def slot_worker(inbox, outbox, spin):
+    data = np.empty(inbox.shape, dtype=inbox.dtype)
+    # Nothing written yet, the parent may already have written by the time this process starts
+    sequence = 0
+    while True:
+        inbox.wait(sequence, spin=spin)
+        sequence = inbox.sequence
+        inbox.read(data)
+        if np.isnan(data[0]):
+            return
+        outbox.write(thruster_data)
+
+
+def bench_pipe():
+    parent, child = Pipe()
+    worker = Process(target=pipe_worker, args=(child,))
+    worker.start()
+    times = np.empty(num_ticks)
+    for i in range(num_ticks):
+        start = time.perf_counter()
+        parent.send(controller_data)
+        parent.recv()
+        times[i] = time.perf_counter() - start
+    parent.send(None)
+    worker.join()
+    return times
+
+
+def bench_ring(spin):
+    inbox = SharedRing((5,), np.float64, capacity=4)
+    outbox = SharedRing((6,), np.uint16, capacity=4)
+    worker = Process(target=ring_worker, args=(inbox, outbox, spin))
+    worker.start()
+    result = np.empty(outbox.shape, dtype=outbox.dtype)
+    times = np.empty(num_ticks)
+    for i in range(num_ticks):
+        start = time.perf_counter()
+        inbox.wait_push(controller_data, spin=spin)
+        outbox.wait_pop(result, spin=spin)
+        times[i] = time.perf_counter() - start
+    inbox.wait_push(np.full(5, np.nan))
+    worker.join()
+    inbox.close()
+    outbox.close()
+    return times
+
+
+def bench_slot(spin):
+    inbox = SharedSlot((5,), np.float64)
+    outbox = SharedSlot((6,), np.uint16)
+    worker = Process(target=slot_worker, args=(inbox, outbox, spin))
+    worker.start()
+    result = np.empty(outbox.shape, dtype=outbox.dtype)
+    times = np.empty(num_ticks)
+    for i in range(num_ticks):
+        start = time.perf_counter()
+        sequence = outbox.sequence
+        inbox.write(controller_data)
+        outbox.wait(sequence, spin=spin)
+        outbox.read(result)
+        times[i] = time.perf_counter() - start
+    inbox.write(np.full(5, np.nan))
+    worker.join()
+    inbox.close()
+    outbox.close()
+    return times
+
+
+if __name__ == "__main__":
+    print(f"{'transport':<26} {'mean (us)':>10} {'p50 (us)':>10} {'p99 (us)':>10} {'max (us)':>10}")
+    for name, run in [('Pipe', bench_pipe),
+                      ('SharedRing, spinning', lambda: bench_ring(spin=1.0)),
+                      ('SharedRing, 50 us sleeps', lambda: bench_ring(spin=0.0)),
+                      ('SharedSlot, spinning', lambda: bench_slot(spin=1.0))]:
+        times = run() * 1e6
+        print(f"{name:<26} {times.mean():>10.1f} {np.percentile(times, 50):>10.1f} {np.percentile(times, 99):>10.1f} {times.max():>10.1f}")
@@ -0,0 +1,171 @@
+"""
+Serial_Protocol and its C counterpart, arduino/serial_protocol/serial_protocol.h, checked against
+the same CRC vectors and frames. The C checks compile a small harness and are skipped without a C compiler.
+
+Run from the Ben folder: python -m pytest tests/test_serial_protocol.py
+"""
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from modules.Serial_Protocol import (FrameDecoder, KIND_SENSOR, KIND_THRUSTER, MAX_PAYLOAD, START_BYTE, crc16,
+                                     encode_frame, encode_sensor_frame, encode_thruster_frame)
+
+HEADER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arduino', 'serial_protocol', 'serial_protocol.h')
+
+# CRC-16/CCITT-FALSE check values
+CRC_VECTORS = [(b'', 0xFFFF), (b'A', 0xB915), (b'123456789', 0x29B1)]
+
+
+@pytest.mark.parametrize('data, expected', CRC_VECTORS)
+def test_crc16_known_vectors(data, expected):
+    assert crc16(data) == expected
+
+
+def test_crc16_in_pieces():
+    assert crc16(b'456789', crc16(b'123')) == 0x29B1
+
+
+def test_thruster_frame_round_trip():
+    pwm = np.array([1100, 1500, 1900, 1500, 1234, 1765], dtype=np.uint16)
+    frame = encode_thruster_frame(pwm, 70000)
+    assert len(frame) == 19
+    (kind, sequence, payload), = FrameDecoder().feed(frame)
+    assert (kind, sequence) == (KIND_THRUSTER, 70000 & 0xFFFF)
+    assert np.array_equal(np.frombuffer(payload, dtype='<u2'), pwm)
+
+
+def test_sensor_frame_round_trip_byte_by_byte():
+    values = [-32768, -1, 0, 32767]
+    decoder = FrameDecoder()
+    frames = [frame for byte in encode_sensor_frame(values, 7) for frame in decoder.feed(bytes([byte]))]
+    assert len(frames) == 1
+    kind, sequence, payload = frames[0]
+    assert (kind, sequence) == (KIND_SENSOR, 7)
+    assert np.frombuffer(payload, dtype='<i2').tolist() == values
+
+
+def test_empty_and_largest_payload():
+    decoder = FrameDecoder()
+    assert decoder.feed(encode_frame(KIND_SENSOR, 1, b'')) == [(KIND_SENSOR, 1, b'')]
+    payload = bytes(range(MAX_PAYLOAD))
+    assert decoder.feed(encode_frame(KIND_SENSOR, 2, payload)) == [(KIND_SENSOR, 2, payload)]
+    with pytest.raises(ValueError):
+        encode_frame(KIND_SENSOR, 3, bytes(MAX_PAYLOAD + 1))
+
+
+def test_resync_after_garbage():
+    # Noise including start bytes with impossible lengths and a truncated header
+    garbage = bytes([0x00, START_BYTE, 0xFF, 0x13, START_BYTE, 200, 1, START_BYTE])
+    frame = encode_thruster_frame([1500] * 6, 5)
+    decoder = FrameDecoder()
+    frames = decoder.feed(garbage + frame + b'\x42' + frame)
+    assert [(kind, sequence) for kind, sequence, _ in frames] == [(KIND_THRUSTER, 5), (KIND_THRUSTER, 5)]
+    assert decoder.skipped_bytes > 0
+    assert decoder.buffer == bytearray()
+
+
+def test_corrupted_crc_is_rejected():
+    good = encode_thruster_frame([1500] * 6, 1)
+    for position in range(1, len(good)):
+        corrupted = bytearray(good)
+        corrupted[position] ^= 0x10
+        decoder = FrameDecoder()
+        frames = decoder.feed(bytes(corrupted) + encode_thruster_frame([1600] * 6, 2))
+        # The damaged frame never comes out, the one after it always does
+        assert [sequence for _, sequence, _ in frames] == [2]
+        assert np.frombuffer(frames[0][2], dtype='<u2').tolist() == [1600] * 6
+
+
+C_HARNESS = r'''
+#include <stdio.h>
+#include "serial_protocol.h"
+
+static uint16_t crc(const uint8_t *data, size_t size) {
+  uint16_t value = 0xFFFF;
+  for (size_t i = 0; i < size; i++) value = serial_crc16_update(value, data[i]);
+  return value;
+}
+
+int main(void) {
+  char line[4096];
+  SerialDecoder decoder = {0};
+  // Commands on stdin: "crc <hex>", "encode <kind> <sequence> <hex payload>" or "feed <hex>"
+  while (fgets(line, sizeof(line), stdin)) {
+    char command[16], hex[2048] = "";
+    unsigned kind = 0, sequence = 0;
+    uint8_t data[1024];
+    size_t size = 0;
+    if (sscanf(line, "encode %u %u %2047s", &kind, &sequence, hex) >= 2) {
+    } else if (sscanf(line, "%15s %2047s", command, hex) < 1) {
+      continue;
+    }
+    for (char *p = hex; p[0] && p[1]; p += 2) {
+      unsigned byte;
+      sscanf(p, "%2x", &byte);
+      data[size++] = (uint8_t)byte;
+    }
+    if (line[0] == 'c') {
+      printf("%04x\n", crc(data, size));
+    } else if (line[0] == 'e') {
+      uint8_t frame[SERIAL_MAX_FRAME];
+      size_t frame_size = serial_encode_frame(frame, (uint8_t)kind, (uint16_t)sequence, data, (uint8_t)size);
+      for (size_t i = 0; i < frame_size; i++) printf("%02x", frame[i]);
+      printf("\n");
+    } else {
+      for (size_t i = 0; i < size; i++) {
+        if (serial_decoder_feed(&decoder, data[i])) {
+          printf("%u %u ", decoder.kind, decoder.sequence);
+          for (uint8_t j = 0; j < decoder.length; j++) printf("%02x", decoder.payload[j]);
+          printf("\n");
+        }
+      }
+      printf("errors %u\n", decoder.crc_errors);
+    }
+  }
+  return 0;
+}
+'''
+
+
+@pytest.fixture(scope='module')
+def c_protocol(tmp_path_factory):
+    compiler = shutil.which('cc') or shutil.which('gcc')
+    if compiler is None:
+        pytest.skip('No C compiler')
+    directory = tmp_path_factory.mktemp('serial_protocol')
+    source = directory / 'harness.c'
+    source.write_text(C_HARNESS)
+    binary = directory / 'harness'
+    subprocess.run([compiler, '-std=c99', '-Wall', '-Werror', '-I', os.path.dirname(HEADER), str(source), '-o', str(binary)], check=True)
+
+    def run(*commands):
+        result = subprocess.run([str(binary)], input='\n'.join(commands) + '\n', capture_output=True, text=True, check=True)
+        return result.stdout.split('\n')[:-1]
+    return run
+
+
+def test_c_crc16_known_vectors(c_protocol):
+    assert c_protocol(*[f'crc {data.hex()}' for data, _ in CRC_VECTORS]) == [f'{expected:04x}' for _, expected in CRC_VECTORS]
+
+
+def test_c_encodes_same_frames(c_protocol):
+    payloads = [(KIND_THRUSTER, 1, np.array([1100, 1500, 1900, 1500, 1234, 1765], dtype='<u2').tobytes()),
+                (KIND_SENSOR, 65535, np.array([-5, 0, 5, 32767], dtype='<i2').tobytes()),
+                (KIND_SENSOR, 0, b'')]
+    output = c_protocol(*[f'encode {kind} {sequence} {payload.hex()}' for kind, sequence, payload in payloads])
+    assert output == [encode_frame(kind, sequence, payload).hex() for kind, sequence, payload in payloads]
+
+
+def test_c_decodes_python_frames_and_rejects_corruption(c_protocol):
+    good = encode_thruster_frame([1500] * 6, 9)
+    corrupted = bytearray(encode_thruster_frame([1700] * 6, 8))
+    corrupted[7] ^= 0x01
+    stream = bytes([0x00, 0x13, START_BYTE, 0xFF]) + bytes(corrupted) + good
+    output = c_protocol(f'feed {stream.hex()}')
+    assert output == [f'{KIND_THRUSTER} 9 {good[5:-2].hex()}', 'errors 1']
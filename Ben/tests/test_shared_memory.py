@@ -0,0 +1,102 @@
+"""
+SharedSlot and SharedRing across two processes: a writer publishes arrays whose elements all hold
+the same counter as fast as it can while the reader checks that no read mixes two writes.
+
+Run from the Ben folder: python -m pytest tests/test_shared_memory.py
+"""
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import modules.Shared_Memory as Shared_Memory
+from modules.Shared_Memory import SharedRing, SharedSlot
+
+SHAPE = (256,)
+WRITES = 200000
+
+if 'fork' not in multiprocessing.get_all_start_methods():
+    pytest.skip('the stress tests fork the writer process', allow_module_level=True)
+context = multiprocessing.get_context('fork')
+
+
+def write_slot(slot, count):
+    value = np.empty(SHAPE)
+    for i in range(1, count + 1):
+        value.fill(i)
+        slot.write(value)
+
+
+def push_ring(ring, count):
+    value = np.empty(SHAPE)
+    for i in range(count):
+        value.fill(i)
+        ring.wait_push(value, timeout=10)
+
+
+def test_slot_reads_are_never_torn():
+    slot = SharedSlot(SHAPE)
+    writer = context.Process(target=write_slot, args=(slot, WRITES))
+    try:
+        writer.start()
+        out = np.empty(SHAPE)
+        last = 0
+        reads = 0
+        while last < WRITES:
+            slot.read(out)
+            assert (out == out[0]).all(), f'torn read: {np.unique(out)}'
+            assert out[0] >= last, 'value went back'
+            last = int(out[0])
+            reads += 1
+        writer.join(10)
+        assert writer.exitcode == 0
+        assert reads > 1
+    finally:
+        if writer.is_alive():
+            writer.kill()
+        slot.close()
+
+
+def test_ring_delivers_every_array_once_in_order():
+    ring = SharedRing(SHAPE, capacity=8)
+    writer = context.Process(target=push_ring, args=(ring, WRITES // 4))
+    try:
+        writer.start()
+        out = np.empty(SHAPE)
+        for i in range(WRITES // 4):
+            assert ring.wait_pop(out, timeout=10) is not None
+            assert (out == i).all(), f'expected {i}, got {np.unique(out)}'
+        writer.join(10)
+        assert writer.exitcode == 0
+        assert len(ring) == 0
+    finally:
+        if writer.is_alive():
+            writer.kill()
+        ring.close()
+
+
+def test_read_yields_while_a_write_is_in_progress(monkeypatch):
+    yields = []
+    monkeypatch.setattr(Shared_Memory.os, 'sched_yield', lambda: yields.append(None))
+    slot = SharedSlot(SHAPE)
+    try:
+        # A writer stopped halfway through a write, finished from another thread later
+        slot._first[0] += 1
+        slot._data[0] = 1.0
+
+        def finish():
+            time.sleep(0.05)
+            slot._first[0] += 1
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        assert (slot.read() == 1.0).all()
+        thread.join()
+        assert yields
+    finally:
+        slot.close()